@@ -0,0 +1,93 @@
+"""管理接口 (需要 X-Admin-Token)"""
+
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse
+
+from ..config import settings
+from ..schemas.request import ProfileRequest, TrafficRecordRequest
+from ..core.profiling import profiler
+from ..core.traffic import traffic_recorder
+
+MAX_PROFILE_REQUESTS = 100
+
+
+def require_admin(x_admin_token: str = Header("")) -> None:
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="管理接口未启用 (未配置 ADMIN_TOKEN)")
+    if not secrets.compare_digest(x_admin_token.encode("utf-8"), settings.admin_token.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="管理令牌无效")
+
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+def profile_status() -> dict:
+    session = profiler.session
+    return {"active": profiler.active, **(session.status() if session else {})}
+
+
+@router.post("/profile")
+async def start_profile(request: ProfileRequest):
+    """
+    开启剖析会话 (替换已有会话)
+    对接下来 requests 个匹配端点/模型的请求采集阶段标注、torch trace 与栈采样
+    """
+    if not 1 <= request.requests <= MAX_PROFILE_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"requests 需在 1~{MAX_PROFILE_REQUESTS} 之间")
+
+    profiler.start(
+        endpoint=request.endpoint,
+        model=request.model,
+        requests=request.requests,
+        torch_trace=request.torch_trace,
+        sample_interval_ms=request.sample_interval_ms,
+    )
+    print(f"[Profile] 开启剖析: endpoint={request.endpoint}, model={request.model}, {request.requests} 个请求")
+    return profile_status()
+
+
+@router.get("/profile")
+async def get_profile():
+    """剖析会话状态与已采集的请求"""
+    return profile_status()
+
+
+@router.get("/profile/trace")
+async def download_trace():
+    """下载 Chrome trace JSON (chrome://tracing 或 https://ui.perfetto.dev 打开)"""
+    if profiler.session is None:
+        raise HTTPException(status_code=404, detail="没有剖析会话")
+    return JSONResponse(
+        profiler.chrome_trace(),
+        headers={"Content-Disposition": 'attachment; filename="segmentx-trace.json"'},
+    )
+
+
+@router.delete("/profile")
+async def stop_profile():
+    """停止采集 (已采集的 trace 保留到下次开启)"""
+    profiler.stop()
+    return profile_status()
+
+
+@router.post("/traffic")
+async def start_traffic_recording(request: TrafficRecordRequest):
+    """开始录制流量到新的 trace (替换进行中的录制), 用 scripts/replay_traffic.py 回放"""
+    record_images = request.record_images
+    if record_images is None:
+        record_images = settings.traffic_record_images
+    return traffic_recorder.start(settings.traffic_dir, record_images)
+
+
+@router.get("/traffic")
+async def get_traffic_recording():
+    """录制状态与 trace 路径"""
+    return traffic_recorder.status()
+
+
+@router.delete("/traffic")
+async def stop_traffic_recording():
+    """停止录制"""
+    return traffic_recorder.stop()
@@ -0,0 +1,176 @@
+"""浏览器模型文件 (ONNX) 下载
+
+所有文件 URL 都带内容哈希, 一经发布永不改变:
+  - Cache-Control: immutable, 浏览器与 CDN 可长期缓存
+  - ETag / If-None-Match → 304
+  - Range / If-Range → 206, 中断的下载可以续传
+  - 客户端支持时直接返回导出时生成的 br / gzip 预压缩文件 (不在请求时压缩)
+manifest 本身不缓存, 前端每次启动读取以发现新版本
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from ..config import settings
+from ..core.artifacts import ENCODINGS, MANIFEST_FILE
+
+router = APIRouter(prefix="/api", tags=["artifacts"])
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+HASH_PATTERN = re.compile(r"^[0-9a-f]{16}$")
+NAME_PATTERN = re.compile(r"^[\w.-]+\.onnx$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+READ_SIZE = 1024 * 1024
+MEDIA_TYPE = "application/octet-stream"
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 命中任一编码版本的 ETag 都视为未变化"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    base = etag.strip('"')
+    for candidate in header.split(","):
+        candidate = candidate.strip().removeprefix("W/").strip('"')
+        if candidate == "*" or candidate.split("-")[0] == base:
+            return True
+    return False
+
+
+def parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """解析单个字节范围, 返回 [start, end] (含 end); 多段范围返回 None (按完整文件响应)"""
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None:
+        return None
+
+    start, end = match.groups()
+    if start == "":
+        if end == "":
+            return None
+        # 后缀范围 (bytes=-N): N 为 0 时 start > end, 同样不可满足
+        start, end = size - min(int(end), size), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="请求范围无效",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+def iter_file_range(path: str, start: int, end: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(READ_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_immutable(request: Request, path: str, etag_base: str) -> Response:
+    """按 ETag / Range / Accept-Encoding 返回内容寻址的文件"""
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="文件不存在")
+
+    etag = f'"{etag_base}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE,
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    # 断点续传: 范围基于未压缩的原文件
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        size = os.path.getsize(path)
+        byte_range = parse_range(range_header, size)
+        if byte_range is not None:
+            start, end = byte_range
+            return StreamingResponse(
+                iter_file_range(path, start, end),
+                status_code=206,
+                media_type=MEDIA_TYPE,
+                headers={
+                    **headers,
+                    "Content-Range": f"bytes {start}-{end}/{size}",
+                    "Content-Length": str(end - start + 1),
+                },
+            )
+
+    if not range_header:
+        accepted = {
+            token.split(";")[0].strip()
+            for token in request.headers.get("accept-encoding", "").split(",")
+        }
+        for encoding, suffix in ENCODINGS.items():
+            if encoding in accepted and os.path.isfile(path + suffix):
+                return FileResponse(
+                    path + suffix,
+                    media_type=MEDIA_TYPE,
+                    headers={**headers, "ETag": f'"{etag_base}-{encoding}"', "Content-Encoding": encoding},
+                )
+
+    return FileResponse(path, media_type=MEDIA_TYPE, headers=headers)
+
+
+def artifact_dir(content_hash: str) -> str:
+    if not HASH_PATTERN.match(content_hash):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return os.path.join(settings.artifacts_dir, content_hash)
+
+
+@router.get("/artifacts/manifest")
+async def get_manifest(request: Request):
+    """模型文件清单: 每个文件的不可变 URL、大小、sha256、预压缩版本与分块列表"""
+    path = os.path.join(settings.artifacts_dir, MANIFEST_FILE)
+    if not os.path.isfile(path):
+        raise HTTPException(
+            status_code=404,
+            detail="未发布模型文件, 请运行: python ../scripts/export_onnx.py",
+        )
+
+    with open(path, "rb") as f:
+        content = f.read()
+    etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+@router.get("/artifacts/{content_hash}/chunks/{index}")
+async def get_chunk(request: Request, content_hash: str, index: int):
+    """单个分块 (可被浏览器独立缓存)"""
+    directory = artifact_dir(content_hash)
+    layout_path = os.path.join(directory, "chunks.json")
+    if not os.path.isfile(layout_path):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    with open(layout_path, encoding="utf-8") as f:
+        chunks = json.load(f)["chunks"]
+    if not 0 <= index < len(chunks):
+        raise HTTPException(status_code=404, detail="分块不存在")
+    return serve_immutable(request, os.path.join(directory, "chunks", str(index)), chunks[index]["sha256"][:16])
+
+
+@router.get("/artifacts/{content_hash}/{name}")
+async def get_artifact(request: Request, content_hash: str, name: str):
+    """完整文件 (支持 Range 续传)"""
+    if not NAME_PATTERN.match(name):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return serve_immutable(request, os.path.join(artifact_dir(content_hash), name), content_hash)
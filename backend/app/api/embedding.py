@@ -1,56 +1,113 @@
 """Embedding API (混合模式)"""
 
 import time
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 
-from ..schemas.request import EmbeddingRequest
+from ..schemas.request import EMBEDDING_FORMATS, EmbeddingRequest
 from ..schemas.response import EmbeddingResponse
 from ..models.registry import model_registry
-from ..core.image_loader import load_image
-from ..utils.compression import compress_embedding
+from ..core.deadline import RequestAbandoned, request_deadlines
+from ..core.image_input import ImageRequest, image_request
+from ..core.embedding_cache import embedding_cache
+from ..core.inference import run_inference
+from ..core.pipeline import SERIALIZE, pipeline
+from ..core.profiling import profiler
+from ..core.response_cache import response_cache
+from ..core.traffic import traffic_recorder
+from ..core.scheduler import QueueFullError
+from ..core.singleflight import inference_flight
+from ..utils.compression import compress_embedding, compress_features
+from ..utils.hashing import hash_json
 
 router = APIRouter(prefix="/api", tags=["embedding"])
 
 
+async def run_embedding(request: EmbeddingRequest, image, image_hash: str, start_time: float) -> bytes:
+    """生成并压缩 Embedding, 返回序列化后的响应 (合并的请求共享同一份字节)"""
+    # 2. 获取/加载模型
+    manager = model_registry.get_or_load(request.model)
+
+    # 3. 生成 embedding (编码缓存/上传预计算命中时不再编码), 请求已超时/断开时不再继续
+    await request_deadlines.checkpoint("encode")
+    state = await embedding_cache.get_state(manager, image_hash, image)
+
+    def read_features() -> dict:
+        manager.restore_image_state(state)
+        if request.format == "int8":
+            return manager.image_features()
+        return {"image_embeddings": manager.image_embedding()}
+
+    features = await run_inference(manager, read_features)
+
+    # 4. 压缩并序列化 (int8 特征包有数 MB, 在流水线的 serialize 阶段执行)
+    await request_deadlines.checkpoint("serialize")
+    return await pipeline.run(SERIALIZE, serialize_embedding, request, features, image.shape, start_time)
+
+
+def serialize_embedding(request: EmbeddingRequest, features: dict, image_shape: tuple, start_time: float) -> bytes:
+    """压缩特征并序列化响应"""
+    embedding = next(iter(features.values()))
+    with profiler.stage("embedding_compress", format=request.format):
+        if request.format == "int8":
+            result = compress_features(features)
+        else:
+            result = compress_embedding(embedding)
+
+    elapsed_ms = (time.time() - start_time) * 1000
+    print(
+        f"[Embedding] {request.model} 耗时: {elapsed_ms:.0f}ms, "
+        f"原始: {result.raw_size/1024:.0f}KB → 压缩: {result.compressed_size/1024:.0f}KB "
+        f"({result.ratio:.1%})"
+    )
+
+    return EmbeddingResponse(
+        embedding=result.encoded,
+        shape=list(embedding.shape),
+        original_size=[image_shape[0], image_shape[1]],
+        compressed_size=result.compressed_size,
+        model=request.model,
+        format=request.format,
+        tensors=getattr(result, "tensors", None),
+    ).model_dump_json().encode("utf-8")
+
+
 @router.post("/embedding", response_model=EmbeddingResponse)
-async def create_embedding(request: EmbeddingRequest):
+async def create_embedding(
+    http_request: Request,
+    submission: ImageRequest[EmbeddingRequest] = Depends(image_request(EmbeddingRequest)),
+):
     """
     生成图片 Embedding (混合模式)
     后端生成 Embedding，压缩后传给前端
     前端用 ONNX Decoder 做交互式解码
+    相同的并发请求只计算一次, 重复的请求直接返回缓存的响应 (支持 If-None-Match)
+    图片可通过 image_url 或 multipart / 原始字节直接提交
     """
     start_time = time.time()
+    request = submission.body
+    if request.format not in EMBEDDING_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的格式: {request.format} (支持: {EMBEDDING_FORMATS})")
 
     try:
         # 1. 加载图片
-        image = await load_image(request.image_url)
-
-        # 2. 获取/加载模型
-        manager = model_registry.get_or_load(request.model)
-
-        # 3. 生成 embedding
-        embedding = manager.generate_embedding(image)
-
-        # 4. 压缩
-        result = compress_embedding(embedding)
-
-        elapsed_ms = (time.time() - start_time) * 1000
-        print(
-            f"[Embedding] {request.model} 耗时: {elapsed_ms:.0f}ms, "
-            f"原始: {result.raw_size/1024:.0f}KB → 压缩: {result.compressed_size/1024:.0f}KB "
-            f"({result.ratio:.1%})"
-        )
+        with profiler.stage("image_load"):
+            image = await submission.load()
+            image_hash = await submission.hash()
+        traffic_recorder.annotate_request(request, image, image_hash)
+        await request_deadlines.checkpoint("image_load")
 
-        return EmbeddingResponse(
-            embedding=result.encoded,
-            shape=list(embedding.shape),
-            original_size=[image.shape[0], image.shape[1]],
-            compressed_size=result.compressed_size,
-            model=request.model,
-        )
+        key = hash_json(["embedding", request.model, image_hash, request.format])
+        body, etag = await response_cache.get_or_compute("embedding", key, lambda: inference_flight.do(
+            "embedding", key, lambda: run_embedding(request, image, image_hash, start_time),
+        ))
+        return response_cache.respond(http_request, "embedding", body, etag)
 
+    except RequestAbandoned as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except NotImplementedError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except ImportError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -0,0 +1,190 @@
+"""交互式分割 WebSocket (纯后端模式)
+
+连接绑定一张图片和一个模型, 建立时编码一次,
+之后每次点击只发送紧凑的二进制消息, 服务端只解码最新一次点击:
+尚未开始的旧点击直接丢弃 (latest-wins)
+mask 消息的 dropped 为上一条 mask 之后未返回结果的点击数:
+开始解码前被覆盖的, 以及解码完成时已有新点击、结果过期而跳过的
+
+客户端 → 服务端 (二进制, 小端):
+    uint32 seq | uint16 n | n × (float32 x, float32 y, uint8 label)
+
+服务端 → 客户端 (JSON 文本):
+    {"type": "ready", "mask_size": [H, W], "time_ms": ...}
+    {"type": "mask", "seq": ..., "mask": RLE, "mask_size": [H, W], "score": ..., "time_ms": ..., "dropped": ...}
+    {"type": "error", "detail": ...}
+"""
+
+import asyncio
+import struct
+import time
+from typing import Optional
+
+import numpy as np
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+
+from ..models.registry import model_registry
+from ..core.image_loader import load_image
+from ..core.embedding_cache import embedding_cache
+from ..core.inference import run_inference
+from ..core.profiling import profiler
+from ..core.scheduler import INTERACTIVE
+from ..utils.hashing import hash_image
+from ..utils.rle import encode_mask_rle
+
+router = APIRouter(prefix="/api", tags=["interactive"])
+
+CLICK_HEADER = struct.Struct("<IH")
+CLICK_POINT = struct.Struct("<ffB")
+
+
+class Click:
+    """一次点击 (包含当前所有累积的点)"""
+
+    def __init__(self, seq: int, points: np.ndarray, labels: np.ndarray):
+        self.seq = seq
+        self.points = points
+        self.labels = labels
+        self.received_at = time.time()
+
+
+def parse_click(data: bytes) -> Click:
+    """解析二进制点击消息"""
+    if len(data) < CLICK_HEADER.size:
+        raise ValueError("点击消息过短")
+
+    seq, n = CLICK_HEADER.unpack_from(data, 0)
+    if n == 0 or len(data) != CLICK_HEADER.size + n * CLICK_POINT.size:
+        raise ValueError(f"点击消息长度不匹配: {len(data)} 字节, {n} 个点")
+
+    points = np.empty((n, 2), dtype=np.float32)
+    labels = np.empty(n, dtype=np.int32)
+    for i, (x, y, label) in enumerate(CLICK_POINT.iter_unpack(data[CLICK_HEADER.size:])):
+        points[i] = (x, y)
+        labels[i] = label
+    return Click(seq, points, labels)
+
+
+class LatestClick:
+    """只保留最新点击的单槽队列, 被覆盖的点击计为丢弃 (过期结果由 worker 计入)"""
+
+    def __init__(self):
+        self._click: Optional[Click] = None
+        self._event = asyncio.Event()
+        self.dropped = 0
+
+    def put(self, click: Click) -> None:
+        if self._click is not None:
+            self.dropped += 1
+        self._click = click
+        self._event.set()
+
+    async def take(self) -> Click:
+        await self._event.wait()
+        self._event.clear()
+        click, self._click = self._click, None
+        return click
+
+    @property
+    def has_pending(self) -> bool:
+        return self._click is not None
+
+
+@router.websocket("/ws/segment")
+async def interactive_segment(websocket: WebSocket, image_url: str, model: str = "sam1_vit_b"):
+    """
+    交互式分割通道
+    连接参数: ?image_url=...&model=...
+    """
+    await websocket.accept()
+
+    # 1. 加载图片并编码一次 (编码缓存/上传预计算命中时跳过), 保存编码状态快照
+    try:
+        start_time = time.time()
+        with profiler.stage("image_load"):
+            image = await load_image(image_url)
+            image_hash = await run_in_threadpool(hash_image, image)
+        manager = model_registry.get_or_load(model)
+
+        image_state = await embedding_cache.get_state(manager, image_hash, image, INTERACTIVE)
+    except Exception as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1011)
+        return
+
+    mask_size = [image.shape[0], image.shape[1]]
+    await websocket.send_json({
+        "type": "ready",
+        "mask_size": mask_size,
+        "time_ms": (time.time() - start_time) * 1000,
+    })
+    print(f"[WS] {model} 会话建立, 编码耗时: {(time.time() - start_time) * 1000:.0f}ms")
+
+    latest = LatestClick()
+
+    def decode(click):
+        with profiler.stage("predict", points=len(click.points), seq=click.seq):
+            return manager.predict_from_state(image_state, click.points, click.labels)
+
+    async def worker():
+        reported_dropped = 0
+        while True:
+            click = await latest.take()
+            try:
+                # 其他请求可能已对同一模型编码了别的图片, 先恢复本会话的编码状态
+                masks, scores = await run_inference(manager, decode, click, priority=INTERACTIVE)
+            except Exception as e:
+                await websocket.send_json({"type": "error", "seq": click.seq, "detail": str(e)})
+                continue
+
+            # 解码期间又来了新点击: 本结果已过期, 跳过序列化 (同样计为丢弃)
+            if latest.has_pending:
+                latest.dropped += 1
+                continue
+
+            best_idx = int(np.argmax(scores))
+            with profiler.stage("mask_encode", seq=click.seq):
+                mask_rle = encode_mask_rle(masks[best_idx])
+            await websocket.send_json({
+                "type": "mask",
+                "seq": click.seq,
+                "mask": mask_rle,
+                "mask_size": mask_size,
+                "score": float(scores[best_idx]),
+                "time_ms": (time.time() - click.received_at) * 1000,
+                "dropped": latest.dropped - reported_dropped,
+            })
+            reported_dropped = latest.dropped
+
+    worker_task = asyncio.create_task(worker())
+
+    # 2. 接收点击, 新点击覆盖尚未开始的旧点击
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            data = message.get("bytes")
+            if data is None:
+                await websocket.send_json({"type": "error", "detail": "点击消息必须为二进制"})
+                continue
+
+            try:
+                latest.put(parse_click(data))
+            except (ValueError, struct.error) as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+
+            if worker_task.done():
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        worker_task.cancel()
+        try:
+            await worker_task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[WS] {model} 会话异常: {e}")
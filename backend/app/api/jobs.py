@@ -0,0 +1,111 @@
+"""异步任务 API
+
+提交耗时任务后立即返回任务 ID, 通过轮询或 SSE 订阅进度与结果,
+避免长连接在代理后超时
+"""
+
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import ValidationError
+
+from ..schemas.request import JobSubmitRequest
+from ..schemas.response import JobInfo
+from ..core import job_handlers  # noqa: F401  注册任务类型
+from ..core.jobs import COMPLETED, FINISHED, job_manager
+
+router = APIRouter(prefix="/api", tags=["jobs"])
+
+SSE_POLL_INTERVAL = 0.5
+
+
+def get_job_or_404(job_id: str) -> dict:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    return job
+
+
+def to_job_info(job: dict, cached: bool = False) -> JobInfo:
+    return JobInfo(
+        id=job["id"],
+        type=job["type"],
+        status=job["status"],
+        progress=job["progress"],
+        message=job["message"],
+        error=job["error"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+        cached=cached,
+    )
+
+
+@router.post("/jobs", response_model=JobInfo, status_code=202)
+async def submit_job(request: JobSubmitRequest):
+    """
+    提交异步任务
+    相同任务已完成或正在执行时直接返回已有任务
+    """
+    try:
+        job, cached = job_manager.submit(request.type, request.payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=json.loads(e.json()))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return to_job_info(job, cached)
+
+
+@router.get("/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str):
+    """查询任务状态 (轮询)"""
+    return to_job_info(get_job_or_404(job_id))
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """获取任务结果 (仅已完成的任务)"""
+    job = get_job_or_404(job_id)
+    if job["status"] != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"任务未完成: {job['status']}")
+    return FileResponse(job_manager.result_path(job_id), media_type="application/json")
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    SSE 订阅任务进度
+    状态或进度变化时推送 progress 事件, 结束时推送 done 事件后关闭
+    """
+    get_job_or_404(job_id)
+
+    async def event_stream():
+        last = None
+        while True:
+            job = job_manager.get(job_id)
+            info = to_job_info(job).model_dump()
+            snapshot = (info["status"], info["progress"], info["message"])
+
+            if snapshot != last:
+                last = snapshot
+                event = "done" if job["status"] in FINISHED else "progress"
+                yield f"event: {event}\ndata: {json.dumps(info, ensure_ascii=False)}\n\n"
+
+            if job["status"] in FINISHED or await request.is_disconnected():
+                return
+            await asyncio.sleep(SSE_POLL_INTERVAL)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.delete("/jobs/{job_id}", response_model=JobInfo)
+async def cancel_job(job_id: str):
+    """取消任务 (未开始的直接取消, 运行中的在下一个检查点停止)"""
+    get_job_or_404(job_id)
+    return to_job_info(job_manager.cancel(job_id))
@@ -0,0 +1,27 @@
+"""运行指标 API"""
+
+from fastapi import APIRouter
+
+from ..core.deadline import request_deadlines
+from ..core.embedding_cache import embedding_cache
+from ..core.pipeline import pipeline
+from ..core.response_cache import response_cache
+from ..core.scheduler import scheduler
+from ..core.singleflight import inference_flight
+from ..models.registry import model_registry
+
+router = APIRouter(prefix="/api", tags=["metrics"])
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """各子系统的运行统计"""
+    return {
+        "coalescing": inference_flight.stats(),
+        "scheduler": scheduler.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "replicas": model_registry.replica_stats(),
+        "deadlines": request_deadlines.stats(),
+        "pipeline": pipeline.stats(),
+    }
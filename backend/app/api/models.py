@@ -3,6 +3,7 @@
 from fastapi import APIRouter
 from ..schemas.response import ModelInfo
 from ..models.registry import model_registry
+from ..core.embedding_cache import embedding_cache
 from ..config import settings
 
 router = APIRouter(prefix="/api", tags=["models"])
@@ -13,15 +14,23 @@ async def list_models():
     """列出所有可用模型及其状态"""
     loaded = model_registry.list_loaded()
 
-    return [
-        ModelInfo(
+    result = []
+    for model_id, config in settings.available_models.items():
+        manager = model_registry.get(model_id)
+        stats = manager.load_stats if manager is not None else {}
+        result.append(ModelInfo(
             id=model_id,
             family=config["family"],
             checkpoint=config["checkpoint"],
             is_loaded=model_id in loaded,
-        )
-        for model_id, config in settings.available_models.items()
-    ]
+            quantized=config.get("quantized", False),
+            replicas=stats.get("replicas"),
+            load_method=stats.get("load_method"),
+            load_time_ms=stats.get("load_time_ms"),
+            peak_rss_mb=stats.get("peak_rss_mb"),
+            load_peak_delta_mb=stats.get("load_peak_delta_mb"),
+        ))
+    return result
 
 
 @router.post("/models/{model_id}/load")
@@ -38,4 +47,5 @@ async def load_model(model_id: str):
 async def unload_model(model_id: str):
     """卸载指定模型"""
     model_registry.unload(model_id)
+    embedding_cache.clear(model_id)
     return {"status": "ok", "model": model_id}
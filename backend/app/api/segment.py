@@ -1,19 +1,38 @@
 """分割 API (纯后端模式)"""
 
+import asyncio
+import json
 import time
 import base64
+from contextlib import contextmanager
 from io import BytesIO
+from typing import Optional
 import numpy as np
 from PIL import Image
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 
-from ..schemas.request import SegmentRequest
+from ..config import settings
+from ..schemas.request import CascadeSegmentRequest, CompareSegmentRequest, SegmentRequest
 from ..schemas.response import SegmentResponse
 from ..models.registry import model_registry
-from ..core.image_loader import load_image
+from ..core.deadline import RequestAbandoned, request_deadlines
+from ..core.image_input import ImageRequest, image_request
+from ..core.embedding_cache import embedding_cache
+from ..core.inference import run_inference
+from ..core.pipeline import SERIALIZE, pipeline
+from ..core.profiling import profiler
+from ..core.response_cache import response_cache
+from ..core.traffic import traffic_recorder
+from ..core.scheduler import INTERACTIVE, STANDARD, QueueFullError
+from ..core.singleflight import inference_flight
+from ..utils.hashing import hash_json
 
 router = APIRouter(prefix="/api", tags=["segment"])
 
+MAX_COMPARE_MODELS = 8
+
 
 def mask_to_base64_png(mask: np.ndarray) -> str:
     """将二值 mask 转为半透明蓝色 PNG 的 base64"""
@@ -28,47 +47,112 @@ def mask_to_base64_png(mask: np.ndarray) -> str:
     return base64.b64encode(buf.getvalue()).decode('utf-8')
 
 
-@router.post("/segment", response_model=SegmentResponse)
-async def segment(request: SegmentRequest):
+def flight_key(request: SegmentRequest, image_hash: str) -> str:
+    """合并/缓存键: (端点, 模型, 图片内容哈希, 规范化的点击)"""
+    points = [[round(p.x, 3), round(p.y, 3), p.type] for p in request.points]
+    return hash_json(["segment", request.model, image_hash, points])
+
+
+@contextmanager
+def timed(timings: Optional[dict], name: str):
+    """把阶段耗时 (ms, 含排队) 记入 timings, 为 None 时不记录"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+async def run_segment(
+    request: SegmentRequest,
+    image: np.ndarray,
+    image_hash: str,
+    start_time: float,
+    priority: str = INTERACTIVE,
+    timings: Optional[dict] = None,
+) -> bytes:
     """
-    纯后端分割
-    Encoder + Decoder 都在服务器执行
-    返回 base64 PNG 格式的 mask
+    执行分割并返回序列化后的响应 (合并的请求共享同一份字节)
+    编码结果来自编码缓存: 同一图片的后续点击只运行 Decoder
     """
-    start_time = time.time()
+    # 2. 获取/加载模型
+    manager = model_registry.get_or_load(request.model)
 
-    try:
-        # 1. 加载图片
-        image = await load_image(request.image_url)
+    # 3. 准备点击
+    points = np.array([[p.x, p.y] for p in request.points])
+    labels = np.array([p.type for p in request.points])
+
+    # 4. 编码 (缓存/预计算命中时跳过) + 解码, 请求已超时/断开时不再继续
+    await request_deadlines.checkpoint("encode")
+    with timed(timings, "encode"):
+        state = await embedding_cache.get_state(manager, image_hash, image, priority)
+    def decode():
+        with profiler.stage("predict", points=len(points)):
+            return manager.predict_from_state(state, points, labels)
 
-        # 2. 获取/加载模型
-        manager = model_registry.get_or_load(request.model)
+    with timed(timings, "decode"):
+        masks, scores = await run_inference(manager, decode, priority=priority, stage="decode")
 
-        # 3. 准备点击
-        points = np.array([[p.x, p.y] for p in request.points])
-        labels = np.array([p.type for p in request.points])
+    # 5. 选择最佳 mask 并序列化 (流水线的 serialize 阶段)
+    await request_deadlines.checkpoint("serialize")
+    with timed(timings, "serialize"):
+        return await pipeline.run(SERIALIZE, serialize_segment, request, masks, scores, start_time)
 
-        # 4. 分割
-        masks, scores = manager.segment(image, points, labels)
 
-        # 5. 选择最佳 mask
-        best_idx = int(np.argmax(scores))
-        best_mask = masks[best_idx]
+def serialize_segment(request: SegmentRequest, masks: np.ndarray, scores: np.ndarray, start_time: float) -> bytes:
+    """选择最佳 mask, 编码为 base64 PNG 并序列化响应"""
+    best_idx = int(np.argmax(scores))
+    best_mask = masks[best_idx]
 
-        # 6. 转为 base64 PNG
+    with profiler.stage("mask_encode"):
         mask_b64 = mask_to_base64_png(best_mask)
 
-        elapsed_ms = (time.time() - start_time) * 1000
-        print(f"[Segment] {request.model} 耗时: {elapsed_ms:.0f}ms, score: {scores[best_idx]:.4f}")
+    elapsed_ms = (time.time() - start_time) * 1000
+    print(f"[Segment] {request.model} 耗时: {elapsed_ms:.0f}ms, score: {scores[best_idx]:.4f}")
+
+    return SegmentResponse(
+        mask=mask_b64,
+        mask_size=[best_mask.shape[0], best_mask.shape[1]],
+        score=float(scores[best_idx]),
+        time_ms=elapsed_ms,
+        model=request.model,
+    ).model_dump_json().encode("utf-8")
 
-        return SegmentResponse(
-            mask=mask_b64,
-            mask_size=[best_mask.shape[0], best_mask.shape[1]],
-            score=float(scores[best_idx]),
-            time_ms=elapsed_ms,
-            model=request.model,
-        )
 
+@router.post("/segment", response_model=SegmentResponse)
+async def segment(
+    http_request: Request,
+    submission: ImageRequest[SegmentRequest] = Depends(image_request(SegmentRequest)),
+):
+    """
+    纯后端分割
+    Encoder + Decoder 都在服务器执行
+    返回 base64 PNG 格式的 mask
+    相同的并发请求只计算一次, 重复的请求直接返回缓存的响应 (支持 If-None-Match)
+    图片可通过 image_url 或 multipart / 原始字节直接提交 (见 core/image_input.py)
+    """
+    start_time = time.time()
+    request = submission.body
+
+    try:
+        # 1. 加载图片
+        with profiler.stage("image_load"):
+            image = await submission.load()
+            image_hash = await submission.hash()
+        traffic_recorder.annotate_request(request, image, image_hash)
+        await request_deadlines.checkpoint("image_load")
+
+        key = flight_key(request, image_hash)
+        body, etag = await response_cache.get_or_compute("segment", key, lambda: inference_flight.do(
+            "segment", key, lambda: run_segment(request, image, image_hash, start_time),
+        ))
+        return response_cache.respond(http_request, "segment", body, etag)
+
+    except RequestAbandoned as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except ImportError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except FileNotFoundError:
@@ -78,3 +162,154 @@ async def segment(request: SegmentRequest):
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def cascade_line(stage: str, body: bytes) -> bytes:
+    """NDJSON 行: 直接拼接已序列化的分割结果, 不再重复序列化"""
+    return b'{"stage":"' + stage.encode("utf-8") + b'","result":' + body + b"}\n"
+
+
+@router.post("/segment/cascade")
+async def segment_cascade(
+    submission: ImageRequest[CascadeSegmentRequest] = Depends(image_request(CascadeSegmentRequest)),
+):
+    """
+    级联分割 (NDJSON 流)
+    快速模型的结果立即返回 (stage=fast), 随后高质量模型的结果作为细化返回 (stage=refined);
+    快速结果的预测 IoU 已不低于阈值时跳过细化
+    细化阶段按 standard 优先级排队, 不挤占其他用户的快速结果
+    两个阶段与 /api/segment 共享请求合并与响应缓存
+    """
+    start_time = time.time()
+    request = submission.body
+    threshold = request.skip_threshold
+    if threshold is None:
+        threshold = settings.cascade_skip_threshold
+
+    try:
+        with profiler.stage("image_load"):
+            image = await submission.load()
+            image_hash = await submission.hash()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        await request_deadlines.checkpoint("image_load")
+    except RequestAbandoned as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    async def run_stage(model: str, priority: str) -> bytes:
+        stage_request = SegmentRequest(image_url=request.image_url, points=request.points, model=model)
+        key = flight_key(stage_request, image_hash)
+        body, _ = await response_cache.get_or_compute("segment", key, lambda: inference_flight.do(
+            "segment", key, lambda: run_segment(stage_request, image, image_hash, time.time(), priority),
+        ))
+        return body
+
+    async def stream():
+        try:
+            body = await run_stage(request.fast_model, INTERACTIVE)
+            yield cascade_line("fast", body)
+
+            fast_score = json.loads(body)["score"]
+            refine = fast_score < threshold and request.model != request.fast_model
+            if refine:
+                yield cascade_line("refined", await run_stage(request.model, STANDARD))
+
+            elapsed_ms = (time.time() - start_time) * 1000
+            print(
+                f"[Cascade] {request.fast_model} → {request.model if refine else '跳过细化'}, "
+                f"fast score: {fast_score:.4f}, 耗时: {elapsed_ms:.0f}ms"
+            )
+            yield json.dumps({
+                "stage": "done",
+                "refined": refine,
+                "fast_score": fast_score,
+                "threshold": threshold,
+                "time_ms": elapsed_ms,
+            }).encode("utf-8") + b"\n"
+
+        except Exception as e:
+            yield json.dumps({"stage": "error", "detail": str(e)}, ensure_ascii=False).encode("utf-8") + b"\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.post("/segment/compare")
+async def segment_compare(
+    submission: ImageRequest[CompareSegmentRequest] = Depends(image_request(CompareSegmentRequest)),
+):
+    """
+    多模型对比分割 (NDJSON 流)
+    图片只加载、解码一次, 各模型并行执行 (各自的执行槽, 多副本模型使用各自绑定的核心),
+    每个模型完成即返回一行: 分割结果 + 阶段耗时 (model_load / encode / decode / serialize);
+    结果来自响应缓存或合并的请求时 cached 为 true, 没有阶段耗时
+    与 /api/segment 共享请求合并与响应缓存
+    """
+    start_time = time.time()
+    request = submission.body
+
+    models = list(dict.fromkeys(request.models))
+    if not models:
+        raise HTTPException(status_code=400, detail="至少指定一个模型")
+    if len(models) > MAX_COMPARE_MODELS:
+        raise HTTPException(status_code=400, detail=f"最多对比 {MAX_COMPARE_MODELS} 个模型")
+    unknown = [m for m in models if m not in settings.available_models]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知模型: {unknown}")
+
+    try:
+        with profiler.stage("image_load"):
+            image = await submission.load()
+            image_hash = await submission.hash()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        await request_deadlines.checkpoint("image_load")
+    except RequestAbandoned as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    async def run_model(model: str) -> bytes:
+        model_start = time.perf_counter()
+        timings: dict[str, float] = {}
+        try:
+            # 在线程池中加载, 不阻塞其他模型的推理
+            with timed(timings, "model_load"):
+                await run_in_threadpool(model_registry.get_or_load, model)
+
+            model_request = SegmentRequest(image_url=request.image_url, points=request.points, model=model)
+            key = flight_key(model_request, image_hash)
+            computed: dict[str, float] = {}
+            body, _ = await response_cache.get_or_compute("segment", key, lambda: inference_flight.do(
+                "segment", key,
+                lambda: run_segment(model_request, image, image_hash, time.time(), STANDARD, computed),
+            ))
+            timings.update(computed)
+            line = {
+                "stage": "result",
+                "model": model,
+                "cached": not computed,
+                "timings": timings,
+                "time_ms": round((time.perf_counter() - model_start) * 1000, 1),
+            }
+            # 直接拼接已序列化的分割结果
+            return json.dumps(line).encode("utf-8")[:-1] + b',"result":' + body + b"}\n"
+        except Exception as e:
+            return json.dumps(
+                {"stage": "error", "model": model, "detail": str(e)}, ensure_ascii=False
+            ).encode("utf-8") + b"\n"
+
+    async def stream():
+        tasks = [asyncio.ensure_future(run_model(model)) for model in models]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+
+            elapsed_ms = (time.time() - start_time) * 1000
+            print(f"[Compare] {', '.join(models)} 耗时: {elapsed_ms:.0f}ms")
+            yield json.dumps({"stage": "done", "models": models, "time_ms": elapsed_ms}).encode("utf-8") + b"\n"
+        finally:
+            # 客户端断开时取消尚未完成的模型 (共享的计算不受影响)
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
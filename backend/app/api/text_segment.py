@@ -1,56 +1,123 @@
 """文本分割 API (SAM3 专用)"""
 
 import time
-from fastapi import APIRouter, HTTPException
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Request
 
 from ..schemas.request import TextSegmentRequest
 from ..schemas.response import TextSegmentResponse
 from ..models.registry import model_registry
 from ..models.sam3_manager import SAM3Manager
-from ..core.image_loader import load_image
+from ..core.deadline import RequestAbandoned, request_deadlines
+from ..core.image_input import ImageRequest, image_request
+from ..core.inference import run_inference
+from ..core.pipeline import SERIALIZE, pipeline
+from ..core.profiling import profiler
+from ..core.response_cache import response_cache
+from ..core.scheduler import QueueFullError
+from ..core.traffic import traffic_recorder
+from ..utils.hashing import hash_json
 from ..utils.rle import encode_mask_rle
 
 router = APIRouter(prefix="/api", tags=["text-segment"])
 
 
+async def run_text_segment(request: TextSegmentRequest, image: np.ndarray, start_time: float) -> bytes:
+    """执行文本分割并返回序列化后的响应"""
+    # 2. 获取 SAM3 管理器
+    manager = model_registry.get_or_load("sam3")
+    if not isinstance(manager, SAM3Manager):
+        raise HTTPException(
+            status_code=400,
+            detail="文本分割仅支持 SAM3 模型"
+        )
+
+    # 3. 文本分割 (crop 模式只拷回并编码检测框内的区域)
+    mask_sizes = offsets = None
+    if request.crop:
+        masks, offsets, scores, boxes = await run_inference(
+            manager, manager.segment_text_cropped,
+            image, request.prompt, request.confidence, request.crop_padding, stage="encode",
+        )
+        mask_sizes = [list(m.shape) for m in masks]
+        offsets = offsets.tolist()
+    else:
+        masks, scores, boxes = await run_inference(
+            manager, manager.segment_text, image, request.prompt, request.confidence, stage="encode",
+        )
+
+    # 4. 编码所有 masks 并序列化 (流水线的 serialize 阶段)
+    await request_deadlines.checkpoint("serialize")
+    return await pipeline.run(
+        SERIALIZE, serialize_text_segment, masks, scores, boxes, mask_sizes, offsets, start_time
+    )
+
+
+def serialize_text_segment(masks, scores, boxes, mask_sizes, offsets, start_time: float) -> bytes:
+    """RLE 编码所有 mask 并序列化响应"""
+    with profiler.stage("mask_encode", count=len(masks)):
+        masks_rle = [encode_mask_rle(m) for m in masks]
+
+    elapsed_ms = (time.time() - start_time) * 1000
+
+    return TextSegmentResponse(
+        masks=masks_rle,
+        scores=scores.tolist(),
+        boxes=boxes.tolist(),
+        count=len(masks),
+        time_ms=elapsed_ms,
+        mask_sizes=mask_sizes,
+        offsets=offsets,
+    ).model_dump_json().encode("utf-8")
+
+
+def cache_key(request: TextSegmentRequest, image_hash: str) -> str:
+    """缓存键: (端点, 图片内容哈希, 规范化的文本提示, 置信度, 输出格式)"""
+    prompt = " ".join(request.prompt.split())
+    return hash_json([
+        "segment/text", "sam3", image_hash, prompt,
+        round(request.confidence, 4), request.crop, request.crop_padding if request.crop else 0,
+    ])
+
+
 @router.post("/segment/text", response_model=TextSegmentResponse)
-async def segment_text(request: TextSegmentRequest):
+async def segment_text(
+    http_request: Request,
+    submission: ImageRequest[TextSegmentRequest] = Depends(image_request(TextSegmentRequest)),
+):
     """
     文本提示分割 (SAM3 独有)
     使用文字描述分割目标，如 "a dog"
+    图片可通过 image_url 或 multipart / 原始字节直接提交
+    重复的请求直接返回缓存的响应 (支持 If-None-Match)
     """
     start_time = time.time()
+    request = submission.body
+
+    if request.crop_padding < 0:
+        raise HTTPException(status_code=400, detail="crop_padding 不能为负数")
 
     try:
         # 1. 加载图片
-        image = await load_image(request.image_url)
-
-        # 2. 获取 SAM3 管理器
-        manager = model_registry.get_or_load("sam3")
-        if not isinstance(manager, SAM3Manager):
-            raise HTTPException(
-                status_code=400,
-                detail="文本分割仅支持 SAM3 模型"
-            )
-
-        # 3. 文本分割
-        masks, scores, boxes = manager.segment_text(
-            image, request.prompt, request.confidence
-        )
-
-        # 4. 编码所有 masks
-        masks_rle = [encode_mask_rle(m) for m in masks]
-
-        elapsed_ms = (time.time() - start_time) * 1000
+        with profiler.stage("image_load"):
+            image = await submission.load()
+            image_hash = await submission.hash()
+        traffic_recorder.annotate_request(request, image, image_hash, model="sam3")
+        await request_deadlines.checkpoint("image_load")
 
-        return TextSegmentResponse(
-            masks=masks_rle,
-            scores=scores.tolist(),
-            boxes=boxes.tolist(),
-            count=len(masks),
-            time_ms=elapsed_ms,
+        body, etag = await response_cache.get_or_compute(
+            "segment/text",
+            cache_key(request, image_hash),
+            lambda: run_text_segment(request, image, start_time),
         )
+        return response_cache.respond(http_request, "segment/text", body, etag)
 
+    except HTTPException:
+        raise
+    except RequestAbandoned as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except ImportError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -1,36 +1,85 @@
 """图片上传 API"""
 
+import asyncio
 import os
 import uuid
-from fastapi import APIRouter, UploadFile, File
+from fastapi import APIRouter, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 
+from ..config import settings
+from ..core.embedding_cache import embedding_cache
+from ..core.image_loader import load_image_from_file
+from ..core.traffic import traffic_recorder
+from ..utils.hashing import hash_bytes, hash_image
+
 router = APIRouter(prefix="/api", tags=["upload"])
 
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# 持有后台预编码任务的引用, 避免被垃圾回收
+background_tasks: set[asyncio.Task] = set()
+
+
+async def precompute_embeddings(filepath: str, models: list[str]) -> None:
+    """后台解码图片并以 bulk 优先级预编码 (结果进入编码缓存)"""
+    try:
+        image = await run_in_threadpool(load_image_from_file, filepath)
+        image_hash = await run_in_threadpool(hash_image, image)
+    except Exception as e:
+        print(f"[Precompute] 图片解码失败: {e}")
+        return
+
+    for model in models:
+        embedding_cache.precompute(model, image_hash, image)
+
 
 @router.post("/upload")
-async def upload_image(file: UploadFile = File(...)):
+async def upload_image(
+    file: UploadFile = File(...),
+    precompute: list[str] = Form([], description="上传后在后台预编码的模型 ID"),
+):
     """
     上传图片，返回可访问的 URL
+    文件名为内容哈希: 相同图片得到相同 URL, 也作为多实例路由的键
+    指定 precompute 时立即返回, 同时在后台以低优先级预编码,
+    首次点击/Embedding 请求直接命中 (或等待进行中的) 编码结果
     """
+    unknown = [m for m in precompute if m not in settings.available_models]
+    if unknown:
+        return JSONResponse(status_code=400, content={"detail": f"未知模型: {unknown}"})
+
     if not file.content_type or not file.content_type.startswith("image/"):
         return JSONResponse(status_code=400, content={"detail": "仅支持图片文件"})
 
     # 生成文件名
+    content = await file.read()
+    digest = hash_bytes(content)
     ext = file.filename.split(".")[-1] if file.filename else "png"
-    filename = f"{uuid.uuid4().hex}.{ext}"
+    filename = f"{digest}.{ext}"
     filepath = os.path.join(UPLOAD_DIR, filename)
 
-    # 保存文件
-    content = await file.read()
-    with open(filepath, "wb") as f:
-        f.write(content)
+    # 保存文件 (已存在则复用)
+    if not os.path.exists(filepath):
+        tmp_path = f"{filepath}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, filepath)
+
+    traffic_recorder.annotate_upload(digest, ext, content, precompute)
+
+    if precompute:
+        # 去重并保持顺序
+        precompute = list(dict.fromkeys(precompute))
+        task = asyncio.ensure_future(precompute_embeddings(filepath, precompute))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
 
     return {
         "filename": filename,
         "url": f"/uploads/{filename}",
         "size": len(content),
+        "hash": digest,
+        "precompute": precompute,
     }
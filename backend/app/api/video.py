@@ -0,0 +1,169 @@
+"""视频分割 API (SAM2 视频传播)"""
+
+import json
+import os
+import tempfile
+import time
+from typing import Optional
+
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+
+import numpy as np
+
+from ..config import settings
+from ..schemas.request import VideoSegmentRequest
+from ..models.registry import model_registry
+from ..models.sam2_manager import SAM2Manager
+from ..core.video_loader import FrameListSource, VideoFileSource
+from ..utils.rle import encode_mask_rle
+
+router = APIRouter(prefix="/api", tags=["video"])
+
+CHUNK_SIZE = 1024 * 1024
+
+
+async def save_upload_to_temp(file: UploadFile) -> str:
+    """分块写入临时文件 (OpenCV 需要文件路径), 超过大小限制直接拒绝"""
+    suffix = os.path.splitext(file.filename or "")[1] or ".mp4"
+    limit = settings.video_max_upload_mb * 1024 * 1024
+    written = 0
+
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+    try:
+        while chunk := await file.read(CHUNK_SIZE):
+            written += len(chunk)
+            if written > limit:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"视频超过 {settings.video_max_upload_mb}MB 限制",
+                )
+            tmp.write(chunk)
+    except BaseException:
+        tmp.close()
+        os.remove(tmp.name)
+        raise
+    tmp.close()
+    return tmp.name
+
+
+def discard_temp(path: Optional[str]) -> None:
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def prepare_video(
+    manager: SAM2Manager,
+    request: VideoSegmentRequest,
+    video_path: Optional[str],
+) -> dict:
+    """构建惰性帧来源, 初始化推理状态并添加关键帧提示"""
+    if video_path:
+        source = VideoFileSource(video_path)
+    else:
+        source = FrameListSource(request.frame_urls)
+
+    state = manager.init_video_state(source, settings.video_max_cached_frames)
+
+    for prompt in request.prompts:
+        if not 0 <= prompt.frame_idx < len(source):
+            raise ValueError(f"提示帧越界: {prompt.frame_idx} (共 {len(source)} 帧)")
+
+        points = labels = None
+        if prompt.points:
+            points = np.array([[p.x, p.y] for p in prompt.points], dtype=np.float32)
+            labels = np.array([p.type for p in prompt.points], dtype=np.int32)
+        box = np.array(prompt.box, dtype=np.float32) if prompt.box else None
+
+        manager.add_video_prompt(state, prompt.frame_idx, prompt.obj_id, points, labels, box)
+
+    return state
+
+
+def stream_propagation(
+    manager: SAM2Manager,
+    state: dict,
+    direction: str,
+    video_path: Optional[str],
+):
+    """逐帧产出 NDJSON: 每行一帧, 每个目标一个 RLE mask"""
+    start_time = time.time()
+    frames = 0
+    height, width = state["video_height"], state["video_width"]
+
+    try:
+        yield json.dumps({
+            "type": "meta",
+            "num_frames": state["num_frames"],
+            "size": [height, width],
+        }) + "\n"
+
+        for frame_idx, obj_ids, masks in manager.propagate_video(state, direction):
+            frames += 1
+            yield json.dumps({
+                "type": "frame",
+                "frame_idx": frame_idx,
+                "obj_ids": obj_ids,
+                "masks": [encode_mask_rle(m) for m in masks],
+            }) + "\n"
+
+        elapsed_ms = (time.time() - start_time) * 1000
+        print(f"[Video] {manager.model_id} 传播 {frames} 帧, 耗时: {elapsed_ms:.0f}ms")
+        yield json.dumps({"type": "done", "frames": frames, "time_ms": elapsed_ms}) + "\n"
+
+    except Exception as e:
+        yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+    finally:
+        manager.reset_video_state(state)
+        discard_temp(video_path)
+
+
+@router.post("/video/segment")
+async def segment_video(
+    request: str = Form(..., description="VideoSegmentRequest JSON"),
+    file: Optional[UploadFile] = File(None),
+):
+    """
+    视频目标分割 (SAM2)
+    上传视频或提供有序帧列表, 在关键帧上放置提示,
+    利用记忆库向前/向后传播, 以 NDJSON 流逐帧返回 RLE mask
+    """
+    try:
+        video_request = VideoSegmentRequest.model_validate_json(request)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+    if video_request.direction not in ("forward", "backward", "both"):
+        raise HTTPException(status_code=400, detail=f"未知传播方向: {video_request.direction}")
+    if file is None and not video_request.frame_urls:
+        raise HTTPException(status_code=400, detail="请上传视频或提供 frame_urls")
+    if not video_request.prompts:
+        raise HTTPException(status_code=400, detail="至少需要一个关键帧提示")
+
+    video_path = await save_upload_to_temp(file) if file is not None else None
+
+    try:
+        # 视频传播使用独立的 video predictor, 多副本模型直接使用第一个副本
+        manager = model_registry.get_or_load(video_request.model).primary
+        if not isinstance(manager, SAM2Manager):
+            raise HTTPException(status_code=400, detail="视频分割仅支持 SAM2 模型")
+
+        state = await run_in_threadpool(prepare_video, manager, video_request, video_path)
+
+    except HTTPException:
+        discard_temp(video_path)
+        raise
+    except (ImportError, ValueError) as e:
+        discard_temp(video_path)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        discard_temp(video_path)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return StreamingResponse(
+        stream_propagation(manager, state, video_request.direction, video_path),
+        media_type="application/x-ndjson",
+    )
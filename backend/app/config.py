@@ -13,6 +13,68 @@ class Settings(BaseSettings):
     models_dir: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "models")
     device: str = "mps"  # cuda / cpu / mps (macOS Apple Silicon)
 
+    # 视频传播 (SAM2)
+    video_max_cached_frames: int = 32  # 内存中最多缓存的已解码帧数
+    video_max_upload_mb: int = 500
+
+    # 异步任务
+    jobs_dir: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "jobs")
+    job_workers: int = 1  # 并发执行的任务数
+
+    # 路由网关 (多实例部署, 见 app/gateway)
+    gateway_backends: list[str] = []
+    gateway_virtual_nodes: int = 128
+    gateway_max_inflight: int = 4  # 单实例在途请求达到此值视为饱和
+    gateway_health_interval: float = 5.0
+
+    # 优先级调度: 各优先级的排队上限与权重 (都在排队时按权重分配执行机会)
+    scheduler_queue_limits: dict[str, int] = {"interactive": 32, "standard": 64, "bulk": 256}
+    scheduler_weights: dict[str, int] = {"interactive": 8, "standard": 3, "bulk": 1}
+
+    # 图片编码缓存 (按模型与图片内容哈希缓存编码结果) 的最大条目数
+    embedding_cache_size: int = 16
+
+    # 响应缓存 (相同请求直接返回已序列化的响应, 带 ETag) 的字节预算
+    response_cache_mb: int = 64
+
+    # 级联分割: 快速模型的预测 IoU 不低于该值时跳过高质量模型
+    cascade_skip_threshold: float = 0.95
+
+    # 多副本 (仅 CPU): 模型 ID → 副本数, 每个副本绑定互不重叠的核心并行处理请求
+    # replica_threads 为每个副本的线程数, 0 表示平均分配全部核心 (见 scripts/tune_replicas.py)
+    model_replicas: dict[str, int] = {}
+    replica_threads: int = 0
+
+    # 快速加载 checkpoint (meta 设备构建 + mmap 权重), 首次加载时转换为 safetensors
+    fast_checkpoint_loading: bool = True
+    convert_checkpoints: bool = True
+
+    # 浏览器模型文件 (ONNX) 的发布目录与分块大小, 由 scripts/export_onnx.py 生成
+    artifacts_dir: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "artifacts")
+    artifact_chunk_mb: int = 8
+
+    # 请求流水线 (见 core/pipeline.py): 各 CPU 阶段的工作线程数与队列长度
+    # 模型前向的并发由调度器按模型 (副本数) 控制
+    pipeline_stages: dict[str, dict[str, int]] = {
+        "decode": {"workers": 2, "queue": 16},
+        "preprocess": {"workers": 2, "queue": 16},
+        "serialize": {"workers": 2, "queue": 32},
+    }
+
+    # 推理请求的默认截止时间 (毫秒, 0 为不限), 可由请求头 X-Request-Timeout-Ms 指定
+    request_timeout_ms: float = 0
+
+    # 推理端点直接提交图片 (multipart / 原始字节) 的大小上限, JSON 请求体按 base64 膨胀放宽
+    max_image_upload_mb: int = 20
+
+    # 流量录制 (回放压测见 scripts/replay_traffic.py): 启动即录制, 也可通过管理接口开关
+    traffic_record: bool = False
+    traffic_dir: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "traffic")
+    traffic_record_images: bool = False  # 保存原始图片 (默认只记录哈希与尺寸)
+
+    # 管理接口 (性能剖析等) 的令牌, 为空时禁用管理接口
+    admin_token: str = ""
+
     # CORS
     cors_origins: list[str] = [
         "http://localhost:5173",
@@ -60,6 +122,31 @@ class Settings(BaseSettings):
             "type": "vit_h",
             "family": "sam_hq",
         },
+        # int8 动态量化编码器 (仅 CPU, 与对应 float 模型共享 checkpoint)
+        "sam1_vit_b_int8": {
+            "checkpoint": "sam_vit_b_01ec64.pth",
+            "type": "vit_b",
+            "family": "sam1",
+            "quantized": True,
+        },
+        "sam1_vit_h_int8": {
+            "checkpoint": "sam_vit_h_4b8939.pth",
+            "type": "vit_h",
+            "family": "sam1",
+            "quantized": True,
+        },
+        "sam2_tiny_int8": {
+            "checkpoint": "sam2_hiera_tiny.pt",
+            "config": "sam2_hiera_t.yaml",
+            "family": "sam2",
+            "quantized": True,
+        },
+        "sam_hq_vit_h_int8": {
+            "checkpoint": "sam_hq_vit_h.pth",
+            "type": "vit_h",
+            "family": "sam_hq",
+            "quantized": True,
+        },
         # SAM3
         "sam3": {
             "checkpoint": "sam3.pt",
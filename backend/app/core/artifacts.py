@@ -0,0 +1,155 @@
+"""浏览器模型文件 (ONNX) 的发布布局
+
+导出脚本把每个文件发布为内容寻址的不可变目录, 并写入 manifest.json:
+
+    artifacts/
+      manifest.json
+      <hash>/<name>            完整文件 (支持 Range 断点续传)
+      <hash>/<name>.br / .gz   预压缩版本 (比原文件小 5% 以上才保留)
+      <hash>/<name>.json       该文件的 manifest 条目
+      <hash>/chunks/<i>        固定大小分块 (浏览器可逐块缓存)
+      <hash>/chunks/<i>.br / .gz
+
+<hash> 为文件 sha256 前 16 位, 文件内容变化时 URL 随之变化, 因此可以长期缓存
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from typing import Optional
+
+from ..config import settings
+
+MANIFEST_FILE = "manifest.json"
+HASH_LENGTH = 16
+# 预压缩至少节省 5% 才保留 (int8/float 权重通常压缩率有限)
+MIN_COMPRESSION_GAIN = 0.95
+# 各编码的文件后缀, 顺序即协商时的优先级
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _compress(data: bytes, encoding: str) -> Optional[bytes]:
+    if encoding == "br":
+        try:
+            import brotli
+        except ImportError:
+            return None
+        return brotli.compress(data, quality=9)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _write_variants(path: str, data: bytes) -> dict[str, int]:
+    """写入原文件与有效的预压缩版本, 返回 {编码: 大小}"""
+    with open(path, "wb") as f:
+        f.write(data)
+
+    variants = {}
+    for encoding, suffix in ENCODINGS.items():
+        compressed = _compress(data, encoding)
+        if compressed is not None and len(compressed) < len(data) * MIN_COMPRESSION_GAIN:
+            with open(path + suffix, "wb") as f:
+                f.write(compressed)
+            variants[encoding] = len(compressed)
+    return variants
+
+
+def _publish_chunks(data: bytes, target_dir: str, chunk_size: int) -> None:
+    """按内容写入分块 (相同内容的不同文件名共享同一目录与分块)"""
+    # 先写到临时目录, 完成后整体改名, 避免服务端读到半成品
+    tmp_dir = target_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(os.path.join(tmp_dir, "chunks"))
+
+    chunks = []
+    for index, offset in enumerate(range(0, len(data), chunk_size)):
+        chunk = data[offset:offset + chunk_size]
+        chunks.append({
+            "size": len(chunk),
+            "sha256": hashlib.sha256(chunk).hexdigest(),
+            "encodings": _write_variants(os.path.join(tmp_dir, "chunks", str(index)), chunk),
+        })
+
+    with open(os.path.join(tmp_dir, "chunks.json"), "w", encoding="utf-8") as f:
+        json.dump({"chunk_size": chunk_size, "chunks": chunks}, f, indent=2)
+    os.replace(tmp_dir, target_dir)
+
+
+def publish_artifact(source: str, artifacts_dir: str, chunk_size: int) -> dict:
+    """发布单个文件, 返回 manifest 条目 (相同内容已发布时直接复用)"""
+    name = os.path.basename(source)
+    sha256 = _sha256_file(source)
+    content_hash = sha256[:HASH_LENGTH]
+    target_dir = os.path.join(artifacts_dir, content_hash)
+    entry_path = os.path.join(target_dir, name + ".json")
+
+    if os.path.exists(entry_path):
+        with open(entry_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    with open(source, "rb") as f:
+        data = f.read()
+
+    if not os.path.isdir(target_dir):
+        _publish_chunks(data, target_dir, chunk_size)
+    with open(os.path.join(target_dir, "chunks.json"), encoding="utf-8") as f:
+        layout = json.load(f)
+
+    base_url = f"/api/artifacts/{content_hash}"
+    entry = {
+        "name": name,
+        "hash": content_hash,
+        "sha256": sha256,
+        "size": len(data),
+        "url": f"{base_url}/{name}",
+        "encodings": _write_variants(os.path.join(target_dir, name), data),
+        "chunk_size": layout["chunk_size"],
+        "chunks": [
+            {"url": f"{base_url}/chunks/{index}", **chunk}
+            for index, chunk in enumerate(layout["chunks"])
+        ],
+    }
+
+    tmp = entry_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entry, f, indent=2)
+    os.replace(tmp, entry_path)
+    return entry
+
+
+def publish_artifacts(sources: list[str], artifacts_dir: Optional[str] = None,
+                      chunk_size: Optional[int] = None) -> dict:
+    """发布一组文件并更新 manifest.json (同名文件的旧版本目录保留, 供进行中的下载使用)"""
+    artifacts_dir = artifacts_dir or settings.artifacts_dir
+    chunk_size = chunk_size or settings.artifact_chunk_mb * 1024 * 1024
+    os.makedirs(artifacts_dir, exist_ok=True)
+
+    manifest = load_manifest(artifacts_dir) or {"version": 1, "artifacts": {}}
+    for source in sources:
+        entry = publish_artifact(source, artifacts_dir, chunk_size)
+        manifest["artifacts"][entry["name"]] = entry
+        print(f"[Artifacts] {entry['name']} → {entry['url']} "
+              f"({len(entry['chunks'])} 块, 预压缩: {entry['encodings'] or '无'})")
+
+    tmp = os.path.join(artifacts_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, os.path.join(artifacts_dir, MANIFEST_FILE))
+    return manifest
+
+
+def load_manifest(artifacts_dir: Optional[str] = None) -> Optional[dict]:
+    path = os.path.join(artifacts_dir or settings.artifacts_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
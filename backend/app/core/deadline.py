@@ -0,0 +1,128 @@
+"""请求截止时间与断开检测
+
+浏览器标签关闭或客户端超时后, 排队中的请求仍会完整执行编码、解码与序列化, 结果无人接收。
+推理请求可携带截止时间 (X-Request-Timeout-Ms 头, 相对到达时刻; 未携带时使用服务端默认值),
+在各阶段边界调用 checkpoint(stage) (image_load: 图片加载后, encode / decode / serialize: 对应阶段开始前):
+截止时间已过或客户端已断开 (request.is_disconnected) 时放弃后续工作
+  - 合并的请求 (single-flight) 共享计算: 全部等待者都放弃时才中止
+  - 编码结果进入编码缓存供后续请求复用, 共享的编码本身不中止
+各阶段避免的工作计入统计
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from starlette.requests import Request
+
+from ..config import settings
+
+TIMEOUT_HEADER = b"x-request-timeout-ms"
+
+# 当前计算的所有等待者; 合并的请求共享同一个列表
+_watchers: ContextVar[Optional[list["RequestDeadline"]]] = ContextVar("request_deadlines", default=None)
+
+
+class RequestAbandoned(Exception):
+    """截止时间已过或客户端已断开"""
+
+    def __init__(self, stage: str, reason: str):
+        super().__init__(f"请求已放弃 ({stage}): {'已超过截止时间' if reason == 'deadline' else '客户端已断开'}")
+        self.stage = stage
+        self.reason = reason
+        # 504: 超时; 499: 客户端关闭连接 (nginx 约定, 客户端收不到)
+        self.status_code = 504 if reason == "deadline" else 499
+
+
+class RequestDeadline:
+    """单个请求的截止时间 (time.monotonic) 与连接状态"""
+
+    def __init__(self, request: Request, deadline: Optional[float]):
+        self.request = request
+        self.deadline = deadline
+
+    async def abandoned(self) -> Optional[str]:
+        """返回放弃原因 (deadline / disconnected), 仍需处理时返回 None"""
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            return "deadline"
+        if await self.request.is_disconnected():
+            return "disconnected"
+        return None
+
+
+class DeadlineTracker:
+    def __init__(self):
+        self._checks = 0
+        # 阶段 → {原因: 次数}
+        self._avoided: dict[str, dict[str, int]] = {}
+
+    def share(self) -> list[RequestDeadline]:
+        """为新的共享计算创建等待者列表 (含当前请求)"""
+        return list(_watchers.get() or [])
+
+    def join(self, watchers: list[RequestDeadline]) -> None:
+        """当前请求加入已有的共享计算"""
+        watchers.extend(_watchers.get() or [])
+
+    def bind(self, watchers: list[RequestDeadline]):
+        """在共享计算的上下文中使用其等待者列表"""
+        return _watchers.set(watchers)
+
+    async def checkpoint(self, stage: str) -> None:
+        """阶段边界: 所有等待者都已放弃时抛出 RequestAbandoned (无等待者时不检查, 如后台任务)"""
+        watchers = _watchers.get()
+        if not watchers:
+            return
+        self._checks += 1
+
+        reason = None
+        for watcher in watchers:
+            reason = await watcher.abandoned()
+            if reason is None:
+                return
+
+        counts = self._avoided.setdefault(stage, {"deadline": 0, "disconnected": 0})
+        counts[reason] += 1
+        print(f"[Deadline] 放弃请求 ({stage}): {reason}")
+        raise RequestAbandoned(stage, reason)
+
+    def stats(self) -> dict:
+        return {
+            "checks": self._checks,
+            "avoided": {stage: dict(counts) for stage, counts in self._avoided.items()},
+            "avoided_total": sum(sum(c.values()) for c in self._avoided.values()),
+            "default_timeout_ms": settings.request_timeout_ms,
+        }
+
+
+def _timeout_ms(scope) -> float:
+    for name, value in scope["headers"]:
+        if name == TIMEOUT_HEADER:
+            try:
+                return float(value)
+            except ValueError:
+                break
+    return settings.request_timeout_ms
+
+
+class DeadlineMiddleware:
+    """ASGI 中间件: 为 API 的 POST 请求记录截止时间, 供各阶段的 checkpoint 检查"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith("/api/"):
+            return await self.app(scope, receive, send)
+
+        timeout_ms = _timeout_ms(scope)
+        deadline = time.monotonic() + timeout_ms / 1000 if timeout_ms > 0 else None
+        token = _watchers.set([RequestDeadline(Request(scope, receive), deadline)])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _watchers.reset(token)
+
+
+# 全局单例
+request_deadlines = DeadlineTracker()
@@ -0,0 +1,160 @@
+"""图片编码缓存
+
+按 (模型, 图片内容哈希) 缓存编码状态快照 (get_image_state), LRU 淘汰:
+  - 同一张图片的后续点击 / Embedding 请求直接恢复快照, 不再重新编码
+  - 上传时可预先在后台以 bulk 优先级编码 (speculative precompute)
+  - 正在编码中的同一图片只会等待, 不会重复编码;
+    若预计算仍在 bulk 队列中排队, 更高优先级的请求直接自行编码,
+    预计算轮到执行时发现已缓存即跳过
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+from .inference import run_inference
+from .pipeline import PREPROCESS, pipeline
+from .profiling import profiler
+from .scheduler import BULK, PRIORITIES, STANDARD
+from ..config import settings
+from ..models.base import BaseModelManager
+from ..models.registry import model_registry
+
+CacheKey = tuple[str, str]
+
+
+class _Pending:
+    """进行中的编码"""
+
+    def __init__(self, priority: str):
+        self.priority = priority
+        self.running = False  # 已拿到执行槽开始编码
+        self.skipped = False  # 开始时已被其他请求编码
+        self.task: Optional[asyncio.Task] = None
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._states: OrderedDict[CacheKey, dict] = OrderedDict()
+        self._pending: dict[CacheKey, _Pending] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "pending_hits": 0,  # 等待进行中的编码 (含预计算)
+            "precompute_started": 0,
+            "precompute_skipped": 0,  # 轮到执行时已被其他请求编码
+            "precompute_failed": 0,
+        }
+
+    def _put(self, key: CacheKey, state: dict) -> None:
+        self._states[key] = state
+        self._states.move_to_end(key)
+        while len(self._states) > self.max_entries:
+            self._states.popitem(last=False)
+
+    async def _encode(self, key: CacheKey, manager: BaseModelManager, image: np.ndarray, pending: _Pending) -> dict:
+        # 预处理在流水线的 preprocess 阶段执行, 不占用模型执行槽
+        prepared = await pipeline.run(PREPROCESS, manager.prepare_image, image)
+
+        def encode() -> dict:
+            pending.running = True
+            cached = self._states.get(key)
+            if cached is not None:
+                pending.skipped = True
+                return cached
+            with profiler.stage("set_image"):
+                manager.set_prepared_image(prepared)
+            return manager.get_image_state()
+
+        state = await run_inference(manager, encode, priority=pending.priority)
+        self._put(key, state)
+        return state
+
+    def _track(self, key: CacheKey, priority: str, run: Callable[[_Pending], Awaitable[dict]]) -> _Pending:
+        pending = _Pending(priority)
+        pending.task = asyncio.ensure_future(run(pending))
+        self._pending[key] = pending
+
+        def done(task: asyncio.Task) -> None:
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+            if not task.cancelled():
+                task.exception()  # 无人等待的预计算失败时避免 "never retrieved" 警告
+
+        pending.task.add_done_callback(done)
+        return pending
+
+    async def get_state(
+        self,
+        manager: BaseModelManager,
+        image_hash: str,
+        image: np.ndarray,
+        priority: str = STANDARD,
+    ) -> dict:
+        """返回该图片的编码状态快照, 未缓存时编码 (等待者断开不会取消共享的编码)"""
+        key = (manager.model_id, image_hash)
+
+        state = self._states.get(key)
+        if state is not None:
+            self._states.move_to_end(key)
+            self._stats["hits"] += 1
+            return state
+
+        pending = self._pending.get(key)
+        if pending is not None and (
+            pending.running or PRIORITIES.index(pending.priority) <= PRIORITIES.index(priority)
+        ):
+            self._stats["pending_hits"] += 1
+        else:
+            self._stats["misses"] += 1
+            pending = self._track(key, priority, lambda p: self._encode(key, manager, image, p))
+        return await asyncio.shield(pending.task)
+
+    def precompute(self, model_id: str, image_hash: str, image: np.ndarray) -> bool:
+        """后台以 bulk 优先级预先编码; 已缓存或正在编码时跳过, 返回是否新开始"""
+        key = (model_id, image_hash)
+        if key in self._states or key in self._pending:
+            return False
+
+        async def run(pending: _Pending) -> dict:
+            try:
+                manager = await run_in_threadpool(model_registry.get_or_load, model_id)
+                state = await self._encode(key, manager, image, pending)
+            except Exception as e:
+                self._stats["precompute_failed"] += 1
+                print(f"[Precompute] {model_id} 预编码失败: {e}")
+                raise
+
+            if pending.skipped:
+                self._stats["precompute_skipped"] += 1
+            else:
+                print(f"[Precompute] {model_id} 预编码完成: {image_hash}")
+            return state
+
+        self._track(key, BULK, run)
+        self._stats["precompute_started"] += 1
+        return True
+
+    def clear(self, model_id: Optional[str] = None) -> None:
+        """清除缓存 (模型卸载后快照不再可用)"""
+        for key in list(self._states):
+            if model_id is None or key[0] == model_id:
+                del self._states[key]
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["misses"] + self._stats["pending_hits"]
+        return {
+            **self._stats,
+            "hit_rate": (self._stats["hits"] + self._stats["pending_hits"]) / lookups if lookups else 0.0,
+            "entries": len(self._states),
+            "pending": len(self._pending),
+            "max_entries": self.max_entries,
+        }
+
+
+# 全局单例
+embedding_cache = EmbeddingCache(settings.embedding_cache_size)
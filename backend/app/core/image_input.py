@@ -0,0 +1,325 @@
+"""推理请求的图片输入
+
+推理端点除 JSON (image_url, 可为 base64 data URL) 外, 也接受直接提交图片字节,
+避免 base64 放进 JSON 后被校验、解码、再解码图片的多次拷贝:
+  - multipart/form-data: "request" 部分为 JSON 请求参数 (可省略 image_url), "image" 部分为图片文件
+  - 原始图片: Content-Type 为 image/* 或 application/octet-stream, 请求体即图片,
+    请求参数为查询参数 request (URL 编码的 JSON)
+图片字节边接收边写入预分配缓冲区并计算内容哈希, 直接在该缓冲区上解码 (cv2.imdecode;
+cv2 与 PIL 结果不一致的格式改用 PIL, 保证与 image_url 提交的同一图片内容哈希相同);
+请求体大小在读取前 (Content-Length) 与读取中检查, 超限立即返回 413
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Awaitable, Callable, Generic, Optional, TypeVar
+
+import numpy as np
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from ..config import settings
+from ..utils.hashing import hash_image
+from .image_loader import decode_image_bytes, fetch_image_bytes, load_local_image
+from .pipeline import DECODE, pipeline
+from .profiling import profiler
+
+T = TypeVar("T", bound=BaseModel)
+
+# 请求参数 (JSON) 的大小上限
+MAX_PARAMS_BYTES = 1024 * 1024
+RAW_CONTENT_TYPES = ("image/", "application/octet-stream")
+
+# 提交字节哈希 → 解码后图片内容哈希, 重复提交同一文件时跳过像素哈希
+_pixel_hashes: OrderedDict[str, str] = OrderedDict()
+PIXEL_HASH_CACHE_SIZE = 256
+
+
+class ImageBuffer:
+    """接收图片字节: 按已知大小预分配, 边写入边计算哈希"""
+
+    def __init__(self, expected: int = 0):
+        self._data = bytearray(expected)
+        self._size = 0
+        self._hasher = hashlib.blake2b(digest_size=16)
+
+    def write(self, chunk: bytes) -> None:
+        end = self._size + len(chunk)
+        # 超出预分配部分时切片赋值自动扩展
+        self._data[self._size:end] = chunk
+        self._hasher.update(chunk)
+        self._size = end
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def digest(self) -> str:
+        return self._hasher.hexdigest()
+
+    def view(self) -> memoryview:
+        return memoryview(self._data)[:self._size]
+
+
+# JPEG 帧头 (SOFn) 标记, 不含 DHT (C4) / JPG (C8) / DAC (CC)
+_JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _jpeg_components(data: memoryview) -> int:
+    """JPEG 帧头中的通道数 (4 为 CMYK); 无法解析时返回 0"""
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return 0
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in _JPEG_SOF:
+            return data[i + 9]
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return 0
+
+
+def _matches_pil(data: memoryview) -> bool:
+    """
+    cv2 解码与 PIL convert("RGB") 逐像素一致的输入: 8 位 PNG、非 CMYK 的 JPEG、WebP、BMP
+    16 位 PNG/TIFF (cv2 右移 8 位, PIL 截断)、CMYK JPEG (颜色转换不同) 与 GIF (透明色处理不同) 等不在其中
+    """
+    head = bytes(data[:32])
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return len(head) > 24 and head[24] <= 8  # IHDR 位深
+    if head.startswith(b"\xff\xd8"):
+        return _jpeg_components(data) not in (0, 4)
+    if head.startswith(b"RIFF"):
+        return head[8:12] == b"WEBP"
+    return head.startswith(b"BM")
+
+
+def decode_image(data: memoryview) -> np.ndarray:
+    """
+    在原缓冲区上解码为 RGB, 与按 image_url 加载 (PIL) 的像素一致 (内容哈希相同, 共享缓存):
+    不应用 EXIF 方向, 丢弃 alpha; 其他格式 (高位深、CMYK 等) 交给 PIL 解码
+    """
+    import cv2
+
+    if not _matches_pil(data):
+        try:
+            return decode_image_bytes(data)
+        except Exception:
+            raise ValueError("无法解码图片")
+
+    encoded = np.frombuffer(data, dtype=np.uint8)
+    rgb_flag = getattr(cv2, "IMREAD_COLOR_RGB", None)
+    flags = (rgb_flag if rgb_flag is not None else cv2.IMREAD_COLOR) | cv2.IMREAD_IGNORE_ORIENTATION
+    image = cv2.imdecode(encoded, flags)
+    if image is None:
+        raise ValueError("无法解码图片")
+    if rgb_flag is None:
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+    return image
+
+
+class ImageRequest(Generic[T]):
+    """
+    解析后的推理请求: 请求参数 + 图片
+    直接提交图片时已解码, image_url 为 "binary:<字节哈希>" (仅用于日志);
+    JSON 提交时在 load() 中按 image_url 加载
+    """
+
+    def __init__(self, body: T, image: Optional[np.ndarray] = None, digest: Optional[str] = None):
+        self.body = body
+        self.image = image
+        self.digest = digest
+        self._image_hash: Optional[str] = None
+
+    async def load(self) -> np.ndarray:
+        """按 image_url 加载 (下载在事件循环中, 解码在流水线的 decode 阶段)"""
+        if self.image is None:
+            source = self.body.image_url
+            if source.startswith(("http://", "https://")):
+                self.image = await pipeline.run(DECODE, decode_image_bytes, await fetch_image_bytes(source))
+            else:
+                self.image = await pipeline.run(DECODE, load_local_image, source)
+        return self.image
+
+    async def hash(self) -> str:
+        """解码后图片的内容哈希 (与 image_url 提交的同一图片一致)"""
+        if self._image_hash is not None:
+            return self._image_hash
+        if self.digest is not None and self.digest in _pixel_hashes:
+            _pixel_hashes.move_to_end(self.digest)
+            self._image_hash = _pixel_hashes[self.digest]
+            return self._image_hash
+
+        self._image_hash = await pipeline.run(DECODE, hash_image, await self.load())
+        if self.digest is not None:
+            _pixel_hashes[self.digest] = self._image_hash
+            while len(_pixel_hashes) > PIXEL_HASH_CACHE_SIZE:
+                _pixel_hashes.popitem(last=False)
+        return self._image_hash
+
+
+def _too_large(limit: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"请求体超过 {limit / 1048576:.0f}MB 限制")
+
+
+def _check_length(request: Request, limit: int) -> int:
+    """读取前按 Content-Length 拒绝超限请求, 返回声明的长度 (未声明为 0)"""
+    try:
+        length = int(request.headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的 Content-Length")
+    if length > limit:
+        raise _too_large(limit)
+    return length
+
+
+async def _stream(request: Request, limit: int):
+    """逐块读取请求体, 累计超过上限时立即中止"""
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise _too_large(limit)
+        if chunk:
+            yield chunk
+
+
+async def _read_json(request: Request) -> bytearray:
+    # base64 data URL 比原图大约 4/3
+    limit = settings.max_image_upload_mb * 1024 * 1024 * 4 // 3 + MAX_PARAMS_BYTES
+    expected = _check_length(request, limit)
+    body = bytearray(expected) if expected else bytearray()
+    size = 0
+    async for chunk in _stream(request, limit):
+        body[size:size + len(chunk)] = chunk
+        size += len(chunk)
+    del body[size:]
+    return body
+
+
+async def _read_raw(request: Request) -> ImageBuffer:
+    limit = settings.max_image_upload_mb * 1024 * 1024
+    buffer = ImageBuffer(_check_length(request, limit))
+    async for chunk in _stream(request, limit):
+        buffer.write(chunk)
+    return buffer
+
+
+async def _read_multipart(request: Request, boundary: bytes) -> tuple[bytes, Optional[ImageBuffer]]:
+    """流式解析 multipart, 返回 (request 部分, image 部分); 其他部分忽略"""
+    limit = settings.max_image_upload_mb * 1024 * 1024 + MAX_PARAMS_BYTES
+    expected = _check_length(request, limit)
+
+    params = bytearray()
+    image: Optional[ImageBuffer] = None
+    current: dict = {"name": None, "field": b"", "value": b""}
+
+    def on_part_begin():
+        current["name"] = None
+
+    def on_header_field(data, start, end):
+        current["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        current["value"] += data[start:end]
+
+    def on_header_end():
+        if current["field"].lower() == b"content-disposition":
+            _, options = parse_options_header(current["value"])
+            current["name"] = options.get(b"name")
+        current["field"] = current["value"] = b""
+
+    def on_headers_finished():
+        nonlocal image
+        if current["name"] == b"image":
+            # 图片大小不超过整个请求体
+            image = ImageBuffer(expected)
+
+    def on_part_data(data, start, end):
+        if current["name"] == b"image":
+            image.write(data[start:end])
+        elif current["name"] == b"request":
+            if len(params) + end - start > MAX_PARAMS_BYTES:
+                raise _too_large(MAX_PARAMS_BYTES)
+            params.extend(data[start:end])
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+    })
+    async for chunk in _stream(request, limit):
+        parser.write(chunk)
+    parser.finalize()
+    return bytes(params), image
+
+
+def _parse_params(data: bytes) -> dict:
+    if not data.strip():
+        return {}
+    try:
+        params = json.loads(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"请求参数不是有效的 JSON: {e}")
+    if not isinstance(params, dict):
+        raise HTTPException(status_code=400, detail="请求参数必须是 JSON 对象")
+    return params
+
+
+def _validate(model: type[T], params) -> T:
+    try:
+        if isinstance(params, dict):
+            return model.model_validate(params)
+        return model.model_validate_json(params)
+    except ValidationError as e:
+        # 与 FastAPI 请求体校验错误格式一致
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)
+        ])
+
+
+def image_request(model: type[T]) -> Callable[[Request], Awaitable[ImageRequest[T]]]:
+    """FastAPI 依赖: 按 Content-Type 解析 JSON / multipart / 原始图片请求"""
+
+    async def dependency(request: Request) -> ImageRequest[T]:
+        content_type, options = parse_options_header(request.headers.get("content-type", ""))
+        content_type = content_type.decode("latin-1").lower()
+
+        if content_type in ("", "application/json"):
+            return ImageRequest(_validate(model, await _read_json(request)))
+
+        with profiler.stage("image_receive"):
+            if content_type == "multipart/form-data":
+                boundary = options.get(b"boundary")
+                if not boundary:
+                    raise HTTPException(status_code=400, detail="multipart 请求缺少 boundary")
+                raw_params, buffer = await _read_multipart(request, boundary)
+                params = _parse_params(raw_params)
+            elif content_type.startswith(RAW_CONTENT_TYPES):
+                params = _parse_params(request.query_params.get("request", "").encode("utf-8"))
+                buffer = await _read_raw(request)
+            else:
+                raise HTTPException(status_code=415, detail=f"不支持的 Content-Type: {content_type}")
+
+        if buffer is None or buffer.size == 0:
+            # multipart 未附带图片: 按 image_url 加载
+            return ImageRequest(_validate(model, params))
+
+        digest = buffer.digest()
+        body = _validate(model, {**params, "image_url": f"binary:{digest}"})
+        with profiler.stage("image_decode", bytes=buffer.size):
+            try:
+                image = await pipeline.run(DECODE, decode_image, buffer.view())
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        return ImageRequest(body, image, digest)
+
+    return dependency
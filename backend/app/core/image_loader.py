@@ -1,6 +1,7 @@
 """图片加载工具"""
 
 import os
+import asyncio
 import base64
 import numpy as np
 from PIL import Image
@@ -19,6 +20,13 @@ async def load_image(source: str) -> np.ndarray:
     - base64 data URL (data:image/...)
     - 本地文件路径
     """
+    if source.startswith(("http://", "https://")):
+        return await load_image_from_url(source)
+    return load_local_image(source)
+
+
+def load_local_image(source: str) -> np.ndarray:
+    """同步加载非 HTTP 来源 (uploads / base64 / 本地文件), 可在工作线程中调用"""
     if source.startswith("/uploads/"):
         # 从本地 uploads 目录读取
         filename = source.replace("/uploads/", "")
@@ -26,22 +34,32 @@ async def load_image(source: str) -> np.ndarray:
         return load_image_from_file(filepath)
     elif source.startswith("data:image"):
         return load_image_from_base64(source)
-    elif source.startswith(("http://", "https://")):
-        return await load_image_from_url(source)
     else:
         return load_image_from_file(source)
 
 
-async def load_image_from_url(url: str) -> np.ndarray:
-    """从 URL 加载图片"""
+def load_image_sync(source: str) -> np.ndarray:
+    """同步版 load_image, 供工作线程使用 (线程内单独起事件循环)"""
+    return asyncio.run(load_image(source))
+
+
+async def fetch_image_bytes(url: str) -> bytes:
+    """下载图片内容 (不解码)"""
     async with aiohttp.ClientSession() as session:
         async with session.get(url) as response:
             if response.status != 200:
                 raise ValueError(f"无法加载图片: HTTP {response.status}")
+            return await response.read()
 
-            image_bytes = await response.read()
-            image = Image.open(BytesIO(image_bytes)).convert("RGB")
-            return np.array(image)
+
+def decode_image_bytes(image_bytes: bytes) -> np.ndarray:
+    image = Image.open(BytesIO(image_bytes)).convert("RGB")
+    return np.array(image)
+
+
+async def load_image_from_url(url: str) -> np.ndarray:
+    """从 URL 加载图片"""
+    return decode_image_bytes(await fetch_image_bytes(url))
 
 
 def load_image_from_base64(data_url: str) -> np.ndarray:
@@ -49,9 +67,7 @@ def load_image_from_base64(data_url: str) -> np.ndarray:
     if "," in data_url:
         data_url = data_url.split(",", 1)[1]
 
-    image_bytes = base64.b64decode(data_url)
-    image = Image.open(BytesIO(image_bytes)).convert("RGB")
-    return np.array(image)
+    return decode_image_bytes(base64.b64decode(data_url))
 
 
 def load_image_from_file(file_path: str) -> np.ndarray:
@@ -0,0 +1,51 @@
+"""推理调度工具"""
+
+from typing import Callable, Optional, TypeVar
+
+from .deadline import request_deadlines
+from .pipeline import pipeline
+from .profiling import profiler
+from .scheduler import BULK, STANDARD, scheduler
+from ..models.base import BaseModelManager
+
+T = TypeVar("T")
+
+
+async def run_inference(
+    manager: BaseModelManager,
+    fn: Callable[..., T],
+    *args,
+    priority: str = STANDARD,
+    stage: Optional[str] = None,
+    **kwargs,
+) -> T:
+    """
+    按优先级排队后, 在线程池中持有模型锁执行推理
+    避免阻塞事件循环, 同时保证 predictor 状态不被并发请求 (如后台任务) 打乱
+    多副本模型交给空闲副本的专属线程执行
+    指定 stage 时, 排队结束后检查请求是否已超时/断开 (是则不执行)
+    """
+    def call() -> T:
+        return profiler.run_model(manager.model_id, lambda: fn(*args, **kwargs))
+
+    with profiler.stage("queue_wait", priority=priority):
+        await scheduler.acquire(manager, priority)
+    try:
+        if stage is not None:
+            await request_deadlines.checkpoint(stage)
+        with pipeline.forward.busy():
+            return await manager.execute_async(call)
+    finally:
+        scheduler.release(manager, priority)
+
+
+def run_inference_sync(
+    manager: BaseModelManager,
+    fn: Callable[..., T],
+    *args,
+    priority: str = BULK,
+    **kwargs,
+) -> T:
+    """run_inference 的同步版本 (任务线程)"""
+    with scheduler.slot_sync(manager, priority):
+        return manager.execute(lambda: fn(*args, **kwargs))
@@ -0,0 +1,164 @@
+"""异步任务处理函数
+
+每种任务类型对应一个请求模型, 处理函数在任务线程池中同步执行,
+结果为可 JSON 序列化的 dict (mask 统一使用 RLE)
+"""
+
+import time
+
+import numpy as np
+
+from .inference import run_inference_sync
+from .jobs import JobContext, job_manager
+from .image_loader import load_image_sync
+from ..models.registry import model_registry
+from ..models.sam3_manager import SAM3Manager
+from ..schemas.request import (
+    EMBEDDING_FORMATS,
+    AutoMaskRequest,
+    BatchSegmentRequest,
+    EmbeddingRequest,
+    TextSegmentRequest,
+)
+from ..schemas.response import EmbeddingResponse
+from ..utils.compression import compress_embedding, compress_features
+from ..utils.rle import encode_mask_rle
+
+
+@job_manager.handler("segment_batch", BatchSegmentRequest)
+def run_segment_batch(request: BatchSegmentRequest, ctx: JobContext) -> dict:
+    """
+    同一张图片只编码一次, 逐组提示解码
+    每组提示单独排队, 期间到达的交互请求可以插队 (解码前恢复本任务的编码状态)
+    """
+    start_time = time.time()
+    image = load_image_sync(request.image_url)
+    manager = model_registry.get_or_load(request.model)
+    total = len(request.prompts)
+    results = []
+
+    def encode() -> dict:
+        manager.set_image(image)
+        return manager.get_image_state()
+
+    ctx.report(0.0, "编码图片")
+    image_state = run_inference_sync(manager, encode)
+
+    for i, prompt in enumerate(request.prompts):
+        ctx.check_cancelled()
+        points = np.array([[p.x, p.y] for p in prompt])
+        labels = np.array([p.type for p in prompt])
+        masks, scores = run_inference_sync(manager, manager.predict_from_state, image_state, points, labels)
+
+        best_idx = int(np.argmax(scores))
+        results.append({
+            "mask": encode_mask_rle(masks[best_idx]),
+            "mask_size": [masks.shape[1], masks.shape[2]],
+            "score": float(scores[best_idx]),
+        })
+        ctx.report((i + 1) / total, f"{i + 1}/{total}")
+
+    return {
+        "results": results,
+        "count": total,
+        "time_ms": (time.time() - start_time) * 1000,
+        "model": request.model,
+    }
+
+
+@job_manager.handler("auto_mask", AutoMaskRequest)
+def run_auto_mask(request: AutoMaskRequest, ctx: JobContext) -> dict:
+    start_time = time.time()
+    image = load_image_sync(request.image_url)
+    manager = model_registry.get_or_load(request.model)
+
+    ctx.report(0.0, "自动分割中")
+    masks = run_inference_sync(manager, manager.generate_masks, image)
+    ctx.check_cancelled()
+
+    return {
+        "masks": [encode_mask_rle(m["segmentation"]) for m in masks],
+        "areas": [int(m["area"]) for m in masks],
+        "boxes": [[float(v) for v in m["bbox"]] for m in masks],  # [x, y, w, h]
+        "scores": [float(m["predicted_iou"]) for m in masks],
+        "mask_size": [image.shape[0], image.shape[1]],
+        "count": len(masks),
+        "time_ms": (time.time() - start_time) * 1000,
+        "model": request.model,
+    }
+
+
+@job_manager.handler("text_segment", TextSegmentRequest)
+def run_text_segment(request: TextSegmentRequest, ctx: JobContext) -> dict:
+    start_time = time.time()
+    image = load_image_sync(request.image_url)
+    manager = model_registry.get_or_load("sam3")
+    if not isinstance(manager, SAM3Manager):
+        raise ValueError("文本分割仅支持 SAM3 模型")
+
+    ctx.report(0.0, "文本分割中")
+    result = {}
+    if request.crop:
+        masks, offsets, scores, boxes = run_inference_sync(
+            manager, manager.segment_text_cropped,
+            image, request.prompt, request.confidence, request.crop_padding,
+        )
+        result = {"mask_sizes": [list(m.shape) for m in masks], "offsets": offsets.tolist()}
+    else:
+        masks, scores, boxes = run_inference_sync(
+            manager, manager.segment_text, image, request.prompt, request.confidence
+        )
+    ctx.check_cancelled()
+
+    total = len(masks)
+    masks_rle = []
+    for i, mask in enumerate(masks):
+        ctx.check_cancelled()
+        masks_rle.append(encode_mask_rle(mask))
+        ctx.report((i + 1) / total, f"编码 {i + 1}/{total}")
+
+    return {
+        "masks": masks_rle,
+        "scores": scores.tolist(),
+        "boxes": boxes.tolist(),
+        "count": total,
+        "time_ms": (time.time() - start_time) * 1000,
+        **result,
+    }
+
+
+def validate_embedding(request: EmbeddingRequest) -> None:
+    if request.format not in EMBEDDING_FORMATS:
+        raise ValueError(f"不支持的格式: {request.format} (支持: {EMBEDDING_FORMATS})")
+
+
+@job_manager.handler("embedding", EmbeddingRequest, validate=validate_embedding)
+def run_embedding(request: EmbeddingRequest, ctx: JobContext) -> dict:
+    """与 /api/embedding 的响应一致: int8 格式包含前端 Decoder 所需的全部特征"""
+    image = load_image_sync(request.image_url)
+    manager = model_registry.get_or_load(request.model)
+
+    def encode() -> dict:
+        manager.set_image(image)
+        if request.format == "int8":
+            return manager.image_features()
+        return {"image_embeddings": manager.image_embedding()}
+
+    ctx.report(0.0, "编码图片")
+    features = run_inference_sync(manager, encode)
+    ctx.check_cancelled()
+
+    embedding = next(iter(features.values()))
+    if request.format == "int8":
+        result = compress_features(features)
+    else:
+        result = compress_embedding(embedding)
+    return EmbeddingResponse(
+        embedding=result.encoded,
+        shape=list(embedding.shape),
+        original_size=[image.shape[0], image.shape[1]],
+        compressed_size=result.compressed_size,
+        model=request.model,
+        format=request.format,
+        tensors=getattr(result, "tensors", None),
+    ).model_dump()
@@ -0,0 +1,280 @@
+"""异步任务子系统
+
+耗时请求 (批量提示、自动分割、SAM3 文本查询等) 提交后立即返回任务 ID,
+任务元数据持久化在本地 SQLite, 结果以 JSON 文件存放在磁盘,
+由固定并发的线程池执行, 支持进度上报、取消和结果缓存
+(结果只对内容寻址的图片来源复用: /uploads/<内容哈希> 与 data URL;
+远程 URL 与本机路径的内容可能变化, 每次提交都重新执行)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from pydantic import BaseModel
+
+from ..config import settings
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+# 同一地址始终是同一张图片的来源
+CONTENT_ADDRESSED = ("/uploads/", "data:")
+
+
+def _cacheable(payload: dict) -> bool:
+    source = payload.get("image_url")
+    return not isinstance(source, str) or source.startswith(CONTENT_ADDRESSED)
+
+
+class JobCancelled(Exception):
+    """任务被取消 (由 JobContext.check_cancelled 抛出)"""
+
+
+class JobContext:
+    """传给任务处理函数: 上报进度、检查取消"""
+
+    def __init__(self, store: "JobStore", job_id: str, cancel_event: threading.Event):
+        self._store = store
+        self.job_id = job_id
+        self._cancel_event = cancel_event
+
+    def report(self, progress: float, message: str = "") -> None:
+        self._store.update(self.job_id, progress=min(max(progress, 0.0), 1.0), message=message)
+
+    def check_cancelled(self) -> None:
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+
+class JobStore:
+    """SQLite 任务存储 (单连接 + 锁, 供多个工作线程共享)"""
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    cache_key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    message TEXT NOT NULL DEFAULT '',
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_cache_key ON jobs (cache_key)")
+
+    def create(self, job_type: str, cache_key: str, payload: dict) -> dict:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, type, cache_key, payload, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, job_type, cache_key, json.dumps(payload), PENDING, now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def find_by_cache_key(self, cache_key: str) -> list[dict]:
+        """未失败的同键任务, 新的在前"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE cache_key = ? AND status IN (?, ?, ?) "
+                "ORDER BY created_at DESC",
+                (cache_key, PENDING, RUNNING, COMPLETED),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def list_unfinished(self) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (PENDING, RUNNING),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class JobManager:
+    """
+    任务管理器
+    - submit: 相同任务 (类型 + 规范化参数) 已完成或进行中时直接复用
+    - 工作线程池并发数由 settings.job_workers 控制
+    """
+
+    def __init__(self):
+        self._handlers: dict[str, tuple[type[BaseModel], Callable, Optional[Callable]]] = {}
+        self._cancel_events: dict[str, threading.Event] = {}
+        self._events_lock = threading.Lock()
+        self._store: Optional[JobStore] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._results_dir = ""
+
+    def handler(self, job_type: str, schema: type[BaseModel],
+                validate: Optional[Callable[[BaseModel], None]] = None):
+        """
+        注册任务类型: 处理函数接收 (校验后的请求, JobContext), 返回可 JSON 序列化的结果
+        validate 在提交时对请求做额外检查, 不合法时抛出 ValueError
+        """
+        def decorator(fn: Callable[[BaseModel, JobContext], dict]):
+            self._handlers[job_type] = (schema, fn, validate)
+            return fn
+        return decorator
+
+    @property
+    def job_types(self) -> list[str]:
+        return list(self._handlers)
+
+    def start(self) -> None:
+        """创建存储与线程池, 并重新排队上次未完成的任务"""
+        self._results_dir = os.path.join(settings.jobs_dir, "results")
+        os.makedirs(self._results_dir, exist_ok=True)
+        self._store = JobStore(os.path.join(settings.jobs_dir, "jobs.db"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.job_workers, thread_name_prefix="job"
+        )
+
+        for job in self._store.list_unfinished():
+            self._store.update(job["id"], status=PENDING, progress=0.0, message="服务重启, 重新排队")
+            self._enqueue(job["id"])
+
+    def shutdown(self) -> None:
+        for event in list(self._cancel_events.values()):
+            event.set()
+        if self._executor:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        if self._store:
+            self._store.close()
+
+    def submit(self, job_type: str, payload: dict) -> tuple[dict, bool]:
+        """提交任务, 返回 (任务记录, 是否命中缓存)"""
+        if job_type not in self._handlers:
+            raise ValueError(f"未知任务类型: {job_type} (支持: {self.job_types})")
+
+        schema, _, validate = self._handlers[job_type]
+        request = schema.model_validate(payload)
+        if validate is not None:
+            validate(request)
+        normalized = request.model_dump(mode="json")
+        if not _cacheable(normalized):
+            # 不与任何任务共享结果
+            job = self._store.create(job_type, f"uncached:{uuid.uuid4().hex}", normalized)
+            self._enqueue(job["id"])
+            return job, False
+
+        cache_key = hashlib.sha256(
+            json.dumps([job_type, normalized], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+        for job in self._store.find_by_cache_key(cache_key):
+            if job["status"] != COMPLETED or os.path.exists(self.result_path(job["id"])):
+                return job, True
+
+        job = self._store.create(job_type, cache_key, normalized)
+        self._enqueue(job["id"])
+        return job, False
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self._store.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        job = self._store.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return job
+
+        with self._events_lock:
+            event = self._cancel_events.get(job_id)
+        if event is not None:
+            event.set()
+        if job["status"] == PENDING:
+            # 还未开始执行: 直接标记, 工作线程取到时会跳过
+            self._store.update(job_id, status=CANCELLED, message="已取消")
+        return self._store.get(job_id)
+
+    def result_path(self, job_id: str) -> str:
+        return os.path.join(self._results_dir, f"{job_id}.json")
+
+    def _enqueue(self, job_id: str) -> None:
+        with self._events_lock:
+            self._cancel_events[job_id] = threading.Event()
+        self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id: str) -> None:
+        with self._events_lock:
+            cancel_event = self._cancel_events[job_id]
+
+        try:
+            job = self._store.get(job_id)
+            if job is None or job["status"] != PENDING or cancel_event.is_set():
+                return
+
+            schema, fn, _ = self._handlers[job["type"]]
+            request = schema.model_validate_json(job["payload"])
+            ctx = JobContext(self._store, job_id, cancel_event)
+
+            self._store.update(job_id, status=RUNNING, message="运行中")
+            start_time = time.time()
+            try:
+                result = fn(request, ctx)
+                ctx.check_cancelled()
+            except JobCancelled:
+                self._store.update(job_id, status=CANCELLED, message="已取消")
+                return
+            except Exception as e:
+                self._store.update(job_id, status=FAILED, error=str(e), message="失败")
+                print(f"[Job] {job['type']} {job_id} 失败: {e}")
+                return
+
+            # 先写临时文件再重命名, 结果文件存在即代表完整
+            path = self.result_path(job_id)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False)
+            os.replace(path + ".tmp", path)
+
+            elapsed_ms = (time.time() - start_time) * 1000
+            self._store.update(job_id, status=COMPLETED, progress=1.0, message="完成")
+            print(f"[Job] {job['type']} {job_id} 完成, 耗时: {elapsed_ms:.0f}ms")
+        finally:
+            with self._events_lock:
+                self._cancel_events.pop(job_id, None)
+
+
+# 全局单例
+job_manager = JobManager()
@@ -0,0 +1,193 @@
+"""请求流水线
+
+一个请求的图片解码、预处理 (缩放/归一化)、模型前向、后处理 (mask 编码/序列化) 原本依次执行,
+编码器运行时 CPU 阶段空闲, 反之亦然。拆分为有界队列连接的各阶段:
+  - decode: 读取/解码图片、计算内容哈希
+  - preprocess: 缩放、归一化并补齐到模型输入 (prepare_image), 在模型锁之外执行
+  - forward: 模型前向, 由调度器按模型 (副本数) 放行, 这里只统计占用
+  - serialize: 选择 mask、PNG/RLE 编码、压缩与 JSON 序列化
+每个 CPU 阶段有独立的工作线程数与队列长度; 队列满时提交方等待 (反压), 不会无限堆积。
+负载下前一个请求在做前向时, 后一个请求的解码与预处理同时进行
+各阶段的占用 (运行/排队/反压等待数、利用率、服务与排队耗时) 见 /api/metrics 的 pipeline, 用于调参
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Optional, TypeVar
+
+from ..config import settings
+
+T = TypeVar("T")
+
+DECODE = "decode"
+PREPROCESS = "preprocess"
+FORWARD = "forward"
+SERIALIZE = "serialize"
+
+SAMPLES = 1000
+
+
+def _percentiles(samples: deque) -> dict:
+    values = sorted(samples)
+    return {
+        "avg": round(sum(values) / len(values), 1) if values else 0.0,
+        "p95": round(values[int(len(values) * 0.95)], 1) if values else 0.0,
+    }
+
+
+class _Occupancy:
+    """阶段占用: 正在处理的数量与累计忙碌时间"""
+
+    def __init__(self):
+        self.running = 0
+        self.completed = 0
+        self.busy_s = 0.0
+        self.service_ms: deque[float] = deque(maxlen=SAMPLES)
+        self.started_at = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def busy(self):
+        with self._lock:
+            self.running += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.busy_s += elapsed
+                self.service_ms.append(elapsed * 1000)
+
+    def snapshot(self, workers: Optional[int]) -> dict:
+        with self._lock:
+            wall = time.perf_counter() - self.started_at
+            service = _percentiles(self.service_ms)
+            result = {
+                "running": self.running,
+                "completed": self.completed,
+                "busy_ms": round(self.busy_s * 1000, 1),
+                "service_ms_avg": service["avg"],
+                "service_ms_p95": service["p95"],
+            }
+        if workers:
+            # 自启动以来的平均利用率 (忙碌时间 / 可用工作线程时间)
+            result["utilization"] = round(self.busy_s / (wall * workers), 4) if wall > 0 else 0.0
+        return result
+
+
+class Stage:
+    """CPU 阶段: 固定数量的工作线程 + 有界队列 (满时提交方在事件循环中等待)"""
+
+    def __init__(self, name: str, workers: int, queue_size: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.occupancy = _Occupancy()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"pipeline-{name}")
+        self._lock = threading.Lock()
+        self._admitted = 0  # 处理中 + 排队中
+        self._waiters: deque[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._blocked = 0  # 因队列已满而等待的提交次数
+        self._queue_ms: deque[float] = deque(maxlen=SAMPLES)
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    async def _admit(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._admitted < self.capacity:
+                self._admitted += 1
+                return
+            entry = (loop, loop.create_future())
+            self._waiters.append(entry)
+            self._blocked += 1
+        try:
+            await entry[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    raise
+            # 已被放行: 把名额交给下一个
+            self._release()
+            raise
+
+    def _release(self) -> None:
+        with self._lock:
+            if not self._waiters:
+                self._admitted -= 1
+                return
+            # 名额直接转给等待者
+            loop, waiter = self._waiters.popleft()
+        loop.call_soon_threadsafe(_grant, waiter)
+
+    def _call(self, fn: Callable[..., T], args: tuple, enqueued_at: float) -> T:
+        self._queue_ms.append((time.perf_counter() - enqueued_at) * 1000)
+        with self.occupancy.busy():
+            return fn(*args)
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        """在本阶段的工作线程中执行 (复制上下文, 剖析等 ContextVar 可见)"""
+        await self._admit()
+        context = contextvars.copy_context()
+        future = self._executor.submit(context.run, self._call, fn, args, time.perf_counter())
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waiting = len(self._waiters)
+            admitted = self._admitted
+            blocked = self._blocked
+        occupancy = self.occupancy.snapshot(self.workers)
+        queue = _percentiles(self._queue_ms)
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            **occupancy,
+            "queued": max(0, admitted - occupancy["running"]),
+            "waiting": waiting,
+            "blocked": blocked,
+            "queue_ms_avg": queue["avg"],
+            "queue_ms_p95": queue["p95"],
+        }
+
+
+def _grant(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class Pipeline:
+    def __init__(self, config: dict[str, dict[str, int]]):
+        self.stages = {
+            name: Stage(name, config.get(name, {}).get("workers", 1), config.get(name, {}).get("queue", 16))
+            for name in (DECODE, PREPROCESS, SERIALIZE)
+        }
+        # 前向的并发由调度器控制, 这里只统计
+        self.forward = _Occupancy()
+
+    async def run(self, stage: str, fn: Callable[..., T], *args) -> T:
+        return await self.stages[stage].run(fn, *args)
+
+    def stats(self) -> dict:
+        return {
+            DECODE: self.stages[DECODE].stats(),
+            PREPROCESS: self.stages[PREPROCESS].stats(),
+            FORWARD: self.forward.snapshot(None),
+            SERIALIZE: self.stages[SERIALIZE].stats(),
+        }
+
+
+# 全局单例
+pipeline = Pipeline(settings.pipeline_stages)
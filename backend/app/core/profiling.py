@@ -0,0 +1,357 @@
+"""按需性能剖析
+
+管理员开启剖析会话后, 对接下来 N 个匹配 (端点 / 模型) 的请求采集:
+  - 阶段标注: image_load / set_image / predict / mask_encode 等
+  - PyTorch profiler 算子级 trace (推理线程内)
+  - Python 调用栈采样 (按固定间隔采样请求涉及的线程, 还原为火焰图区间)
+结果合并为 Chrome trace JSON (chrome://tracing 或 Perfetto 打开)
+
+未开启剖析时, 每个请求只多一次布尔判断, stage() 只多一次 ContextVar 读取
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# 栈采样时忽略的帧 (采样器与线程池自身)
+IGNORED_FILES = ("threading.py", "concurrent/futures/thread.py", "profiling.py")
+MAX_STACK_DEPTH = 64
+
+
+def _now_us() -> float:
+    return time.perf_counter_ns() / 1000
+
+
+class RequestTrace:
+    """单个请求的 trace 事件 (时间为相对请求开始的微秒)"""
+
+    def __init__(self, index: int, label: str):
+        self.index = index
+        self.label = label
+        self.model: Optional[str] = None
+        self.start_us = _now_us()
+        self.end_us: Optional[float] = None
+        self.events: list[dict] = []
+        self.threads: set[int] = {threading.get_ident()}
+        self._lock = threading.Lock()
+
+    def ts(self, at_us: Optional[float] = None) -> float:
+        return (at_us if at_us is not None else _now_us()) - self.start_us
+
+    def add(self, event: dict) -> None:
+        event.setdefault("pid", self.index)
+        with self._lock:
+            self.events.append(event)
+
+    def add_span(self, name: str, cat: str, start_us: float, end_us: float, tid: int, args: dict = None) -> None:
+        self.add({
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": self.ts(start_us),
+            "dur": end_us - start_us,
+            "tid": tid,
+            "args": args or {},
+        })
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_us if self.end_us is not None else _now_us()
+        return (end - self.start_us) / 1000
+
+
+class StackSampler:
+    """
+    周期性采样请求线程的 Python 调用栈
+    相邻采样的公共栈前缀合并为一个区间 (与火焰图相同的还原方式)
+    """
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000
+        self._traces: set[RequestTrace] = set()
+        self._open: dict[tuple[int, int], list[tuple[str, float]]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def attach(self, trace: RequestTrace) -> None:
+        with self._lock:
+            self._traces.add(trace)
+
+    def detach(self, trace: RequestTrace) -> None:
+        with self._lock:
+            self._traces.discard(trace)
+            now = _now_us()
+            for tid in trace.threads:
+                self._close(trace, tid, self._open.pop((id(trace), tid), []), 0, now)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    @staticmethod
+    def _stack(frame) -> list[str]:
+        names = []
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            if not code.co_filename.endswith(IGNORED_FILES):
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        names.reverse()
+        return names
+
+    @staticmethod
+    def _close(trace: RequestTrace, tid: int, frames: list, keep: int, now: float) -> None:
+        for name, start in reversed(frames[keep:]):
+            trace.add_span(name, "sample", start, now, tid)
+        del frames[keep:]
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            now = _now_us()
+            with self._lock:
+                for trace in self._traces:
+                    for tid in list(trace.threads):
+                        frame = frames.get(tid)
+                        if frame is None:
+                            continue
+                        stack = self._stack(frame)
+                        opened = self._open.setdefault((id(trace), tid), [])
+
+                        common = 0
+                        while common < min(len(stack), len(opened)) and opened[common][0] == stack[common]:
+                            common += 1
+                        self._close(trace, tid, opened, common, now)
+                        opened.extend((name, now) for name in stack[common:])
+
+
+class ProfilingSession:
+    def __init__(
+        self,
+        endpoint: Optional[str],
+        model: Optional[str],
+        requests: int,
+        torch_trace: bool,
+        sample_interval_ms: float,
+    ):
+        self.endpoint = endpoint
+        self.model = model
+        self.remaining = requests
+        self.torch_trace = torch_trace
+        self.sample_interval_ms = sample_interval_ms
+        self.created_at = time.time()
+        self.in_progress: set[RequestTrace] = set()
+        self.captured: list[RequestTrace] = []
+        self.sampler = StackSampler(sample_interval_ms) if sample_interval_ms > 0 else None
+        self._next_index = 1
+
+    def status(self) -> dict:
+        return {
+            "endpoint": self.endpoint,
+            "model": self.model,
+            "remaining": self.remaining,
+            "in_progress": len(self.in_progress),
+            "torch_trace": self.torch_trace,
+            "sample_interval_ms": self.sample_interval_ms,
+            "captured": [
+                {"index": t.index, "request": t.label, "model": t.model, "duration_ms": round(t.duration_ms, 1)}
+                for t in self.captured
+            ],
+        }
+
+
+_current: ContextVar[Optional[RequestTrace]] = ContextVar("profiling_trace", default=None)
+
+
+class Profiler:
+    def __init__(self):
+        # 请求路径上唯一的检查; 会话结束后立即恢复为 False
+        self.active = False
+        self.session: Optional[ProfilingSession] = None
+        self._lock = threading.Lock()
+        # torch profiler 同一时刻只能有一个
+        self._torch_lock = threading.Lock()
+
+    # ---------- 会话 ----------
+
+    def start(self, endpoint: Optional[str], model: Optional[str], requests: int,
+              torch_trace: bool = True, sample_interval_ms: float = 5.0) -> ProfilingSession:
+        with self._lock:
+            self._stop_sampler()
+            self.session = ProfilingSession(endpoint, model, requests, torch_trace, sample_interval_ms)
+            self.active = requests > 0
+            return self.session
+
+    def stop(self) -> None:
+        with self._lock:
+            self.active = False
+            self._stop_sampler()
+            if self.session is not None:
+                self.session.remaining = 0
+
+    def _stop_sampler(self) -> None:
+        if self.session is not None and self.session.sampler is not None:
+            self.session.sampler.stop()
+
+    # ---------- 请求 ----------
+
+    def begin_request(self, method: str, path: str) -> Optional[RequestTrace]:
+        with self._lock:
+            session = self.session
+            if not self.active or session is None:
+                return None
+            if session.endpoint and path != session.endpoint:
+                return None
+            # 按模型过滤时只有请求结束才知道模型, 先按在途数量预留名额
+            if len(session.in_progress) >= session.remaining:
+                return None
+
+            trace = RequestTrace(session._next_index, f"{method} {path}")
+            session._next_index += 1
+            session.in_progress.add(trace)
+
+        if session.sampler is not None:
+            session.sampler.attach(trace)
+        return trace
+
+    def end_request(self, trace: RequestTrace) -> None:
+        trace.end_us = _now_us()
+        trace.add_span(trace.label, "request", trace.start_us, trace.end_us, threading.get_ident())
+
+        with self._lock:
+            session = self.session
+            if session is None or trace not in session.in_progress:
+                return
+            if session.sampler is not None:
+                session.sampler.detach(trace)
+            session.in_progress.discard(trace)
+
+            if session.model and trace.model != session.model:
+                return
+            session.captured.append(trace)
+            session.remaining -= 1
+            if session.remaining <= 0:
+                self.active = False
+                self._stop_sampler()
+            print(f"[Profile] 已采集 {trace.label} ({trace.model}), {trace.duration_ms:.0f}ms")
+
+    # ---------- 标注 ----------
+
+    def stage(self, name: str, **args):
+        """阶段标注; 当前请求未被剖析时返回空上下文"""
+        trace = _current.get()
+        if trace is None:
+            return nullcontext()
+        return self._stage(trace, name, args)
+
+    @contextmanager
+    def _stage(self, trace: RequestTrace, name: str, args: dict):
+        tid = threading.get_ident()
+        trace.threads.add(tid)
+        start = _now_us()
+        try:
+            yield
+        finally:
+            trace.add_span(name, "stage", start, _now_us(), tid, args)
+
+    def run_model(self, model_id: str, fn: Callable[[], T]) -> T:
+        """在推理线程内执行模型调用, 会话要求时包裹 torch profiler"""
+        trace = _current.get()
+        if trace is None:
+            return fn()
+
+        trace.model = model_id
+        trace.threads.add(threading.get_ident())
+        session = self.session
+        if session is None or not session.torch_trace or not self._torch_lock.acquire(blocking=False):
+            return fn()
+
+        try:
+            return self._torch_profile(trace, fn)
+        finally:
+            self._torch_lock.release()
+
+    def _torch_profile(self, trace: RequestTrace, fn: Callable[[], T]) -> T:
+        import torch
+        from torch.profiler import ProfilerActivity, profile
+
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+
+        start = _now_us()
+        with profile(activities=activities, record_shapes=True) as prof:
+            result = fn()
+
+        # 导出后按本请求的时间轴平移, 放到独立的 torch 轨道上
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            path = f.name
+        try:
+            prof.export_chrome_trace(path)
+            with open(path, encoding="utf-8") as f:
+                events = json.load(f).get("traceEvents", [])
+        finally:
+            os.remove(path)
+
+        timed = [e for e in events if "ts" in e and e.get("ph") in ("X", "i", "B", "E")]
+        if timed:
+            base = min(float(e["ts"]) for e in timed)
+            for e in timed:
+                e["ts"] = trace.ts(start) + float(e["ts"]) - base
+                e["pid"] = trace.index
+                e["tid"] = f"torch {e.get('tid', '')}"
+                trace.add(e)
+        return result
+
+    # ---------- 导出 ----------
+
+    def chrome_trace(self) -> dict:
+        """当前会话已采集请求的 Chrome trace (每个请求一个进程轨道)"""
+        with self._lock:
+            traces = list(self.session.captured) if self.session else []
+
+        events = []
+        for trace in traces:
+            events.append({
+                "name": "process_name",
+                "ph": "M",
+                "pid": trace.index,
+                "args": {"name": f"#{trace.index} {trace.label} ({trace.model or '-'})"},
+            })
+            events.extend(trace.events)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+class ProfilingMiddleware:
+    """ASGI 中间件: 为被选中的请求建立 trace 上下文, 响应 (含流式) 发送完后结束"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not profiler.active or scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        trace = profiler.begin_request(scope.get("method", "WS"), scope["path"])
+        if trace is None:
+            return await self.app(scope, receive, send)
+
+        token = _current.set(trace)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+            profiler.end_request(trace)
+
+
+# 全局单例
+profiler = Profiler()
@@ -0,0 +1,127 @@
+"""响应缓存
+
+相同的提示会被反复提交 (界面撤销/重做、刷新、审阅工具回放), 每次都要重新解码、
+编码 PNG/RLE 与 base64。对确定性的推理端点缓存最终序列化好的响应字节:
+  - 键为 (端点, 模型, 图片内容哈希, 规范化的提示 / 置信度 / 输出格式), 由各端点给出
+  - 按总字节数 LRU 淘汰, 单个响应超过预算的 1/4 时不缓存
+  - 响应带强 ETag (响应字节的哈希), 请求的 If-None-Match 匹配时返回 304
+命中时返回首次计算的原样字节 (其中的 time_ms 为首次计算耗时)
+"""
+
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from ..config import settings
+from ..utils.hashing import hash_bytes
+
+
+class _Entry:
+    def __init__(self, endpoint: str, body: bytes, etag: str):
+        self.endpoint = endpoint
+        self.body = body
+        self.etag = etag
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match 使用弱比较: 忽略 W/ 前缀, 支持 * 与逗号分隔的多个值"""
+    if not header:
+        return False
+    for value in header.split(","):
+        value = value.strip()
+        if value == "*" or value.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._evictions = 0
+        self._stats: dict[str, dict] = {}
+
+    def _endpoint_stats(self, endpoint: str) -> dict:
+        return self._stats.setdefault(endpoint, {
+            "hits": 0,
+            "misses": 0,
+            "not_modified": 0,
+            "saved_bytes": 0,  # 304 省去传输的字节数
+        })
+
+    def _put(self, key: str, entry: _Entry) -> None:
+        if len(entry.body) > self.max_bytes // 4:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old.body)
+        self._entries[key] = entry
+        self._bytes += len(entry.body)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted.body)
+            self._evictions += 1
+
+    async def get_or_compute(
+        self,
+        endpoint: str,
+        key: str,
+        compute: Callable[[], Awaitable[bytes]],
+    ) -> tuple[bytes, str]:
+        """返回 (响应字节, ETag); 未命中时计算并缓存 (计算失败不缓存)"""
+        stats = self._endpoint_stats(endpoint)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            stats["hits"] += 1
+            return entry.body, entry.etag
+
+        stats["misses"] += 1
+        body = await compute()
+        # 合并的并发请求可能已写入同一个键
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = _Entry(endpoint, body, f'"{hash_bytes(body)}"')
+            self._put(key, entry)
+        return entry.body, entry.etag
+
+    def respond(self, request: Request, endpoint: str, body: bytes, etag: str,
+                media_type: str = "application/json") -> Response:
+        """返回带 ETag 的响应; 客户端已持有同一响应时返回 304"""
+        headers = {"ETag": etag}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            stats = self._endpoint_stats(endpoint)
+            stats["not_modified"] += 1
+            stats["saved_bytes"] += len(body)
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    def stats(self) -> dict:
+        usage: dict[str, int] = {}
+        for entry in self._entries.values():
+            usage[entry.endpoint] = usage.get(entry.endpoint, 0) + len(entry.body)
+        endpoints = {}
+        for endpoint, s in self._stats.items():
+            lookups = s["hits"] + s["misses"]
+            endpoints[endpoint] = {
+                **s,
+                "hit_rate": s["hits"] / lookups if lookups else 0.0,
+                "bytes": usage.get(endpoint, 0),
+            }
+        hits = sum(s["hits"] for s in self._stats.values())
+        lookups = hits + sum(s["misses"] for s in self._stats.values())
+        return {
+            "endpoints": endpoints,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self._evictions,
+        }
+
+
+# 全局单例
+response_cache = ResponseCache(settings.response_cache_mb * 1024 * 1024)
@@ -0,0 +1,213 @@
+"""优先级调度 (准入控制)
+
+模型管理器同一时刻只能执行一个推理 (多副本模型为副本数), 交互点击与批量任务争用时按优先级排队:
+  - 三个优先级: interactive (交互点击) / standard (普通请求) / bulk (批量任务)
+  - 每个优先级有独立的排队上限, 超出时立即拒绝 (QueueFullError)
+  - 多个优先级都在排队时按权重分配执行机会 (stride 调度), 低优先级不会被饿死
+  - 不抢占: 已开始执行的低优先级推理会执行完, 之后优先服务高优先级
+  - 异步请求在事件循环中等待, 不占用线程池; 任务线程同步等待
+  - 异步接口: slot() 上下文管理器, 或成对调用 acquire()/release()
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+from ..config import settings
+
+INTERACTIVE = "interactive"
+STANDARD = "standard"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, STANDARD, BULK)
+
+WAIT_SAMPLES = 1000
+
+
+class QueueFullError(Exception):
+    """优先级队列已满"""
+
+
+class _Waiter:
+    """排队中的请求, 被调度时通过 asyncio.Future 或 threading.Event 唤醒"""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.event = None if loop else threading.Event()
+        self.enqueued_at = time.perf_counter()
+
+    def grant(self) -> None:
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._set_result)
+        else:
+            self.event.set()
+
+    def _set_result(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class _ClassStats:
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = 0
+        self.waits_ms: deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+    def snapshot(self, queued: int, running: int) -> dict:
+        waits = sorted(self.waits_ms)
+        return {
+            "queued": queued,
+            "running": running,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_ms_avg": round(sum(waits) / len(waits), 1) if waits else 0.0,
+            "wait_ms_p95": round(waits[int(len(waits) * 0.95)], 1) if waits else 0.0,
+            "wait_ms_max": round(waits[-1], 1) if waits else 0.0,
+        }
+
+
+class _ResourceQueue:
+    """单个模型管理器的执行槽与各优先级队列"""
+
+    def __init__(self):
+        self.capacity = 1
+        # 各优先级正在执行的数量
+        self.running: dict[str, int] = {p: 0 for p in PRIORITIES}
+        self.queues: dict[str, deque[_Waiter]] = {p: deque() for p in PRIORITIES}
+        # stride 调度: 每次被选中 pass 增加 1/weight, 选择 pass 最小的非空队列
+        self.passes: dict[str, float] = {p: 0.0 for p in PRIORITIES}
+        # 最近一次被选中时的 pass (虚拟时间), 新加入的优先级从这里开始
+        self.vtime = 0.0
+
+    @property
+    def busy(self) -> bool:
+        return sum(self.running.values()) >= self.capacity
+
+    def charge(self, priority: str, weight: int) -> None:
+        self.vtime = self.passes[priority]
+        self.passes[priority] += 1 / weight
+
+
+class PriorityScheduler:
+    def __init__(self, weights: dict[str, int], queue_limits: dict[str, int]):
+        self.weights = {p: max(1, weights.get(p, 1)) for p in PRIORITIES}
+        self.queue_limits = {p: queue_limits.get(p, 0) for p in PRIORITIES}
+        self._resources: dict[int, _ResourceQueue] = {}
+        self._stats = {p: _ClassStats() for p in PRIORITIES}
+        self._lock = threading.Lock()
+
+    # ---------- 调度 ----------
+
+    def _enqueue(self, key: int, capacity: int, priority: str, waiter: _Waiter) -> bool:
+        """返回 True 表示无需排队可立即执行"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"未知优先级: {priority} (支持: {PRIORITIES})")
+
+        with self._lock:
+            resource = self._resources.setdefault(key, _ResourceQueue())
+            resource.capacity = capacity
+            queue = resource.queues[priority]
+            stats = self._stats[priority]
+
+            if not resource.busy:
+                resource.running[priority] += 1
+                resource.charge(priority, self.weights[priority])
+                stats.admitted += 1
+                stats.waits_ms.append(0.0)
+                return True
+
+            if len(queue) >= self.queue_limits[priority]:
+                stats.rejected += 1
+                raise QueueFullError(f"{priority} 队列已满 ({self.queue_limits[priority]})")
+
+            if not queue:
+                # 空闲后重新排队的优先级不能积攒之前的份额
+                resource.passes[priority] = max(resource.passes[priority], resource.vtime)
+            queue.append(waiter)
+            return False
+
+    def _release(self, key: int, finished: str) -> None:
+        with self._lock:
+            resource = self._resources[key]
+            resource.running[finished] -= 1
+            candidates = [p for p in PRIORITIES if resource.queues[p]]
+            if not candidates:
+                return
+
+            # pass 相同时按优先级顺序
+            priority = min(candidates, key=lambda p: (resource.passes[p], PRIORITIES.index(p)))
+            resource.charge(priority, self.weights[priority])
+            waiter = resource.queues[priority].popleft()
+            resource.running[priority] += 1
+
+            stats = self._stats[priority]
+            stats.admitted += 1
+            stats.waits_ms.append((time.perf_counter() - waiter.enqueued_at) * 1000)
+        waiter.grant()
+
+    def _cancel(self, key: int, priority: str, waiter: _Waiter) -> None:
+        """等待中被取消 (客户端断开): 出队; 若已被调度则把执行槽交给下一个"""
+        with self._lock:
+            queue = self._resources[key].queues[priority]
+            if waiter in queue:
+                queue.remove(waiter)
+                return
+        self._release(key, priority)
+
+    async def acquire(self, manager, priority: str = STANDARD) -> None:
+        """异步获取执行槽 (在事件循环中等待), 用完后必须 release"""
+        key = id(manager)
+        waiter = _Waiter(asyncio.get_running_loop())
+        if not self._enqueue(key, manager.capacity, priority, waiter):
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                self._cancel(key, priority, waiter)
+                raise
+
+    def release(self, manager, priority: str = STANDARD) -> None:
+        """归还 acquire 获取的执行槽"""
+        self._release(id(manager), priority)
+
+    @asynccontextmanager
+    async def slot(self, manager, priority: str = STANDARD):
+        """异步获取执行槽; 需要单独统计排队耗时时使用 acquire/release"""
+        await self.acquire(manager, priority)
+        try:
+            yield
+        finally:
+            self.release(manager, priority)
+
+    @contextmanager
+    def slot_sync(self, manager, priority: str = BULK):
+        """同步获取执行槽 (任务线程)"""
+        key = id(manager)
+        waiter = _Waiter()
+        if not self._enqueue(key, manager.capacity, priority, waiter):
+            waiter.event.wait()
+        try:
+            yield
+        finally:
+            self._release(key, priority)
+
+    # ---------- 统计 ----------
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {}
+            for p in PRIORITIES:
+                queued = sum(len(r.queues[p]) for r in self._resources.values())
+                running = sum(r.running[p] for r in self._resources.values())
+                result[p] = {
+                    **self._stats[p].snapshot(queued, running),
+                    "weight": self.weights[p],
+                    "queue_limit": self.queue_limits[p],
+                }
+            return result
+
+
+# 全局单例
+scheduler = PriorityScheduler(settings.scheduler_weights, settings.scheduler_queue_limits)
@@ -0,0 +1,88 @@
+"""请求合并 (single-flight)
+
+同一时刻到达的相同推理请求 (页面刷新、多人打开同一张图片) 只计算一次,
+其余请求等待同一个计算并共享其序列化结果;
+全部等待者都超时或断开后, 计算在下一个阶段边界中止 (见 deadline.py)
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, TypeVar
+
+from .deadline import request_deadlines
+
+T = TypeVar("T")
+
+
+class _Flight:
+    def __init__(self):
+        self.task: asyncio.Task = None
+        self.elapsed_ms = 0.0
+        self.watchers = request_deadlines.share()
+
+
+class SingleFlight:
+    """
+    按 key 合并进行中的计算
+    计算在独立 Task 中运行, 发起者断开连接不会影响其他等待者
+    """
+
+    def __init__(self):
+        self._flights: dict[str, _Flight] = {}
+        self._stats: dict[str, dict] = {}
+
+    async def do(self, endpoint: str, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        stats = self._stats.setdefault(endpoint, {
+            "requests": 0,
+            "executions": 0,
+            "coalesced": 0,
+            "saved_ms": 0.0,
+        })
+        stats["requests"] += 1
+
+        flight = self._flights.get(key)
+        if flight is not None:
+            stats["coalesced"] += 1
+            request_deadlines.join(flight.watchers)
+            result = await asyncio.shield(flight.task)
+            stats["saved_ms"] += flight.elapsed_ms
+            return result
+
+        stats["executions"] += 1
+        flight = _Flight()
+        flight.task = asyncio.ensure_future(self._run(flight, fn))
+        self._flights[key] = flight
+
+        def done(task: asyncio.Task) -> None:
+            self._flights.pop(key, None)
+            if not task.cancelled():
+                task.exception()  # 所有等待者都已断开时避免 "never retrieved" 警告
+
+        flight.task.add_done_callback(done)
+        return await asyncio.shield(flight.task)
+
+    @staticmethod
+    async def _run(flight: _Flight, fn: Callable[[], Awaitable[T]]) -> T:
+        start = time.perf_counter()
+        # 在本 Task 的上下文中改为共享的等待者列表
+        request_deadlines.bind(flight.watchers)
+        try:
+            return await fn()
+        finally:
+            flight.elapsed_ms = (time.perf_counter() - start) * 1000
+
+    def stats(self) -> dict:
+        """合并统计: 每个端点的请求数、实际执行数、合并数与节省的计算时间"""
+        result = {}
+        for endpoint, s in self._stats.items():
+            result[endpoint] = {
+                **s,
+                "saved_ms": round(s["saved_ms"], 1),
+                "coalesce_rate": s["coalesced"] / s["requests"] if s["requests"] else 0.0,
+            }
+        result["in_flight"] = len(self._flights)
+        return result
+
+
+# 全局单例
+inference_flight = SingleFlight()
@@ -0,0 +1,227 @@
+"""流量录制
+
+把线上请求写入紧凑的 JSONL trace, 供 scripts/replay_traffic.py 按原节奏 (或加速) 回放压测:
+  - 录制 /api/segment、/api/embedding、/api/segment/text、/api/upload
+  - 每行一个请求: 到达时间 (相对录制开始, 秒)、端点、状态码、耗时、模型、
+    图片哈希与尺寸、提示 (点击 / 文本等请求参数)
+  - 默认不保存图片, 回放时按哈希与尺寸生成替代图片;
+    开启 record_images 时每张图片只保存一次 (images/<hash>.png, 上传原文件 uploads/<hash>.<ext>)
+  - 上传同时记录解码后的图片哈希 (与之后按 /uploads/ URL 请求时一致), 回放时据此把上传与后续点击关联
+未录制时每个请求只多一次布尔判断
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from io import BytesIO
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+from pydantic import BaseModel
+
+from ..utils.hashing import hash_image
+from .image_loader import decode_image_bytes
+
+TRACE_VERSION = 2
+RECORDED_PATHS = ("/api/segment", "/api/embedding", "/api/segment/text", "/api/upload")
+
+_current: ContextVar[Optional[dict]] = ContextVar("traffic_entry", default=None)
+
+
+class TrafficRecorder:
+    def __init__(self):
+        # 请求路径上唯一的检查
+        self.active = False
+        self.path: Optional[str] = None
+        self.record_images = False
+        self.recorded = 0
+        self._directory = ""
+        self._file = None
+        self._started_at = 0.0
+        self._saved: set[str] = set()
+        self._lock = threading.Lock()
+
+    # ---------- 会话 ----------
+
+    def start(self, directory: str, record_images: bool = False) -> dict:
+        """开始录制到新的 trace 文件 (替换进行中的录制)"""
+        self.stop()
+        name = time.strftime("traffic-%Y%m%d-%H%M%S")
+        self._directory = os.path.join(directory, name)
+        os.makedirs(self._directory, exist_ok=True)
+
+        with self._lock:
+            self.path = os.path.join(self._directory, "trace.jsonl")
+            self._file = open(self.path, "w", encoding="utf-8")
+            self._write({
+                "type": "header",
+                "version": TRACE_VERSION,
+                "started_at": time.time(),
+                "record_images": record_images,
+            })
+            self.record_images = record_images
+            self.recorded = 0
+            self._saved = set()
+            self._started_at = time.perf_counter()
+            self.active = True
+
+        print(f"[Traffic] 开始录制: {self.path} (保存图片: {record_images})")
+        return self.status()
+
+    def stop(self) -> dict:
+        with self._lock:
+            self.active = False
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                print(f"[Traffic] 停止录制: {self.path}, 共 {self.recorded} 个请求")
+        return self.status()
+
+    def status(self) -> dict:
+        return {
+            "active": self.active,
+            "path": self.path,
+            "record_images": self.record_images,
+            "recorded": self.recorded,
+        }
+
+    def _write(self, record: dict) -> None:
+        self._file.write(json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    # ---------- 请求 ----------
+
+    def begin(self, method: str, path: str) -> Optional[dict]:
+        if method != "POST" or path not in RECORDED_PATHS:
+            return None
+        return {"t": round(time.perf_counter() - self._started_at, 4), "endpoint": path}
+
+    def end(self, entry: dict, status: int, latency_ms: float) -> None:
+        entry["status"] = status
+        entry["latency_ms"] = round(latency_ms, 1)
+        with self._lock:
+            if self._file is None:
+                return
+            self._write(entry)
+            self.recorded += 1
+
+    # ---------- 标注 ----------
+
+    def annotate_request(
+        self,
+        request: BaseModel,
+        image: np.ndarray,
+        image_hash: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> None:
+        """记录请求参数与图片 (哈希/尺寸); 不记录 image_url 本身 (可能是 data URL 或本机路径)"""
+        entry = _current.get()
+        if entry is None:
+            return
+
+        image_hash = image_hash or hash_image(image)
+        params = request.model_dump(exclude={"image_url"})
+        entry.update({
+            "model": model or params.get("model"),
+            "image_hash": image_hash,
+            "image_size": [int(image.shape[0]), int(image.shape[1])],
+            "request": params,
+        })
+        if self.record_images:
+            self._save_async(os.path.join("images", f"{image_hash}.png"), lambda: _encode_png(image))
+
+    def annotate_upload(self, digest: str, ext: str, content: bytes, precompute: list[str]) -> None:
+        entry = _current.get()
+        if entry is None:
+            return
+
+        try:
+            # 只读取文件头获取尺寸
+            width, height = Image.open(BytesIO(content)).size
+            image_size = [height, width]
+        except Exception:
+            image_size = None
+        entry.update({
+            "hash": digest,
+            "ext": ext,
+            "size": len(content),
+            "image_size": image_size,
+            "request": {"precompute": precompute},
+        })
+        if self.record_images:
+            self._save_async(os.path.join("uploads", f"{digest}.{ext}"), lambda: content)
+
+        def pixel_hash() -> None:
+            try:
+                image = decode_image_bytes(content)
+            except Exception:
+                return
+            entry["image_hash"] = hash_image(image)
+            entry["image_size"] = [int(image.shape[0]), int(image.shape[1])]
+
+        # 在线程池中解码, 响应不等待; 中间件写入 trace 前等待完成
+        entry["_pending"] = asyncio.get_running_loop().run_in_executor(None, pixel_hash)
+
+    def _save_async(self, relative_path: str, encode) -> None:
+        """在线程池中保存图片 (每个文件只保存一次)"""
+        with self._lock:
+            if relative_path in self._saved:
+                return
+            self._saved.add(relative_path)
+        path = os.path.join(self._directory, relative_path)
+
+        def save() -> None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(encode())
+
+        asyncio.get_running_loop().run_in_executor(None, save)
+
+
+def _encode_png(image: np.ndarray) -> bytes:
+    buffer = BytesIO()
+    Image.fromarray(image).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class TrafficMiddleware:
+    """ASGI 中间件: 记录被录制端点的到达时间、状态码与耗时, 请求参数由各端点标注"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not traffic_recorder.active or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        entry = traffic_recorder.begin(scope["method"], scope["path"])
+        if entry is None:
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = _current.set(entry)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            latency_ms = (time.perf_counter() - start) * 1000
+            _current.reset(token)
+            pending = entry.pop("_pending", None)
+            if pending is not None:
+                await pending
+            traffic_recorder.end(entry, status, latency_ms)
+
+
+# 全局单例
+traffic_recorder = TrafficRecorder()
@@ -0,0 +1,149 @@
+"""视频帧加载工具 (SAM2 视频传播)
+
+帧按需解码, 只在内存中保留最近使用的若干帧,
+长视频不会一次性全部解码进内存
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+
+from .image_loader import load_image_sync
+
+
+class FrameSource:
+    """帧来源接口: 按索引解码单帧 RGB [H, W, 3]"""
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    @property
+    def size(self) -> tuple[int, int]:
+        """原始帧尺寸 (H, W)"""
+        raise NotImplementedError
+
+    def read(self, index: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class VideoFileSource(FrameSource):
+    """视频文件帧来源 (OpenCV 解码)
+
+    顺序读取时直接 grab 下一帧, 仅在跳帧 (如反向传播) 时才 seek
+    """
+
+    def __init__(self, path: str):
+        import cv2
+
+        self._cv2 = cv2
+        self._cap = cv2.VideoCapture(path)
+        if not self._cap.isOpened():
+            raise ValueError(f"无法打开视频: {path}")
+
+        self._length = int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self._size = (
+            int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        )
+        self._next_index = 0
+        self._lock = threading.Lock()
+
+        if self._length <= 0:
+            raise ValueError(f"视频没有可读取的帧: {path}")
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self._size
+
+    def read(self, index: int) -> np.ndarray:
+        cv2 = self._cv2
+        with self._lock:
+            if index != self._next_index:
+                self._cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ok, frame = self._cap.read()
+            if not ok:
+                raise ValueError(f"读取视频帧失败: {index}")
+            self._next_index = index + 1
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def close(self) -> None:
+        self._cap.release()
+
+
+class FrameListSource(FrameSource):
+    """有序帧列表来源 (每帧一个图片 URL, 与 load_image 支持的格式一致)"""
+
+    def __init__(self, urls: list[str]):
+        if not urls:
+            raise ValueError("帧列表为空")
+        self._urls = urls
+        self._size: Optional[tuple[int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+    @property
+    def size(self) -> tuple[int, int]:
+        if self._size is None:
+            frame = self.read(0)
+            self._size = (frame.shape[0], frame.shape[1])
+        return self._size
+
+    def read(self, index: int) -> np.ndarray:
+        # 在推理线程中调用
+        return load_image_sync(self._urls[index])
+
+
+class LazyFrameStore:
+    """
+    惰性帧存储 - 替代 SAM2 inference_state["images"]
+
+    SAM2 视频预测器只通过 len() 和 [idx] 访问帧,
+    这里按需解码并预处理, LRU 最多缓存 max_frames 帧
+    """
+
+    def __init__(
+        self,
+        source: FrameSource,
+        transform: Callable[[np.ndarray], object],
+        max_frames: int = 32,
+    ):
+        self.source = source
+        self.transform = transform
+        self.max_frames = max(1, max_frames)
+        self._cache: OrderedDict[int, object] = OrderedDict()
+        self._lock = threading.Lock()
+        self.decoded = 0
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self)
+        with self._lock:
+            if index in self._cache:
+                self._cache.move_to_end(index)
+                return self._cache[index]
+
+        frame = self.transform(self.source.read(index))
+
+        with self._lock:
+            self._cache[index] = frame
+            self.decoded += 1
+            while len(self._cache) > self.max_frames:
+                self._cache.popitem(last=False)
+        return frame
+
+    def close(self) -> None:
+        with self._lock:
+            self._cache.clear()
+        self.source.close()
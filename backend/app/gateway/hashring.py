@@ -0,0 +1,129 @@
+"""一致性哈希环与负载均衡"""
+
+import bisect
+import hashlib
+import threading
+from typing import Optional
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class ConsistentHashRing:
+    """
+    带虚拟节点的一致性哈希环
+    实例加入/离开时只有约 1/N 的键迁移, 其余键的归属不变
+    """
+
+    def __init__(self, virtual_nodes: int = 128):
+        self.virtual_nodes = virtual_nodes
+        self._ring: list[tuple[int, str]] = []
+        self._nodes: set[str] = set()
+
+    @property
+    def nodes(self) -> list[str]:
+        return sorted(self._nodes)
+
+    def add(self, node: str) -> None:
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for i in range(self.virtual_nodes):
+            bisect.insort(self._ring, (_hash(f"{node}#{i}"), node))
+
+    def remove(self, node: str) -> None:
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        self._ring = [entry for entry in self._ring if entry[1] != node]
+
+    def candidates(self, key: str) -> list[str]:
+        """按环上顺时针顺序返回不重复的实例, 第一个为该键的归属实例"""
+        if not self._ring:
+            return []
+
+        start = bisect.bisect(self._ring, (_hash(key), ""))
+        result: list[str] = []
+        for offset in range(len(self._ring)):
+            node = self._ring[(start + offset) % len(self._ring)][1]
+            if node not in result:
+                result.append(node)
+                if len(result) == len(self._nodes):
+                    break
+        return result
+
+    def owner(self, key: str) -> Optional[str]:
+        candidates = self.candidates(key)
+        return candidates[0] if candidates else None
+
+
+class Balancer:
+    """
+    缓存亲和路由
+    - 正常情况下路由到键的归属实例, 使同一图片的点击命中同一实例的编码状态
+    - 归属实例饱和 (在途请求数达到上限) 时退回到负载最低的实例
+    """
+
+    def __init__(self, virtual_nodes: int = 128, max_inflight: int = 4):
+        self.ring = ConsistentHashRing(virtual_nodes)
+        self.max_inflight = max_inflight
+        self._inflight: dict[str, int] = {}
+        self._stats: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def add(self, node: str) -> None:
+        with self._lock:
+            self.ring.add(node)
+            self._inflight.setdefault(node, 0)
+            self._stats.setdefault(node, {"owned": 0, "spilled_in": 0, "requests": 0})
+
+    def remove(self, node: str) -> None:
+        with self._lock:
+            self.ring.remove(node)
+
+    def pick(self, key: Optional[str]) -> Optional[str]:
+        """选择实例并计入在途请求, 调用方结束后必须 release"""
+        with self._lock:
+            nodes = self.ring.nodes
+            if not nodes:
+                return None
+
+            if key is None:
+                node = min(nodes, key=lambda n: self._inflight[n])
+            else:
+                owner = self.ring.owner(key)
+                if self._inflight[owner] < self.max_inflight:
+                    node = owner
+                    self._stats[node]["owned"] += 1
+                else:
+                    node = min(nodes, key=lambda n: self._inflight[n])
+                    if node != owner:
+                        self._stats[node]["spilled_in"] += 1
+                    else:
+                        self._stats[node]["owned"] += 1
+
+            self._inflight[node] += 1
+            self._stats[node]["requests"] += 1
+            return node
+
+    def acquire(self, node: str) -> None:
+        """直接计入指定实例的在途请求 (固定路由的请求)"""
+        with self._lock:
+            self._inflight[node] = self._inflight.get(node, 0) + 1
+
+    def release(self, node: str) -> None:
+        with self._lock:
+            self._inflight[node] = max(0, self._inflight.get(node, 0) - 1)
+
+    def status(self) -> dict:
+        with self._lock:
+            active = set(self.ring.nodes)
+            return {
+                node: {
+                    "active": node in active,
+                    "inflight": self._inflight.get(node, 0),
+                    **self._stats.get(node, {}),
+                }
+                for node in sorted(set(self._inflight) | active)
+            }
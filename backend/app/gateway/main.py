@@ -0,0 +1,290 @@
+"""SegmentX 路由网关
+
+多个 SegmentX 实例前的轻量反向代理:
+按图片内容哈希一致性哈希到固定实例, 使同一图片的上传 (含后台预编码)、点击与 WS 会话
+命中同一实例的编码状态 (各模型的编码都在该实例上); 实例加入/离开时平滑迁移; 归属实例饱和时退回到负载最低的实例
+
+各实例需共享 uploads 目录 (同机多进程, 或挂载同一存储)
+
+启动:
+  GATEWAY_BACKENDS='["http://127.0.0.1:8001","http://127.0.0.1:8002"]' \\
+      uvicorn app.gateway.main:app --port 8000
+  或: bash scripts/cluster.sh 3
+"""
+
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import aiohttp
+from fastapi import FastAPI, HTTPException, Request, WebSocket
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from ..config import settings
+from ..utils.hashing import hash_bytes
+from .hashring import Balancer
+
+# 不转发的逐跳头
+HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "host", "content-length",
+}
+MAX_JOB_OWNERS = 10000
+
+balancer = Balancer(settings.gateway_virtual_nodes, settings.gateway_max_inflight)
+known_nodes: set[str] = set()
+# 任务状态只在提交它的实例上可取消, 记录任务 ID → 实例
+job_owners: OrderedDict[str, str] = OrderedDict()
+session: Optional[aiohttp.ClientSession] = None
+
+
+async def check_health(node: str) -> bool:
+    try:
+        async with session.get(f"{node}/health", timeout=aiohttp.ClientTimeout(total=2)) as resp:
+            return resp.status == 200
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return False
+
+
+async def health_loop():
+    """周期性健康检查: 不健康的实例移出哈希环, 恢复后重新加入"""
+    while True:
+        for node in list(known_nodes):
+            if await check_health(node):
+                balancer.add(node)
+            else:
+                balancer.remove(node)
+        await asyncio.sleep(settings.gateway_health_interval)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global session
+    session = aiohttp.ClientSession(
+        auto_decompress=False,
+        timeout=aiohttp.ClientTimeout(total=None, sock_connect=5),
+    )
+    for node in settings.gateway_backends:
+        known_nodes.add(node.rstrip("/"))
+        balancer.add(node.rstrip("/"))
+
+    print(f"🚦 SegmentX Gateway: {sorted(known_nodes)}")
+    health_task = asyncio.create_task(health_loop())
+
+    yield
+
+    health_task.cancel()
+    await session.close()
+
+
+app = FastAPI(title="SegmentX Gateway", lifespan=lifespan)
+
+
+# ---------- 路由键 ----------
+
+def image_key(image_url: str) -> str:
+    """/uploads/<内容哈希>.<ext> 直接取文件名中的哈希, 其他来源对 URL 本身哈希"""
+    if image_url.startswith("/uploads/"):
+        return os.path.splitext(image_url[len("/uploads/"):])[0]
+    return hash_bytes(image_url.encode("utf-8"))
+
+
+async def routing_key(request: Request, body: bytes) -> Optional[str]:
+    """
+    从请求中提取图片内容哈希; 无法确定时返回 None (按负载路由)
+    键不含模型: 上传时的预编码与之后各模型的点击落在同一实例
+    """
+    path = request.url.path
+
+    if path.startswith("/uploads/"):
+        return image_key(path)
+
+    if path == "/api/upload":
+        # 与上传接口的文件命名一致: 对文件内容哈希
+        form = await request.form()
+        file = form.get("file")
+        if file is not None and hasattr(file, "read"):
+            return hash_bytes(await file.read())
+        return None
+
+    if path.startswith("/api/jobs/"):
+        return None
+
+    content_type = request.headers.get("content-type", "")
+
+    # 直接提交图片的推理请求 (见 core/image_input.py): 对图片字节哈希
+    if content_type.startswith(("image/", "application/octet-stream")) and body:
+        return hash_bytes(body)
+    if content_type.startswith("multipart/form-data") and path != "/api/upload":
+        form = await request.form()
+        image = form.get("image")
+        if image is not None and hasattr(image, "read"):
+            return hash_bytes(await image.read())
+        if isinstance(form.get("request"), str):
+            body, content_type = form["request"].encode("utf-8"), "application/json"
+
+    if content_type.startswith("application/json") and body:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return None
+        if path == "/api/jobs":
+            payload = payload.get("payload", {})
+        if isinstance(payload, dict) and isinstance(payload.get("image_url"), str):
+            return image_key(payload["image_url"])
+
+    return None
+
+
+def pinned_node(path: str) -> Optional[str]:
+    """/api/jobs/<id>... 固定转发到提交该任务的实例"""
+    if path.startswith("/api/jobs/"):
+        job_id = path[len("/api/jobs/"):].split("/")[0]
+        node = job_owners.get(job_id)
+        if node in balancer.ring.nodes:
+            return node
+    return None
+
+
+# ---------- 管理接口 ----------
+
+class NodeRequest(BaseModel):
+    url: str
+
+
+@app.get("/gateway/nodes")
+async def list_nodes():
+    """各实例的在途请求数与路由统计"""
+    return balancer.status()
+
+
+@app.post("/gateway/nodes")
+async def join_node(request: NodeRequest):
+    """实例加入 (约 1/N 的键迁移到新实例)"""
+    node = request.url.rstrip("/")
+    if not await check_health(node):
+        raise HTTPException(status_code=400, detail=f"实例不可用: {node}")
+    known_nodes.add(node)
+    balancer.add(node)
+    return balancer.status()
+
+
+@app.delete("/gateway/nodes")
+async def leave_node(url: str):
+    """实例离开 (其键迁移到环上的下一个实例)"""
+    node = url.rstrip("/")
+    known_nodes.discard(node)
+    balancer.remove(node)
+    return balancer.status()
+
+
+# ---------- 代理 ----------
+
+def forward_headers(headers) -> dict:
+    return {k: v for k, v in headers.items() if k.lower() not in HOP_HEADERS}
+
+
+@app.websocket("/api/ws/segment")
+async def proxy_websocket(websocket: WebSocket):
+    """交互式分割通道: 按 image_url 路由后双向转发"""
+    node = balancer.pick(image_key(websocket.query_params.get("image_url", "")))
+    if node is None:
+        await websocket.close(code=1013)
+        return
+
+    await websocket.accept()
+    ws_url = node.replace("http", "ws", 1) + f"/api/ws/segment?{websocket.url.query}"
+    try:
+        async with session.ws_connect(ws_url) as upstream:
+            async def client_to_upstream():
+                while True:
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        await upstream.close()
+                        return
+                    if message.get("bytes") is not None:
+                        await upstream.send_bytes(message["bytes"])
+                    elif message.get("text") is not None:
+                        await upstream.send_str(message["text"])
+
+            async def upstream_to_client():
+                async for message in upstream:
+                    if message.type == aiohttp.WSMsgType.BINARY:
+                        await websocket.send_bytes(message.data)
+                    elif message.type == aiohttp.WSMsgType.TEXT:
+                        await websocket.send_text(message.data)
+                    else:
+                        break
+                await websocket.close()
+
+            tasks = [asyncio.create_task(client_to_upstream()), asyncio.create_task(upstream_to_client())]
+            _, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+    except aiohttp.ClientError:
+        await websocket.close(code=1011)
+    finally:
+        balancer.release(node)
+
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"])
+async def proxy(request: Request, path: str):
+    body = await request.body()
+    key = await routing_key(request, body)
+    headers = forward_headers(request.headers)
+    url_suffix = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+
+    # 最多尝试两个实例: 连接失败时把实例移出哈希环并重试
+    for _ in range(2):
+        node = pinned_node(request.url.path)
+        if node is not None:
+            balancer.acquire(node)
+        else:
+            node = balancer.pick(key)
+        if node is None:
+            raise HTTPException(status_code=503, detail="没有可用的后端实例")
+
+        try:
+            upstream = await session.request(
+                request.method, node + url_suffix, headers=headers, data=body
+            )
+            break
+        except aiohttp.ClientError:
+            balancer.release(node)
+            balancer.remove(node)
+    else:
+        raise HTTPException(status_code=502, detail="后端实例不可用")
+
+    if request.url.path == "/api/jobs" and upstream.status < 300:
+        content = await upstream.read()
+        try:
+            job_owners[json.loads(content)["id"]] = node
+            while len(job_owners) > MAX_JOB_OWNERS:
+                job_owners.popitem(last=False)
+        except (ValueError, KeyError):
+            pass
+        balancer.release(node)
+        upstream.release()
+        return StreamingResponse(
+            iter([content]),
+            status_code=upstream.status,
+            headers={**forward_headers(upstream.headers), "X-SegmentX-Backend": node},
+        )
+
+    async def stream():
+        try:
+            async for chunk in upstream.content.iter_any():
+                yield chunk
+        finally:
+            upstream.release()
+            balancer.release(node)
+
+    return StreamingResponse(
+        stream(),
+        status_code=upstream.status,
+        headers={**forward_headers(upstream.headers), "X-SegmentX-Backend": node},
+    )
@@ -7,8 +7,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from .config import settings
-from .api import models, segment, embedding, text_segment, upload
+from .api import models, segment, embedding, text_segment, upload, video, jobs, metrics, interactive, admin, artifacts
 from .models.registry import model_registry
+from .core.jobs import job_manager
+from .core.profiling import ProfilingMiddleware
+from .core.traffic import TrafficMiddleware, traffic_recorder
+from .core.deadline import DeadlineMiddleware
 
 # 上传目录
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads")
@@ -22,6 +26,10 @@ async def lifespan(app: FastAPI):
     print(f"   Device: {settings.device}")
     print(f"   Models dir: {settings.models_dir}")
     print(f"   Available models: {list(settings.available_models.keys())}")
+    job_manager.start()
+    print(f"   Jobs: {settings.jobs_dir} (workers: {settings.job_workers})")
+    if settings.traffic_record:
+        traffic_recorder.start(settings.traffic_dir, settings.traffic_record_images)
     print()
     print("💡 提示: 模型将在首次使用时按需加载")
     print("   也可手动加载: POST /api/models/<model_id>/load")
@@ -32,6 +40,8 @@ async def lifespan(app: FastAPI):
     yield
 
     print("🛑 正在关闭...")
+    job_manager.shutdown()
+    traffic_recorder.stop()
     model_registry.unload_all()
     print("✅ 已清理所有模型")
 
@@ -52,6 +62,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 按需性能剖析 (未开启时只有一次布尔判断)
+app.add_middleware(ProfilingMiddleware)
+
+# 流量录制 (未录制时只有一次布尔判断)
+app.add_middleware(TrafficMiddleware)
+
+# 请求截止时间与断开检测
+app.add_middleware(DeadlineMiddleware)
+
 # 静态文件 - 上传的图片
 app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 
@@ -61,6 +80,12 @@ app.include_router(segment.router)
 app.include_router(embedding.router)
 app.include_router(text_segment.router)
 app.include_router(upload.router)
+app.include_router(video.router)
+app.include_router(jobs.router)
+app.include_router(metrics.router)
+app.include_router(interactive.router)
+app.include_router(admin.router)
+app.include_router(artifacts.router)
 
 
 @app.get("/")
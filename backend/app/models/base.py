@@ -1,26 +1,69 @@
 """模型管理器基类"""
 
+import copy
+import threading
 from abc import ABC, abstractmethod
-from typing import Tuple
+from typing import Callable, Tuple, TypeVar
 import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+T = TypeVar("T")
 
 
 class BaseModelManager(ABC):
     """
     所有 SAM 模型管理器的基类
     定义统一接口: 加载、编码、分割
+
+    predictor 持有当前图片的编码状态, 非线程安全,
+    并发调用方需持有 lock 完成 set_image → predict 整个过程
     """
 
+    # predictor 上保存当前图片编码结果的属性, 用于快照/恢复
+    _image_state_attrs: tuple[str, ...] = ()
+
     def __init__(self):
         self.model = None
         self.predictor = None
         self.is_loaded = False
         self._model_id = ""
+        self.lock = threading.RLock()
+        # 加载方式与加载统计 (由 registry 填充耗时和内存)
+        self.load_method = "builder"
+        self.load_stats: dict = {}
+        # 图像编码器是否为 int8 动态量化
+        self.quantized = False
 
     @property
     def model_id(self) -> str:
         return self._model_id
 
+    @property
+    def primary(self) -> "BaseModelManager":
+        """实际的模型管理器 (多副本时为第一个副本)"""
+        return self
+
+    @property
+    def capacity(self) -> int:
+        """可同时执行的推理数 (多副本时为副本数)"""
+        return 1
+
+    def execute(self, fn: Callable[[], T]) -> T:
+        """持有模型锁执行一次推理 (调用方已获得调度器执行槽)"""
+        with self.lock:
+            return fn()
+
+    async def execute_async(self, fn: Callable[[], T]) -> T:
+        """在线程池中执行, 不阻塞事件循环"""
+        return await run_in_threadpool(self.execute, fn)
+
+    def replicate(self) -> "BaseModelManager":
+        """共享权重的副本: 独立的 predictor (编码状态) 与锁"""
+        replica = copy.copy(self)
+        replica.predictor = type(self.predictor)(self.model)
+        replica.lock = threading.RLock()
+        return replica
+
     @abstractmethod
     def load_model(self, checkpoint_path: str, **kwargs) -> None:
         """加载模型权重"""
@@ -36,6 +79,60 @@ class BaseModelManager(ABC):
         pass
 
     @abstractmethod
+    def set_image(self, image: np.ndarray) -> None:
+        """
+        编码图片 (Encoder), 结果保存在 predictor 中
+        输入: image [H, W, 3] RGB
+        """
+        pass
+
+    def prepare_image(self, image: np.ndarray):
+        """
+        编码前的 CPU 预处理 (缩放/归一化/补齐), 不访问 predictor 状态, 可在模型锁之外并行执行
+        默认不做处理, 全部工作留给 set_prepared_image
+        """
+        return image
+
+    def set_prepared_image(self, prepared) -> None:
+        """基于 prepare_image 的结果编码, 等价于 set_image (需持有模型锁)"""
+        self.set_image(prepared)
+
+    @abstractmethod
+    def predict(
+        self,
+        points: np.ndarray,
+        labels: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        基于当前图片解码 (Decoder)
+        输入: points [N,2], labels [N]
+        输出: (masks [3,H,W], scores [3])
+        """
+        pass
+
+    def image_embedding(self) -> np.ndarray:
+        """当前图片 (set_image / restore_image_state 之后) 的 Embedding"""
+        raise NotImplementedError(f"{type(self).__name__} 不支持导出 Embedding")
+
+    def image_features(self) -> dict[str, np.ndarray]:
+        """
+        前端 Decoder 所需的全部图片特征 (键为 ONNX Decoder 的输入名)
+        默认只有 image embedding
+        """
+        return {"image_embeddings": self.image_embedding()}
+
+    def get_image_state(self) -> dict:
+        """
+        当前图片编码状态的快照 (仅引用, 不拷贝张量)
+        set_image 会创建新的特征对象, 快照不会被后续编码覆盖
+        """
+        return {name: getattr(self.predictor, name) for name in self._image_state_attrs}
+
+    def restore_image_state(self, state: dict) -> None:
+        """恢复 get_image_state 的快照, 之后可直接 predict 而无需重新编码"""
+        for name, value in state.items():
+            setattr(self.predictor, name, value)
+
     def segment(
         self,
         image: np.ndarray,
@@ -43,11 +140,40 @@ class BaseModelManager(ABC):
         labels: np.ndarray,
     ) -> Tuple[np.ndarray, np.ndarray]:
         """
-        点击分割
+        点击分割 = set_image + predict
         输入: image [H,W,3], points [N,2], labels [N]
         输出: (masks [3,H,W], scores [3])
         """
-        pass
+        if not self.is_loaded:
+            raise RuntimeError("模型未加载")
+
+        self.set_image(image)
+        return self.predict(points, labels)
+
+    def predict_from_state(
+        self,
+        state: dict,
+        points: np.ndarray,
+        labels: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """恢复编码状态快照后解码 (跳过 Encoder)"""
+        self.restore_image_state(state)
+        return self.predict(points, labels)
+
+    def generate_embeddings(self, images: list[np.ndarray]) -> np.ndarray:
+        """
+        批量生成 Embedding (离线批处理)
+        默认逐张编码, 支持批量前向的子类可覆盖
+        输出: [B, 256, 64, 64]
+        """
+        return np.concatenate([self.generate_embedding(image) for image in images], axis=0)
+
+    def generate_masks(self, image: np.ndarray) -> list[dict]:
+        """
+        全图自动分割 (Automatic Mask Generator)
+        输出: [{segmentation [H,W] bool, area, bbox, predicted_iou, stability_score}, ...]
+        """
+        raise NotImplementedError(f"{type(self).__name__} 不支持自动分割")
 
     def cleanup(self):
         """释放资源"""
@@ -0,0 +1,103 @@
+"""快速加载 checkpoint
+
+默认的 sam_model_registry[...](checkpoint=...) 先随机初始化整个模型,
+再 torch.load 把整个 .pth 读进内存后拷贝进参数, 加载期间峰值内存约为模型的两倍
+这里:
+  - 首次加载时把 .pth 一次性转换为 .safetensors (与原文件同目录)
+  - 之后通过 mmap 零拷贝读取权重 (没有 safetensors 时使用 torch.load(mmap=True))
+  - 构建模型时参数放在 meta 设备上, 跳过即将被覆盖的随机初始化 (不修改 nn.Module)
+  - load_state_dict(assign=True) 直接引用映射后的张量, 不再拷贝
+"""
+
+import os
+from contextlib import contextmanager
+from typing import Callable
+
+from ..config import settings
+
+
+def safetensors_path(checkpoint_path: str) -> str:
+    return os.path.splitext(checkpoint_path)[0] + ".safetensors"
+
+
+def _torch_load_mmap(checkpoint_path: str) -> dict:
+    import torch
+
+    state_dict = torch.load(checkpoint_path, map_location="cpu", mmap=True, weights_only=True)
+    # SAM2 等 checkpoint 把权重包在 "model" 键下
+    if "model" in state_dict and isinstance(state_dict["model"], dict):
+        state_dict = state_dict["model"]
+    return state_dict
+
+
+def convert_to_safetensors(checkpoint_path: str) -> str:
+    """把 .pth 转换为 .safetensors (已存在则跳过), 返回转换后的路径"""
+    from safetensors.torch import save_file
+
+    target = safetensors_path(checkpoint_path)
+    if os.path.exists(target):
+        return target
+
+    print(f"[Checkpoint] 转换 {os.path.basename(checkpoint_path)} → safetensors...")
+    state_dict = _torch_load_mmap(checkpoint_path)
+    tmp = target + ".tmp"
+    save_file({k: v.contiguous() for k, v in state_dict.items()}, tmp)
+    os.replace(tmp, target)
+    return target
+
+
+def load_state_dict(checkpoint_path: str) -> tuple[dict, str]:
+    """
+    零拷贝读取权重, 返回 (state_dict, 加载方式)
+    张量由文件映射支撑, 只有实际访问的页才会读入内存
+    """
+    if settings.convert_checkpoints:
+        try:
+            convert_to_safetensors(checkpoint_path)
+        except ImportError:
+            pass  # 未安装 safetensors: 直接 mmap 读取 .pth
+
+    target = safetensors_path(checkpoint_path)
+    if os.path.exists(target):
+        from safetensors.torch import load_file
+        return load_file(target, device="cpu"), "safetensors"
+
+    return _torch_load_mmap(checkpoint_path), "mmap"
+
+
+@contextmanager
+def skip_param_init():
+    """
+    在 meta 设备上构建模型: 参数与 buffer 只有形状, 随机初始化不计算、不分配内存
+    torch.device 上下文只作用于当前线程, 其他线程同时构建的模块不受影响
+    """
+    import torch
+
+    with torch.device("meta"):
+        yield
+
+
+def _meta_tensors(model) -> list[str]:
+    """仍在 meta 设备上的参数与 buffer (不在 checkpoint 中的非持久 buffer 无法从权重恢复)"""
+    tensors = list(model.named_parameters()) + list(model.named_buffers())
+    return [name for name, t in tensors if t.is_meta]
+
+
+def build_model_fast(builder: Callable, checkpoint_path: str, strict: bool = True):
+    """
+    用 builder(checkpoint=None) 在 meta 设备上构建模型, 再以 assign 方式装入 mmap 权重
+    返回 (model, 加载方式); 有参数或 buffer 未被覆盖时 (如构建时用 torch.tensor 创建的非持久 buffer)
+    抛出 RuntimeError, 由调用方回退到常规加载
+    """
+    state_dict, method = load_state_dict(checkpoint_path)
+
+    with skip_param_init():
+        model = builder(checkpoint=None)
+
+    model.load_state_dict(state_dict, strict=strict, assign=True)
+
+    missing = _meta_tensors(model)
+    if missing:
+        raise RuntimeError(f"checkpoint 未覆盖的参数或 buffer: {missing[:5]}")
+
+    return model, method
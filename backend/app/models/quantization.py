@@ -0,0 +1,58 @@
+"""图像编码器 int8 动态量化 (CPU)
+
+编码器是 CPU 推理的主要耗时, 其中绝大部分计算在 Linear 层
+(ViT / Hiera 注意力的 qkv、proj 以及 MLP):
+  - 对编码器的 nn.Linear 做 int8 动态量化 (权重 int8, 激活运行时量化)
+  - 首次量化后把量化编码器的权重 (state_dict) 保存为 <checkpoint>.int8.pt,
+    之后量化 float 编码器恢复结构, 再载入保存的权重; 加载失败时使用重新量化的结果
+  - 掩码解码器与提示编码器很轻, 保持 float32
+"""
+
+import os
+
+from ..config import settings
+
+
+def quantized_path(checkpoint_path: str) -> str:
+    return os.path.splitext(checkpoint_path)[0] + ".int8.pt"
+
+
+def quantize_encoder(encoder):
+    """对编码器的 Linear 层做 int8 动态量化, 返回量化后的模块"""
+    import torch
+    import torch.nn as nn
+    from torch.ao.quantization import quantize_dynamic
+
+    return quantize_dynamic(encoder.eval(), {nn.Linear}, dtype=torch.qint8)
+
+
+def load_quantized_encoder(model, checkpoint_path: str, device: str, tag: str):
+    """
+    替换 model.image_encoder 为量化版本, 返回是否已量化
+    动态量化只有 CPU 内核, 其他设备保持 float32
+    """
+    import torch
+
+    if device != "cpu":
+        print(f"[{tag}] ⚠️ int8 动态量化仅支持 CPU, 当前设备 {device}, 使用 float32")
+        return False
+
+    artifact = quantized_path(checkpoint_path)
+    model.image_encoder = quantize_encoder(model.image_encoder)
+    if os.path.exists(artifact):
+        try:
+            # 只加载权重 (不执行 pickle); 结构由上面的量化恢复
+            state_dict = torch.load(artifact, map_location="cpu", weights_only=True)
+            model.image_encoder.load_state_dict(state_dict)
+            print(f"[{tag}] 加载预量化编码器: {os.path.basename(artifact)}")
+            return True
+        except Exception as e:
+            # 旧格式或 torch 版本变化: 使用刚从 float 权重量化的结果, 并重新保存
+            print(f"[{tag}] ⚠️ 预量化编码器加载失败, 重新量化: {str(e).splitlines()[0]}")
+
+    if settings.convert_checkpoints:
+        tmp = artifact + ".tmp"
+        torch.save(model.image_encoder.state_dict(), tmp)
+        os.replace(tmp, artifact)
+        print(f"[{tag}] 保存量化编码器: {os.path.basename(artifact)}")
+    return True
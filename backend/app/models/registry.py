@@ -2,12 +2,18 @@
 
 from typing import Optional
 import os
+import threading
 from .base import BaseModelManager
+from .replicas import ReplicaSet, plan_core_sets, replicate
 from .sam1_manager import SAM1Manager
 from .sam2_manager import SAM2Manager
 from .sam_hq_manager import SAMHQManager
 from .sam3_manager import SAM3Manager
 from ..config import settings
+from ..utils.memory import PeakRSSMonitor
+
+# 支持多副本的模型族 (点击分割; SAM3 文本分割与视频传播不走副本)
+REPLICABLE_FAMILIES = ("sam1", "sam2", "sam_hq")
 
 
 class ModelRegistry:
@@ -18,9 +24,15 @@ class ModelRegistry:
 
     def __init__(self):
         self._managers: dict[str, BaseModelManager] = {}
+        # 请求线程与任务线程可能同时触发加载, 避免重复加载同一模型
+        self._load_lock = threading.RLock()
 
     def load(self, model_id: str) -> BaseModelManager:
         """加载模型并返回管理器"""
+        with self._load_lock:
+            return self._load(model_id)
+
+    def _load(self, model_id: str) -> BaseModelManager:
         # 已加载则直接返回
         if model_id in self._managers:
             return self._managers[model_id]
@@ -36,12 +48,65 @@ class ModelRegistry:
             settings.models_dir, model_config["checkpoint"]
         )
 
+        with PeakRSSMonitor() as monitor:
+            manager = self._create(family, model_config, checkpoint_path)
+
+        manager.load_stats = {
+            "load_time_ms": round(monitor.elapsed_ms, 1),
+            "peak_rss_mb": round(monitor.peak_mb, 1),
+            "load_peak_delta_mb": round(monitor.peak_delta_mb, 1),
+            "load_rss_delta_mb": round(monitor.delta_mb, 1),
+            "load_method": manager.load_method,
+            "quantized": manager.quantized,
+        }
+        print(
+            f"[Registry] {model_id} 加载耗时: {monitor.elapsed_ms:.0f}ms, "
+            f"峰值内存增量: {monitor.peak_delta_mb:.0f}MB ({manager.load_method})"
+        )
+
+        manager._model_id = model_id
+
+        replicas = settings.model_replicas.get(model_id, 1)
+        if replicas > 1:
+            manager = self._replicate(manager, family, replicas)
+
+        self._managers[model_id] = manager
+        return manager
+
+    def _replicate(self, manager: BaseModelManager, family: str, replicas: int) -> BaseModelManager:
+        """创建共享权重的多个副本, 各自绑定到独立的核心集合"""
+        if settings.device != "cpu" or family not in REPLICABLE_FAMILIES:
+            print(f"[Registry] ⚠️ {manager.model_id} 不支持多副本 (仅 CPU 上的 {REPLICABLE_FAMILIES}), 使用单实例")
+            return manager
+
+        try:
+            core_sets = plan_core_sets(replicas, settings.replica_threads)
+        except ValueError as e:
+            # 核心不够切分时退回单实例, 已加载的权重照常使用 (不能让每个请求都重新加载后失败)
+            print(f"[Registry] ⚠️ {manager.model_id} 无法创建 {replicas} 副本 ({e}), 使用单实例")
+            return manager
+
+        replica_set = replicate(manager, replicas, core_sets=core_sets)
+        replica_set.load_stats = {
+            **manager.load_stats,
+            "replicas": replica_set.capacity,
+            "threads_per_replica": len(replica_set.replicas[0].cores),
+        }
+        print(
+            f"[Registry] {manager.model_id} {replica_set.capacity} 副本 × "
+            f"{len(replica_set.replicas[0].cores)} 线程"
+        )
+        return replica_set
+
+    def _create(self, family: str, model_config: dict, checkpoint_path: str) -> BaseModelManager:
+        """按模型族创建管理器并加载权重"""
         if family == "sam1":
             manager = SAM1Manager()
             manager.load_model(
                 checkpoint_path,
                 model_type=model_config.get("type", "vit_b"),
                 device=settings.device,
+                quantized=model_config.get("quantized", False),
             )
         elif family == "sam2":
             manager = SAM2Manager()
@@ -49,6 +114,7 @@ class ModelRegistry:
                 checkpoint_path,
                 config=model_config.get("config", "sam2_hiera_t.yaml"),
                 device=settings.device,
+                quantized=model_config.get("quantized", False),
             )
         elif family == "sam_hq":
             manager = SAMHQManager()
@@ -56,6 +122,7 @@ class ModelRegistry:
                 checkpoint_path,
                 model_type=model_config.get("type", "vit_b"),
                 device=settings.device,
+                quantized=model_config.get("quantized", False),
             )
         elif family == "sam3":
             manager = SAM3Manager()
@@ -66,8 +133,6 @@ class ModelRegistry:
         else:
             raise ValueError(f"不支持的模型族: {family}")
 
-        manager._model_id = model_id
-        self._managers[model_id] = manager
         return manager
 
     def get(self, model_id: str) -> Optional[BaseModelManager]:
@@ -85,6 +150,14 @@ class ModelRegistry:
         """列出已加载的模型 ID"""
         return list(self._managers.keys())
 
+    def replica_stats(self) -> dict[str, list[dict]]:
+        """多副本模型各副本的核心绑定与负载"""
+        return {
+            model_id: manager.replica_stats()
+            for model_id, manager in list(self._managers.items())
+            if isinstance(manager, ReplicaSet)
+        }
+
     def unload(self, model_id: str) -> None:
         """卸载模型"""
         if model_id in self._managers:
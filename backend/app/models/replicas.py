@@ -0,0 +1,227 @@
+"""多副本模型 (CPU 吞吐扩展)
+
+batch=1 的 ViT 推理在大线程池上扩展性很差: 一个请求占满 64 核, 吞吐远低于
+多个小线程池并行。同一 model_id 可以托管 K 个副本:
+  - 副本共享权重 (只读), 各自持有 predictor (编码状态) 与锁
+  - 每个副本有一个专属执行线程, 绑定到互不重叠的核心集合 (sched_setaffinity),
+    并设置自己的 torch 线程数 (OpenMP 线程在该线程首次并行时创建, 继承核心绑定)
+  - 调度器按副本数放行请求, 放行后交给在途最少的副本执行
+对调用方透明: ReplicaSet 的模型接口在副本线程内转发给当前副本
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional, Tuple, TypeVar
+
+import numpy as np
+
+from .base import BaseModelManager
+
+T = TypeVar("T")
+
+
+def available_cores() -> list[int]:
+    """当前进程可用的 CPU 核心"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_core_sets(replicas: int, threads: int = 0) -> list[list[int]]:
+    """
+    把可用核心切分为 replicas 个互不重叠的集合
+    threads <= 0 时平均分配全部核心
+    """
+    cores = available_cores()
+    if replicas < 1:
+        raise ValueError("副本数至少为 1")
+    if threads <= 0:
+        threads = max(1, len(cores) // replicas)
+    if replicas * threads > len(cores):
+        raise ValueError(f"{replicas} 副本 × {threads} 线程超出可用核心数 ({len(cores)})")
+    return [cores[i * threads:(i + 1) * threads] for i in range(replicas)]
+
+
+class Replica:
+    """单个副本: 管理器 + 专属执行线程"""
+
+    def __init__(self, manager: BaseModelManager, index: int, cores: list[int], bind: Callable):
+        self.manager = manager
+        self.index = index
+        self.cores = cores
+        self.inflight = 0
+        self.served = 0
+        self.executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix=f"replica-{manager.model_id}-{index}",
+            initializer=self._init_thread,
+            initargs=(bind,),
+        )
+
+    def _init_thread(self, bind: Callable) -> None:
+        import torch
+
+        if hasattr(os, "sched_setaffinity"):
+            # pid 0 = 当前线程; 之后创建的 OpenMP 线程继承该绑定
+            os.sched_setaffinity(0, self.cores)
+        # 先触发本线程的惰性初始化, 否则首次并行时会被全局线程数覆盖
+        torch.get_num_threads()
+        torch.set_num_threads(len(self.cores))
+        bind(self.manager)
+
+    def call(self, fn: Callable[[], T]) -> T:
+        with self.manager.lock:
+            return fn()
+
+    def stats(self) -> dict:
+        return {
+            "index": self.index,
+            "cores": self.cores,
+            "inflight": self.inflight,
+            "served": self.served,
+        }
+
+
+class ReplicaSet(BaseModelManager):
+    """
+    同一模型的多个副本
+    模型接口只能在副本线程内调用 (通过 run_inference / run_inference_sync)
+    """
+
+    def __init__(self, managers: list[BaseModelManager], core_sets: list[list[int]]):
+        import torch
+
+        super().__init__()
+        primary = managers[0]
+        self._model_id = primary.model_id
+        self.model = primary.model
+        self.is_loaded = primary.is_loaded
+        self.load_method = primary.load_method
+        self.quantized = primary.quantized
+        self._local = threading.local()
+        self._checkout_lock = threading.Lock()
+
+        default_threads = torch.get_num_threads()
+        self.replicas = [
+            Replica(manager, i, cores, self._bind)
+            for i, (manager, cores) in enumerate(zip(managers, core_sets))
+        ]
+        # 立即启动各副本线程, 完成核心绑定后恢复本进程其他线程的默认线程数
+        for replica in self.replicas:
+            replica.executor.submit(lambda: None).result()
+        torch.set_num_threads(default_threads)
+
+    def _bind(self, manager: BaseModelManager) -> None:
+        self._local.manager = manager
+
+    def _current(self) -> BaseModelManager:
+        manager = getattr(self._local, "manager", None)
+        if manager is None:
+            raise RuntimeError(f"{self.model_id} 为多副本模型, 需通过 run_inference 在副本线程中调用")
+        return manager
+
+    @property
+    def primary(self) -> BaseModelManager:
+        return self.replicas[0].manager
+
+    @property
+    def capacity(self) -> int:
+        return len(self.replicas)
+
+    # ---------- 执行 ----------
+
+    def _checkout(self) -> Replica:
+        """选择在途最少的副本 (相同时选累计最少的, 轮流使用)"""
+        with self._checkout_lock:
+            replica = min(self.replicas, key=lambda r: (r.inflight, r.served))
+            replica.inflight += 1
+            return replica
+
+    def _checkin(self, replica: Replica) -> None:
+        with self._checkout_lock:
+            replica.inflight -= 1
+            replica.served += 1
+
+    def _submit(self, fn: Callable[[], T]) -> Future:
+        replica = self._checkout()
+        # 复制上下文, 使剖析等 ContextVar 在副本线程内可见
+        future = replica.executor.submit(contextvars.copy_context().run, replica.call, fn)
+        future.add_done_callback(lambda _: self._checkin(replica))
+        return future
+
+    def execute(self, fn: Callable[[], T]) -> T:
+        return self._submit(fn).result()
+
+    async def execute_async(self, fn: Callable[[], T]) -> T:
+        return await asyncio.wrap_future(self._submit(fn))
+
+    def replica_stats(self) -> list[dict]:
+        with self._checkout_lock:
+            return [replica.stats() for replica in self.replicas]
+
+    # ---------- 模型接口 (转发给当前副本) ----------
+
+    def load_model(self, checkpoint_path: str, **kwargs) -> None:
+        raise NotImplementedError("副本由 registry 创建")
+
+    def generate_embedding(self, image: np.ndarray) -> np.ndarray:
+        return self._current().generate_embedding(image)
+
+    def set_image(self, image: np.ndarray) -> None:
+        self._current().set_image(image)
+
+    def prepare_image(self, image: np.ndarray):
+        # 不依赖 predictor 状态, 可在任意线程调用
+        return self.primary.prepare_image(image)
+
+    def set_prepared_image(self, prepared) -> None:
+        self._current().set_prepared_image(prepared)
+
+    def predict(self, points: np.ndarray, labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return self._current().predict(points, labels)
+
+    def image_embedding(self) -> np.ndarray:
+        return self._current().image_embedding()
+
+    def image_features(self) -> dict[str, np.ndarray]:
+        return self._current().image_features()
+
+    def get_image_state(self) -> dict:
+        return self._current().get_image_state()
+
+    def restore_image_state(self, state: dict) -> None:
+        self._current().restore_image_state(state)
+
+    def segment(self, image: np.ndarray, points: np.ndarray, labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return self._current().segment(image, points, labels)
+
+    def predict_from_state(self, state: dict, points: np.ndarray, labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return self._current().predict_from_state(state, points, labels)
+
+    def generate_embeddings(self, images: list[np.ndarray]) -> np.ndarray:
+        return self._current().generate_embeddings(images)
+
+    def generate_masks(self, image: np.ndarray) -> list[dict]:
+        return self._current().generate_masks(image)
+
+    def shutdown(self) -> None:
+        """停止副本线程 (不释放共享权重)"""
+        for replica in self.replicas:
+            replica.executor.shutdown(wait=True)
+
+    def cleanup(self):
+        self.shutdown()
+        for replica in self.replicas:
+            replica.manager.cleanup()
+        super().cleanup()
+
+
+def replicate(manager: BaseModelManager, replicas: int, threads: int = 0,
+              core_sets: Optional[list[list[int]]] = None) -> ReplicaSet:
+    """基于已加载的管理器创建 ReplicaSet (共享权重)"""
+    core_sets = core_sets or plan_core_sets(replicas, threads)
+    managers = [manager] + [manager.replicate() for _ in range(len(core_sets) - 1)]
+    return ReplicaSet(managers, core_sets)
@@ -3,6 +3,9 @@
 from typing import Tuple
 import numpy as np
 from .base import BaseModelManager
+from .checkpoint import build_model_fast
+from .quantization import load_quantized_encoder
+from ..config import settings
 
 
 class SAM1Manager(BaseModelManager):
@@ -11,7 +14,14 @@ class SAM1Manager(BaseModelManager):
     使用 segment-anything 官方库
     """
 
-    def load_model(self, checkpoint_path: str, model_type: str = "vit_b", device: str = "cpu") -> None:
+    _image_state_attrs = ("features", "original_size", "input_size", "is_image_set")
+
+    def __init__(self):
+        super().__init__()
+        self._mask_generator = None
+
+    def load_model(self, checkpoint_path: str, model_type: str = "vit_b", device: str = "cpu",
+                   quantized: bool = False) -> None:
         try:
             import torch
             from segment_anything import sam_model_registry, SamPredictor
@@ -22,16 +32,29 @@ class SAM1Manager(BaseModelManager):
 
         print(f"[SAM1] 加载 {model_type} from {checkpoint_path}...")
 
-        sam = sam_model_registry[model_type](checkpoint=checkpoint_path)
+        sam = None
+        if settings.fast_checkpoint_loading:
+            try:
+                sam, self.load_method = build_model_fast(
+                    sam_model_registry[model_type], checkpoint_path
+                )
+            except (ImportError, RuntimeError) as e:
+                print(f"[SAM1] 快速加载失败, 回退到常规加载: {e}")
+
+        if sam is None:
+            sam = sam_model_registry[model_type](checkpoint=checkpoint_path)
+            self.load_method = "torch.load"
         sam.to(device)
         sam.eval()
+        if quantized:
+            self.quantized = load_quantized_encoder(sam, checkpoint_path, device, "SAM1")
 
         self.model = sam
         self.predictor = SamPredictor(sam)
         self.is_loaded = True
         self._device = device
 
-        print(f"[SAM1] ✅ {model_type} 加载完成 (device: {device})")
+        print(f"[SAM1] ✅ {model_type} 加载完成 (device: {device}, {self.load_method}{', int8' if self.quantized else ''})")
 
     def generate_embedding(self, image: np.ndarray) -> np.ndarray:
         if not self.is_loaded:
@@ -44,17 +67,82 @@ class SAM1Manager(BaseModelManager):
             embedding = self.predictor.get_image_embedding()
             return embedding.cpu().numpy()
 
-    def segment(
+    def image_embedding(self) -> np.ndarray:
+        return self.predictor.get_image_embedding().cpu().numpy()
+
+    def generate_embeddings(self, images: list[np.ndarray]) -> np.ndarray:
+        if not self.is_loaded:
+            raise RuntimeError("模型未加载")
+
+        import torch
+
+        with torch.no_grad():
+            batch = []
+            for image in images:
+                # 与 SamPredictor.set_image 相同: 长边缩放到 1024, 归一化并 pad
+                resized = self.predictor.transform.apply_image(image)
+                tensor = torch.as_tensor(resized, device=self.predictor.device)
+                batch.append(self.model.preprocess(tensor.permute(2, 0, 1).contiguous()))
+            return self.model.image_encoder(torch.stack(batch)).cpu().numpy()
+
+    def generate_masks(self, image: np.ndarray) -> list[dict]:
+        if not self.is_loaded:
+            raise RuntimeError("模型未加载")
+
+        if self._mask_generator is None:
+            from segment_anything import SamAutomaticMaskGenerator
+            self._mask_generator = SamAutomaticMaskGenerator(self.model)
+
+        return self._mask_generator.generate(image)
+
+    def set_image(self, image: np.ndarray) -> None:
+        if not self.is_loaded:
+            raise RuntimeError("模型未加载")
+
+        self.predictor.set_image(image)
+
+    def prepare_image(self, image: np.ndarray):
+        """
+        与 SamPredictor.set_image + Sam.preprocess 相同 (CPU):
+        长边缩放到 1024, 按 pixel_mean/pixel_std 归一化, 右下补零到 1024x1024
+        """
+        import torch
+        import torch.nn.functional as F
+
+        model = self.predictor.model
+        resized = self.predictor.transform.apply_image(image)
+        tensor = torch.as_tensor(resized).permute(2, 0, 1).contiguous()[None, :, :, :]
+        input_size = tuple(tensor.shape[-2:])
+
+        normalized = (tensor - model.pixel_mean.cpu()) / model.pixel_std.cpu()
+        size = model.image_encoder.img_size
+        padded = F.pad(normalized, (0, size - input_size[1], 0, size - input_size[0]))
+        return padded, input_size, image.shape[:2]
+
+    def set_prepared_image(self, prepared) -> None:
+        """等价于 SamPredictor.set_torch_image, 但输入已归一化/补齐, 锁内只跑编码器"""
+        import torch
+
+        if not self.is_loaded:
+            raise RuntimeError("模型未加载")
+
+        input_image, input_size, original_size = prepared
+        model = self.predictor.model
+        self.predictor.reset_image()
+        self.predictor.original_size = original_size
+        self.predictor.input_size = input_size
+        with torch.no_grad():
+            self.predictor.features = model.image_encoder(input_image.to(self.predictor.device))
+        self.predictor.is_image_set = True
+
+    def predict(
         self,
-        image: np.ndarray,
         points: np.ndarray,
         labels: np.ndarray,
     ) -> Tuple[np.ndarray, np.ndarray]:
         if not self.is_loaded:
             raise RuntimeError("模型未加载")
 
-        self.predictor.set_image(image)
-
         masks, scores, _ = self.predictor.predict(
             point_coords=points,
             point_labels=labels,
@@ -62,3 +150,7 @@ class SAM1Manager(BaseModelManager):
         )
 
         return masks, scores
+
+    def cleanup(self):
+        super().cleanup()
+        self._mask_generator = None
@@ -1,20 +1,37 @@
 """SAM2 模型管理器"""
 
-from typing import Tuple
+import copy
+import os
+import tempfile
+import threading
+from typing import Iterator, Optional, Tuple
 import numpy as np
 from .base import BaseModelManager
+from .quantization import load_quantized_encoder
 
 
 class SAM2Manager(BaseModelManager):
     """
     SAM2 模型管理器
     使用 sam2 官方库
+    模型按视频预测器 (SAM2VideoPredictor, SAM2Base 的子类) 构建,
+    图片预测器与视频传播共用同一份权重
     """
 
-    def load_model(self, checkpoint_path: str, config: str = "sam2_hiera_t.yaml", device: str = "cpu") -> None:
+    _image_state_attrs = ("_features", "_orig_hw", "_is_image_set", "_is_batch")
+
+    def __init__(self):
+        super().__init__()
+        self.video_predictor = None
+        self._mask_generator = None
+        self._state_template: Optional[dict] = None
+        self._template_lock = threading.Lock()
+
+    def load_model(self, checkpoint_path: str, config: str = "sam2_hiera_t.yaml", device: str = "cpu",
+                   quantized: bool = False) -> None:
         try:
             import torch
-            from sam2.build_sam import build_sam2
+            from sam2.build_sam import build_sam2_video_predictor
             from sam2.sam2_image_predictor import SAM2ImagePredictor
         except ImportError:
             raise ImportError(
@@ -23,12 +40,16 @@ class SAM2Manager(BaseModelManager):
 
         print(f"[SAM2] 加载 {config} from {checkpoint_path}...")
 
-        sam2 = build_sam2(config, checkpoint_path, device=device)
+        # 视频预测器只多出视频相关的后处理配置, 图片预测器可直接使用
+        sam2 = build_sam2_video_predictor(config, checkpoint_path, device=device)
+        if quantized:
+            self.quantized = load_quantized_encoder(sam2, checkpoint_path, device, "SAM2")
         self.model = sam2
         self.predictor = SAM2ImagePredictor(sam2)
+        self.video_predictor = sam2
         self.is_loaded = True
 
-        print(f"[SAM2] ✅ 加载完成 (device: {device})")
+        print(f"[SAM2] ✅ 加载完成 (device: {device}{', int8' if self.quantized else ''})")
 
     def generate_embedding(self, image: np.ndarray) -> np.ndarray:
         if not self.is_loaded:
@@ -42,17 +63,81 @@ class SAM2Manager(BaseModelManager):
             embedding = self.predictor._features["image_embed"]
             return embedding.cpu().numpy()
 
-    def segment(
+    def image_embedding(self) -> np.ndarray:
+        return self.predictor._features["image_embed"].cpu().numpy()
+
+    def image_features(self) -> dict[str, np.ndarray]:
+        """SAM2 Decoder 还需要两级高分辨率特征 (已经过 conv_s0 / conv_s1)"""
+        high_res_feats = self.predictor._features["high_res_feats"]
+        return {
+            "image_embed": self.image_embedding(),
+            "high_res_feats_0": high_res_feats[0].cpu().numpy(),
+            "high_res_feats_1": high_res_feats[1].cpu().numpy(),
+        }
+
+    def generate_embeddings(self, images: list[np.ndarray]) -> np.ndarray:
+        if not self.is_loaded:
+            raise RuntimeError("模型未加载")
+
+        import torch
+
+        with torch.no_grad():
+            self.predictor.set_image_batch(images)
+            embedding = self.predictor._features["image_embed"]
+            return embedding.cpu().numpy()
+
+    def generate_masks(self, image: np.ndarray) -> list[dict]:
+        if not self.is_loaded:
+            raise RuntimeError("模型未加载")
+
+        if self._mask_generator is None:
+            from sam2.automatic_mask_generator import SAM2AutomaticMaskGenerator
+            self._mask_generator = SAM2AutomaticMaskGenerator(self.model)
+
+        return self._mask_generator.generate(image)
+
+    def set_image(self, image: np.ndarray) -> None:
+        if not self.is_loaded:
+            raise RuntimeError("模型未加载")
+
+        self.predictor.set_image(image)
+
+    def prepare_image(self, image: np.ndarray):
+        """与 SAM2ImagePredictor.set_image 相同: predictor._transforms (ToTensor/缩放/归一化) 转为 1x3xHxW (CPU)"""
+        return self.predictor._transforms(image)[None, ...], image.shape[:2]
+
+    def set_prepared_image(self, prepared) -> None:
+        """等价于 SAM2ImagePredictor.set_image 中 _transforms 之后的部分, 锁内只跑编码器"""
+        import torch
+
+        if not self.is_loaded:
+            raise RuntimeError("模型未加载")
+
+        input_image, original_size = prepared
+        predictor = self.predictor
+        model = predictor.model
+        predictor.reset_predictor()
+        predictor._orig_hw = [original_size]
+        with torch.no_grad():
+            backbone_out = model.forward_image(input_image.to(predictor.device))
+            _, vision_feats, _, _ = model._prepare_backbone_features(backbone_out)
+            if model.directly_add_no_mem_embed:
+                vision_feats[-1] = vision_feats[-1] + model.no_mem_embed
+            feats = [
+                feat.permute(1, 2, 0).view(1, -1, *feat_size)
+                for feat, feat_size in zip(vision_feats[::-1], predictor._bb_feat_sizes[::-1])
+            ][::-1]
+        predictor._features = {"image_embed": feats[-1], "high_res_feats": feats[:-1]}
+        predictor._is_image_set = True
+
+    def predict(
         self,
-        image: np.ndarray,
         points: np.ndarray,
         labels: np.ndarray,
     ) -> Tuple[np.ndarray, np.ndarray]:
         if not self.is_loaded:
             raise RuntimeError("模型未加载")
 
-        self.predictor.set_image(image)
-
         masks, scores, _ = self.predictor.predict(
             point_coords=points,
             point_labels=labels,
@@ -60,3 +145,156 @@ class SAM2Manager(BaseModelManager):
         )
 
         return masks, scores
+
+    # ---------- 视频传播 ----------
+
+    def get_video_predictor(self):
+        """视频预测器 (即模型本身)"""
+        if not self.is_loaded:
+            raise RuntimeError("模型未加载")
+        return self.video_predictor
+
+    def init_video_state(self, frame_source, max_cached_frames: int = 32) -> dict:
+        """
+        基于惰性帧存储初始化视频推理状态
+        帧只在 SAM2 访问时解码, 最多缓存 max_cached_frames 帧
+        """
+        from ..core.video_loader import LazyFrameStore
+
+        predictor = self.get_video_predictor()
+        store = LazyFrameStore(
+            frame_source,
+            transform=self._video_frame_transform(predictor.image_size),
+            max_frames=max_cached_frames,
+        )
+
+        # 与 init_state 相同的状态, 帧换成惰性帧存储 (不经过 load_video_frames 一次性解码整个视频)
+        state = copy.deepcopy(self._video_state_template(predictor))
+        height, width = store.source.size
+        state.update(images=store, num_frames=len(store), video_height=height, video_width=width)
+        return state
+
+    def _video_state_template(self, predictor) -> dict:
+        """
+        init_state 在只有 1 帧的临时视频上生成的状态 (去掉帧与图像特征), 首次使用时构建
+        状态的键随 sam2 版本变化, 由 init_state 自己生成而不是在这里手写
+        """
+        with self._template_lock:
+            if self._state_template is None:
+                from PIL import Image
+
+                with tempfile.TemporaryDirectory() as frames_dir:
+                    Image.new("RGB", (64, 64)).save(os.path.join(frames_dir, "0.jpg"))
+                    state = predictor.init_state(video_path=frames_dir, offload_video_to_cpu=True)
+                state["images"] = None
+                state["cached_features"] = {}
+                self._state_template = state
+        return self._state_template
+
+    def add_video_prompt(
+        self,
+        state: dict,
+        frame_idx: int,
+        obj_id: int,
+        points: Optional[np.ndarray] = None,
+        labels: Optional[np.ndarray] = None,
+        box: Optional[np.ndarray] = None,
+    ) -> None:
+        """在关键帧上为某个目标添加点击/框提示"""
+        import torch
+
+        predictor = self.get_video_predictor()
+        # 新版本为 add_new_points_or_box, 旧版本为 add_new_points
+        add_fn = getattr(predictor, "add_new_points_or_box", None) or predictor.add_new_points
+        kwargs = {}
+        if box is not None:
+            kwargs["box"] = box
+
+        with torch.inference_mode():
+            add_fn(
+                inference_state=state,
+                frame_idx=frame_idx,
+                obj_id=obj_id,
+                points=points,
+                labels=labels,
+                **kwargs,
+            )
+
+    def propagate_video(
+        self,
+        state: dict,
+        direction: str = "both",
+    ) -> Iterator[Tuple[int, list[int], np.ndarray]]:
+        """
+        利用 SAM2 记忆库向前/向后传播 mask
+        逐帧产出: (frame_idx, obj_ids, masks [num_obj, H, W] bool)
+        """
+        import torch
+
+        predictor = self.get_video_predictor()
+        passes = {"forward": [False], "backward": [True], "both": [False, True]}[direction]
+        emitted: set[int] = set()
+
+        with torch.inference_mode():
+            for reverse in passes:
+                for frame_idx, obj_ids, mask_logits in predictor.propagate_in_video(
+                    state, reverse=reverse
+                ):
+                    self._prune_video_state(state, frame_idx)
+                    if frame_idx in emitted:
+                        continue
+                    emitted.add(frame_idx)
+
+                    # 在设备上阈值化, 只把二值 mask 拷回主机
+                    masks = (mask_logits[:, 0] > 0.0).cpu().numpy()
+                    yield frame_idx, list(obj_ids), masks
+
+    def _prune_video_state(self, state: dict, frame_idx: int) -> None:
+        """
+        丢弃记忆窗口之外的非条件帧输出, 控制长视频的内存占用
+        条件帧 (用户提示帧) 始终保留
+        """
+        model = self.video_predictor
+        stride = getattr(model, "memory_temporal_stride_for_eval", 1)
+        window = max(
+            getattr(model, "num_maskmem", 7) * stride,
+            getattr(model, "max_obj_ptrs_in_encoder", 16),
+        ) + 1
+
+        output_dicts = list(state.get("output_dict_per_obj", {}).values())
+        if "output_dict" in state:
+            output_dicts.append(state["output_dict"])
+
+        for output_dict in output_dicts:
+            non_cond = output_dict.get("non_cond_frame_outputs", {})
+            for idx in [i for i in non_cond if abs(i - frame_idx) > window]:
+                del non_cond[idx]
+
+    def reset_video_state(self, state: dict) -> None:
+        """释放视频推理状态占用的帧缓存"""
+        images = state.get("images")
+        if hasattr(images, "close"):
+            images.close()
+        state.clear()
+
+    @staticmethod
+    def _video_frame_transform(image_size: int):
+        """与 sam2.utils.misc.load_video_frames 一致的预处理: PIL resize (BICUBIC) + 归一化"""
+        import torch
+        from PIL import Image
+
+        mean = torch.tensor([0.485, 0.456, 0.406]).view(3, 1, 1)
+        std = torch.tensor([0.229, 0.224, 0.225]).view(3, 1, 1)
+
+        def transform(frame: np.ndarray):
+            resized = np.array(Image.fromarray(frame).resize((image_size, image_size), Image.BICUBIC))
+            tensor = torch.from_numpy(resized).permute(2, 0, 1).float() / 255.0
+            return (tensor - mean) / std
+
+        return transform
+
+    def cleanup(self):
+        super().cleanup()
+        self.video_predictor = None
+        self._mask_generator = None
+        self._state_template = None
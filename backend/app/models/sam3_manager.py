@@ -14,6 +14,7 @@ class SAM3Manager(BaseModelManager):
     def __init__(self):
         super().__init__()
         self.processor = None
+        self._image_state = None
 
     def load_model(self, checkpoint_path: str = "", device: str = "cpu") -> None:
         try:
@@ -43,24 +44,33 @@ class SAM3Manager(BaseModelManager):
             "SAM3 不支持独立的 Embedding 导出 (Detector 架构无法拆分)"
         )
 
-    def segment(
+    def image_embedding(self) -> np.ndarray:
+        raise NotImplementedError(
+            "SAM3 不支持独立的 Embedding 导出 (Detector 架构无法拆分)"
+        )
+
+    def set_image(self, image: np.ndarray) -> None:
+        if not self.is_loaded:
+            raise RuntimeError("模型未加载")
+
+        from PIL import Image
+
+        self._image_state = self.processor.set_image(Image.fromarray(image))
+
+    def predict(
         self,
-        image: np.ndarray,
         points: np.ndarray,
         labels: np.ndarray,
     ) -> Tuple[np.ndarray, np.ndarray]:
         """点击分割 (使用 visual prompt)"""
         if not self.is_loaded:
             raise RuntimeError("模型未加载")
+        if self._image_state is None:
+            raise RuntimeError("请先调用 set_image")
 
-        from PIL import Image
-
-        pil_image = Image.fromarray(image)
-        state = self.processor.set_image(pil_image)
-
-        # SAM3 visual prompt
+        # SAM3 visual prompt (在副本上添加提示, 图片编码状态可重复使用)
         state = self.processor.set_visual_prompt(
-            state=state,
+            state=dict(self._image_state),
             points=points.tolist(),
             labels=[bool(l) for l in labels],
         )
@@ -70,15 +80,16 @@ class SAM3Manager(BaseModelManager):
 
         return masks, scores
 
-    def segment_text(
-        self,
-        image: np.ndarray,
-        prompt: str,
-        confidence: float = 0.5,
-    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    def get_image_state(self) -> dict:
+        return {"image_state": self._image_state}
+
+    def restore_image_state(self, state: dict) -> None:
+        self._image_state = state["image_state"]
+
+    def _text_prompt(self, image: np.ndarray, prompt: str, confidence: float):
         """
-        文本提示分割 (SAM3 独有)
-        返回: (masks [N,H,W], scores [N], boxes [N,4])
+        运行文本提示并在设备上过滤、二值化
+        返回: (masks [N,H,W] 设备上的 bool 张量, scores [N], boxes [N,4] xyxy)
         """
         if not self.is_loaded:
             raise RuntimeError("模型未加载")
@@ -95,12 +106,56 @@ class SAM3Manager(BaseModelManager):
 
         # 过滤低置信度
         high_conf = scores > confidence
-        masks = masks[high_conf].cpu().numpy()
-        scores = scores[high_conf].cpu().numpy()
-        boxes = boxes[high_conf].cpu().numpy()
+        masks = masks[high_conf]
+        if masks.ndim == 4:
+            masks = masks[:, 0]
+        # 在设备上二值化, 避免把整帧 float mask 拷回主机
+        if masks.dtype.is_floating_point:
+            masks = masks > 0.5
+
+        return masks, scores[high_conf].cpu().numpy(), boxes[high_conf].cpu().numpy()
+
+    def segment_text(
+        self,
+        image: np.ndarray,
+        prompt: str,
+        confidence: float = 0.5,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        文本提示分割 (SAM3 独有)
+        返回: (masks [N,H,W], scores [N], boxes [N,4])
+        """
+        masks, scores, boxes = self._text_prompt(image, prompt, confidence)
+        return masks.cpu().numpy(), scores, boxes
+
+    def segment_text_cropped(
+        self,
+        image: np.ndarray,
+        prompt: str,
+        confidence: float = 0.5,
+        padding: int = 0,
+    ) -> Tuple[list[np.ndarray], np.ndarray, np.ndarray, np.ndarray]:
+        """
+        文本提示分割, 每个 mask 裁剪到其检测框 (外扩 padding 像素)
+        只有裁剪区域会拷回主机
+        返回: (masks [h_i,w_i] 列表, offsets [N,2] 裁剪左上角 (x, y), scores [N], boxes [N,4])
+        """
+        masks, scores, boxes = self._text_prompt(image, prompt, confidence)
+        height, width = image.shape[:2]
+
+        crops = []
+        offsets = np.zeros((len(boxes), 2), dtype=np.int64)
+        for i, (x0, y0, x1, y1) in enumerate(boxes):
+            left = min(max(int(np.floor(x0)) - padding, 0), width - 1)
+            top = min(max(int(np.floor(y0)) - padding, 0), height - 1)
+            right = max(min(int(np.ceil(x1)) + padding, width), left + 1)
+            bottom = max(min(int(np.ceil(y1)) + padding, height), top + 1)
+            crops.append(masks[i, top:bottom, left:right].cpu().numpy())
+            offsets[i] = (left, top)
 
-        return masks, scores, boxes
+        return crops, offsets, scores, boxes
 
     def cleanup(self):
         super().cleanup()
         self.processor = None
+        self._image_state = None
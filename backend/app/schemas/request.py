@@ -1,5 +1,6 @@
 """请求模型定义"""
 
+from typing import Optional
 from pydantic import BaseModel
 
 
@@ -16,10 +17,33 @@ class SegmentRequest(BaseModel):
     model: str = "sam1_vit_b"
 
 
+class CascadeSegmentRequest(BaseModel):
+    """级联分割请求: 快速模型先出结果, 高质量模型再细化"""
+    image_url: str
+    points: list[PointInput]
+    fast_model: str = "sam1_vit_b"
+    model: str = "sam1_vit_h"
+    # 快速结果的预测 IoU 不低于该值时跳过细化, 为空使用服务端配置
+    skip_threshold: Optional[float] = None
+
+
+class CompareSegmentRequest(BaseModel):
+    """多模型对比分割: 同一图片与点击在多个模型上并行执行"""
+    image_url: str
+    points: list[PointInput]
+    models: list[str]
+
+
+EMBEDDING_FORMATS = ("float32", "int8")
+
+
 class EmbeddingRequest(BaseModel):
     """混合模式 - Embedding 请求"""
     image_url: str
     model: str = "sam1_vit_b"
+    # float32: 只返回 image embedding (float32 gzip)
+    # int8: 返回前端 Decoder 所需的全部特征 (SAM2 含高分辨率特征), 按通道量化为 int8
+    format: str = "float32"
 
 
 class TextSegmentRequest(BaseModel):
@@ -27,3 +51,59 @@ class TextSegmentRequest(BaseModel):
     image_url: str
     prompt: str
     confidence: float = 0.5
+    # 每个 mask 裁剪到检测框 (外扩 crop_padding 像素) 后再编码, 返回裁剪偏移
+    crop: bool = False
+    crop_padding: int = 0
+
+
+class BatchSegmentRequest(BaseModel):
+    """批量点击分割 (同一张图片多组提示, 异步任务)"""
+    image_url: str
+    prompts: list[list[PointInput]]
+    model: str = "sam1_vit_b"
+
+
+class AutoMaskRequest(BaseModel):
+    """全图自动分割 (异步任务)"""
+    image_url: str
+    model: str = "sam1_vit_b"
+
+
+class JobSubmitRequest(BaseModel):
+    """提交异步任务
+
+    type: segment_batch / auto_mask / text_segment / embedding
+    payload: 对应的请求体 (BatchSegmentRequest / AutoMaskRequest / TextSegmentRequest / EmbeddingRequest)
+    """
+    type: str
+    payload: dict
+
+
+class VideoPrompt(BaseModel):
+    """视频关键帧提示"""
+    frame_idx: int
+    obj_id: int = 1
+    points: list[PointInput] = []
+    box: Optional[list[float]] = None  # [x0, y0, x1, y1]
+
+
+class VideoSegmentRequest(BaseModel):
+    """SAM2 视频传播请求 (上传视频时 frame_urls 留空)"""
+    prompts: list[VideoPrompt]
+    frame_urls: list[str] = []
+    model: str = "sam2_tiny"
+    direction: str = "both"  # forward / backward / both
+
+
+class ProfileRequest(BaseModel):
+    """开启性能剖析会话: 采集接下来 requests 个匹配的请求"""
+    endpoint: Optional[str] = None  # 如 /api/segment, 为空匹配所有端点
+    model: Optional[str] = None  # 为空匹配所有模型
+    requests: int = 5
+    torch_trace: bool = True  # 采集 PyTorch profiler 算子 trace
+    sample_interval_ms: float = 5.0  # Python 栈采样间隔, 0 关闭
+
+
+class TrafficRecordRequest(BaseModel):
+    """开始流量录制"""
+    record_images: Optional[bool] = None  # 保存原始图片, 为空时使用配置 traffic_record_images
@@ -1,5 +1,6 @@
 """响应模型定义"""
 
+from typing import Optional
 from pydantic import BaseModel
 
 
@@ -9,6 +10,12 @@ class ModelInfo(BaseModel):
     family: str
     checkpoint: str
     is_loaded: bool
+    quantized: bool = False  # int8 动态量化编码器
+    load_method: Optional[str] = None  # safetensors / mmap / torch.load
+    load_time_ms: Optional[float] = None
+    peak_rss_mb: Optional[float] = None  # 加载期间进程峰值内存
+    load_peak_delta_mb: Optional[float] = None  # 加载引起的峰值内存增量
+    replicas: Optional[int] = None  # 多副本模型的副本数
 
 
 class SegmentResponse(BaseModel):
@@ -20,13 +27,23 @@ class SegmentResponse(BaseModel):
     model: str
 
 
+class FeatureTensor(BaseModel):
+    """int8 特征包中单个张量的位置与反量化参数"""
+    name: str  # 对应 ONNX Decoder 的输入名
+    shape: list[int]
+    offset: int  # 在解压后数据中的字节偏移
+    scales: list[float]  # 各通道缩放系数: value = int8 * scales[channel]
+
+
 class EmbeddingResponse(BaseModel):
     """Embedding 结果"""
-    embedding: str  # base64(gzip(float32))
-    shape: list[int]
+    embedding: str  # float32: base64(gzip(float32)); int8: base64(gzip(各张量 int8 依次拼接))
+    shape: list[int]  # image embedding 的形状
     original_size: list[int]
     compressed_size: int
     model: str
+    format: str = "float32"
+    tensors: Optional[list[FeatureTensor]] = None  # int8 格式的张量清单
 
 
 class TextSegmentResponse(BaseModel):
@@ -36,3 +53,19 @@ class TextSegmentResponse(BaseModel):
     boxes: list[list[float]]
     count: int
     time_ms: float
+    # crop 模式: 每个 mask 的尺寸 [h, w] 与裁剪左上角在原图中的位置 [x, y]
+    mask_sizes: Optional[list[list[int]]] = None
+    offsets: Optional[list[list[int]]] = None
+
+
+class JobInfo(BaseModel):
+    """异步任务状态"""
+    id: str
+    type: str
+    status: str  # pending / running / completed / failed / cancelled
+    progress: float
+    message: str
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+    cached: bool = False  # 是否复用了已有的相同任务
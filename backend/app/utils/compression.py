@@ -32,3 +32,70 @@ def decompress_embedding(encoded: str, shape: tuple) -> np.ndarray:
     compressed = base64.b64decode(encoded)
     raw_bytes = gzip.decompress(compressed)
     return np.frombuffer(raw_bytes, dtype=np.float32).reshape(shape)
+
+
+class FeatureBundle:
+    """多张量压缩结果: 拼接后的压缩数据 + 各张量的 manifest"""
+    def __init__(self, encoded: str, tensors: list[dict], raw_size: int, compressed_size: int):
+        self.encoded = encoded
+        self.tensors = tensors
+        self.raw_size = raw_size
+        self.compressed_size = compressed_size
+        self.ratio = compressed_size / raw_size if raw_size > 0 else 0
+
+
+def quantize_per_channel(tensor: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """按通道 (第 1 维) 对称量化为 int8, 返回 (int8 数据, 各通道缩放系数)"""
+    tensor = tensor.astype(np.float32)
+    channels = tensor.shape[1]
+    per_channel = np.moveaxis(tensor, 1, 0).reshape(channels, -1)
+    scales = np.abs(per_channel).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    shape = [1, channels] + [1] * (tensor.ndim - 2)
+    quantized = np.clip(np.rint(tensor / scales.reshape(shape)), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def compress_features(features: dict[str, np.ndarray]) -> FeatureBundle:
+    """
+    将解码器所需的多个特征张量压缩为一个 base64 字符串
+    每个张量按通道量化为 int8 后依次拼接, 整体 gzip;
+    manifest 记录名称、形状、在解压数据中的偏移和缩放系数: value = int8 * scales[channel]
+    """
+    chunks = []
+    tensors = []
+    offset = 0
+    raw_size = 0
+    for name, tensor in features.items():
+        quantized, scales = quantize_per_channel(tensor)
+        data = quantized.tobytes()
+        tensors.append({
+            "name": name,
+            "shape": list(tensor.shape),
+            "offset": offset,
+            "scales": scales.tolist(),
+        })
+        chunks.append(data)
+        offset += len(data)
+        raw_size += tensor.size * 4
+
+    compressed = gzip.compress(b"".join(chunks), compresslevel=6)
+    return FeatureBundle(
+        encoded=base64.b64encode(compressed).decode("utf-8"),
+        tensors=tensors,
+        raw_size=raw_size,
+        compressed_size=len(compressed),
+    )
+
+
+def decompress_features(encoded: str, tensors: list[dict]) -> dict[str, np.ndarray]:
+    """compress_features 的逆过程 (float32)"""
+    data = gzip.decompress(base64.b64decode(encoded))
+    features = {}
+    for info in tensors:
+        shape = info["shape"]
+        size = int(np.prod(shape))
+        quantized = np.frombuffer(data, dtype=np.int8, count=size, offset=info["offset"]).reshape(shape)
+        scales = np.array(info["scales"], dtype=np.float32).reshape([1, shape[1]] + [1] * (len(shape) - 2))
+        features[info["name"]] = quantized.astype(np.float32) * scales
+    return features
@@ -0,0 +1,25 @@
+"""哈希工具"""
+
+import hashlib
+import json
+
+import numpy as np
+
+
+def hash_bytes(data: bytes) -> str:
+    """内容哈希 (blake2b, 128 bit)"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def hash_image(image: np.ndarray) -> str:
+    """解码后图片的内容哈希 (同一张图片无论以何种 URL 传入都得到相同结果)"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(image.shape).encode("ascii"))
+    h.update(np.ascontiguousarray(image).data)
+    return h.hexdigest()
+
+
+def hash_json(obj) -> str:
+    """规范化 JSON (键排序) 的哈希"""
+    data = json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hash_bytes(data.encode("utf-8"))
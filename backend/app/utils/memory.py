@@ -0,0 +1,69 @@
+"""内存统计工具"""
+
+import os
+import resource
+import sys
+import threading
+import time
+
+
+def current_rss_mb() -> float:
+    """当前进程常驻内存 (MB); 非 Linux 平台退回到历史峰值"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return max_rss_mb()
+
+
+def max_rss_mb() -> float:
+    """进程历史峰值常驻内存 (MB)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB, macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class PeakRSSMonitor:
+    """
+    采样线程记录一段代码执行期间的峰值 RSS
+    with PeakRSSMonitor() as m: ...; m.peak_mb / m.delta_mb / m.elapsed_ms
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.start_mb = 0.0
+        self.peak_mb = 0.0
+        self.end_mb = 0.0
+        self.elapsed_ms = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self) -> None:
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "PeakRSSMonitor":
+        self.start_mb = self.peak_mb = current_rss_mb()
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.elapsed_ms = (time.perf_counter() - self._start) * 1000
+        self.end_mb = current_rss_mb()
+        self.peak_mb = max(self.peak_mb, self.end_mb)
+
+    @property
+    def delta_mb(self) -> float:
+        """加载后常驻内存的增量"""
+        return self.end_mb - self.start_mb
+
+    @property
+    def peak_delta_mb(self) -> float:
+        """加载期间相对起点的峰值增量"""
+        return self.peak_mb - self.start_mb
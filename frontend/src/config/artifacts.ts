@@ -0,0 +1,88 @@
+/**
+ * 模型文件 (ONNX) 下载
+ *
+ * 后端 /api/artifacts/manifest 列出每个文件的内容哈希 URL 与分块:
+ *  - 分块 URL 不可变, 下载后存入 Cache Storage, 再次打开页面无需重新下载
+ *  - 下载中断时已完成的分块保留, 下次只下载缺失的分块
+ * manifest 不可用 (未发布或纯静态部署) 时退回原静态路径
+ */
+
+const API_BASE_URL = import.meta.env.VITE_API_URL || ''
+const CACHE_NAME = 'segmentx-artifacts'
+const MAX_PARALLEL = 4
+
+interface ArtifactChunk {
+  url: string
+  size: number
+  sha256: string
+}
+
+interface ArtifactEntry {
+  name: string
+  size: number
+  url: string
+  chunks: ArtifactChunk[]
+}
+
+interface ArtifactManifest {
+  version: number
+  artifacts: Record<string, ArtifactEntry>
+}
+
+let manifestPromise: Promise<ArtifactManifest | null> | null = null
+
+function loadManifest(): Promise<ArtifactManifest | null> {
+  if (!manifestPromise) {
+    manifestPromise = fetch(`${API_BASE_URL}/api/artifacts/manifest`)
+      .then((resp) => (resp.ok ? (resp.json() as Promise<ArtifactManifest>) : null))
+      .catch(() => null)
+  }
+  return manifestPromise
+}
+
+async function fetchChunk(cache: Cache | null, url: string): Promise<ArrayBuffer> {
+  const fullUrl = `${API_BASE_URL}${url}`
+  const cached = await cache?.match(fullUrl)
+  if (cached) return cached.arrayBuffer()
+
+  const resp = await fetch(fullUrl)
+  if (!resp.ok) throw new Error(`模型分块下载失败: ${url} (HTTP ${resp.status})`)
+  if (cache) await cache.put(fullUrl, resp.clone())
+  return resp.arrayBuffer()
+}
+
+/**
+ * 解析模型来源: 已发布时返回分块下载拼接后的字节, 否则返回原路径
+ */
+export async function resolveModelSource(
+  path: string,
+  onProgress?: (loaded: number, total: number) => void,
+): Promise<string | Uint8Array> {
+  const name = path.split('/').pop() ?? path
+  const entry = (await loadManifest())?.artifacts[name]
+  if (!entry) return path
+
+  const cache = 'caches' in globalThis ? await caches.open(CACHE_NAME) : null
+  const buffer = new Uint8Array(entry.size)
+  const offsets: number[] = []
+  let offset = 0
+  for (const chunk of entry.chunks) {
+    offsets.push(offset)
+    offset += chunk.size
+  }
+
+  let next = 0
+  let loaded = 0
+  const worker = async () => {
+    while (next < entry.chunks.length) {
+      const index = next++
+      const data = await fetchChunk(cache, entry.chunks[index]!.url)
+      buffer.set(new Uint8Array(data), offsets[index])
+      loaded += data.byteLength
+      onProgress?.(loaded, entry.size)
+    }
+  }
+  await Promise.all(Array.from({ length: Math.min(MAX_PARALLEL, entry.chunks.length) }, worker))
+
+  return buffer
+}
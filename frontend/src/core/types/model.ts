@@ -32,6 +32,8 @@ export interface ModelConfig {
   onnxPaths?: {
     encoder?: string
     decoder?: string
+    /** 混合模式的 Decoder (需与后端 Encoder 的 checkpoint 一致), 默认 SAM1 Decoder */
+    hybridDecoder?: string
   }
 }
 
@@ -88,6 +90,7 @@ export const MODEL_REGISTRY: Record<string, ModelConfig> = {
     onnxPaths: {
       encoder: '/models/sam2_encoder_tiny.onnx',
       decoder: '/models/sam2_decoder.onnx',
+      hybridDecoder: '/models/sam2_decoder_tiny.onnx',
     },
   },
   sam2_small: {
@@ -102,6 +105,7 @@ export const MODEL_REGISTRY: Record<string, ModelConfig> = {
     onnxPaths: {
       encoder: '/models/sam2_encoder_small.onnx',
       decoder: '/models/sam2_decoder.onnx',
+      hybridDecoder: '/models/sam2_decoder_small.onnx',
     },
   },
   sam2_base_plus: {
@@ -116,6 +120,7 @@ export const MODEL_REGISTRY: Record<string, ModelConfig> = {
     onnxPaths: {
       encoder: '/models/sam2_encoder_base_plus.onnx',
       decoder: '/models/sam2_decoder.onnx',
+      hybridDecoder: '/models/sam2_decoder_base_plus.onnx',
     },
   },
   sam2_large: {
@@ -127,6 +132,9 @@ export const MODEL_REGISTRY: Record<string, ModelConfig> = {
     supportedModes: ['backend', 'hybrid'],
     hasONNX: false,
     features: ['点击分割', '边界框', '视频分割'],
+    onnxPaths: {
+      hybridDecoder: '/models/sam2_decoder_large.onnx',
+    },
   },
 
   // SAM-HQ 系列
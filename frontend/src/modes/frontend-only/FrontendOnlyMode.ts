@@ -2,6 +2,7 @@ import { BaseMode } from '@/modes/base/BaseMode'
 import type { ModeInfo, Point, MaskResult } from '@/core/types'
 import { MODE_INFO, MODEL_REGISTRY } from '@/core/types'
 import * as ort from 'onnxruntime-web'
+import { resolveModelSource } from '@/config/artifacts'
 
 /**
  * 纯前端模式
@@ -38,9 +39,15 @@ export class FrontendOnlyMode extends BaseMode {
     console.log(`[纯前端]   Encoder: ${model.onnxPaths.encoder}`)
     console.log(`[纯前端]   Decoder: ${model.onnxPaths.decoder}`)
 
-    // 先检查模型文件是否存在
-    await this.checkModelFile(model.onnxPaths.encoder, 'Encoder')
-    await this.checkModelFile(model.onnxPaths.decoder, 'Decoder')
+    // 优先从后端按分块下载 (可缓存/续传), 未发布时使用静态文件
+    const encoderSource = await resolveModelSource(model.onnxPaths.encoder, (loaded, total) => {
+      console.log(`[纯前端] Encoder 下载 ${(loaded / 1048576).toFixed(0)}/${(total / 1048576).toFixed(0)}MB`)
+    })
+    const decoderSource = await resolveModelSource(model.onnxPaths.decoder)
+
+    // 静态文件: 先检查模型文件是否存在
+    if (typeof encoderSource === 'string') await this.checkModelFile(encoderSource, 'Encoder')
+    if (typeof decoderSource === 'string') await this.checkModelFile(decoderSource, 'Decoder')
 
     // 设置 WASM — 使用 CDN 避免 Vite 的 import.meta.url 解析问题
     ort.env.wasm.wasmPaths = 'https://cdn.jsdelivr.net/npm/onnxruntime-web@1.24.1/dist/'
@@ -55,18 +62,12 @@ export class FrontendOnlyMode extends BaseMode {
 
     // 加载 Encoder (大模型, ~95MB, 可能需要几秒)
     console.log(`[纯前端] ⏳ 加载 Encoder (~95MB, 请稍候)...`)
-    this.encoderSession = await ort.InferenceSession.create(
-      model.onnxPaths.encoder,
-      options,
-    )
+    this.encoderSession = await this.createSession(encoderSource, options)
     console.log(`[纯前端] ✅ Encoder 加载完成 (${(performance.now() - startTime).toFixed(0)}ms)`)
 
     // 加载 Decoder (小模型, ~16MB)
     const decoderStart = performance.now()
-    this.decoderSession = await ort.InferenceSession.create(
-      model.onnxPaths.decoder,
-      options,
-    )
+    this.decoderSession = await this.createSession(decoderSource, options)
     console.log(`[纯前端] ✅ Decoder 加载完成 (${(performance.now() - decoderStart).toFixed(0)}ms)`)
 
     console.log(`[纯前端] ✅ 模型就绪, 总耗时: ${(performance.now() - startTime).toFixed(0)}ms`)
@@ -198,6 +199,18 @@ export class FrontendOnlyMode extends BaseMode {
 
   // --- 私有方法 ---
 
+  /**
+   * 从 URL 或已下载的字节创建推理会话
+   */
+  private createSession(
+    source: string | Uint8Array,
+    options: ort.InferenceSession.SessionOptions,
+  ): Promise<ort.InferenceSession> {
+    return typeof source === 'string'
+      ? ort.InferenceSession.create(source, options)
+      : ort.InferenceSession.create(source, options)
+  }
+
   /**
    * 检查模型文件是否存在 (HEAD 请求)
    */
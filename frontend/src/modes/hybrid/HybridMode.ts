@@ -1,7 +1,8 @@
 import { BaseMode } from '@/modes/base/BaseMode'
 import type { ModeInfo, Point, MaskResult } from '@/core/types'
-import { MODE_INFO } from '@/core/types'
+import { MODE_INFO, MODEL_REGISTRY, ModelFamily } from '@/core/types'
 import { apiClient } from '@/config/api'
+import { resolveModelSource } from '@/config/artifacts'
 import * as ort from 'onnxruntime-web'
 import pako from 'pako'
 
@@ -12,14 +13,64 @@ import pako from 'pako'
  *
  * 流程:
  * 1. 用户上传图片 → 后端生成 Embedding (600ms)
- * 2. Embedding 压缩传到前端缓存
+ * 2. Decoder 所需的特征压缩传到前端缓存: SAM1 为 float32 Embedding;
+ *    SAM2 含两级高分辨率特征, 以 int8 特征包传输
  * 3. 每次点击 → 前端 ONNX Decoder 直接解码 (50ms, 无网络请求!)
  */
+
+/** int8 特征包中单个张量的清单 (与后端 FeatureTensor 一致) */
+interface FeatureTensor {
+  name: string
+  shape: number[]
+  offset: number
+  scales: number[]
+}
+
+const SAM1_DECODER = '/models/sam_decoder.onnx'
+const SAM2_MASK_SIZE = 256
+
+/**
+ * 解压 int8 特征包: base64 → gzip → int8, 按通道反量化为 float32 张量
+ */
+function decodeFeatures(b64: string, tensors: FeatureTensor[]): Record<string, ort.Tensor> {
+  const compressed = Uint8Array.from(atob(b64), (c) => c.charCodeAt(0))
+  const bytes = pako.inflate(compressed)
+  const features: Record<string, ort.Tensor> = {}
+
+  for (const info of tensors) {
+    const size = info.shape.reduce((a, b) => a * b, 1)
+    const quantized = new Int8Array(bytes.buffer, bytes.byteOffset + info.offset, size)
+    const data = new Float32Array(size)
+    // batch = 1, 数据按通道连续存放
+    const channelSize = size / info.scales.length
+    for (let c = 0; c < info.scales.length; c++) {
+      const scale = info.scales[c]!
+      const end = (c + 1) * channelSize
+      for (let i = c * channelSize; i < end; i++) {
+        data[i] = quantized[i]! * scale
+      }
+    }
+    features[info.name] = new ort.Tensor('float32', data, info.shape)
+  }
+  return features
+}
+
+/**
+ * 解压 float32 Embedding: base64 → gzip → float32 (SAM1 Decoder 的 image_embeddings)
+ */
+function decodeEmbedding(b64: string, shape: number[]): Record<string, ort.Tensor> {
+  const compressed = Uint8Array.from(atob(b64), (c) => c.charCodeAt(0))
+  const bytes = pako.inflate(compressed)
+  const data = new Float32Array(bytes.buffer, bytes.byteOffset, bytes.byteLength / 4)
+  return { image_embeddings: new ort.Tensor('float32', data, shape) }
+}
+
 export class HybridMode extends BaseMode {
   info: ModeInfo = MODE_INFO.hybrid
 
   private decoderSession: ort.InferenceSession | null = null
-  private cachedEmbedding: Float32Array | null = null
+  private cachedFeatures: Record<string, ort.Tensor> | null = null
+  private isSAM2 = false
   private originalSize: [number, number] = [0, 0] // [H, W]
   private _isReady = false
   private currentModelId: string = ''
@@ -30,17 +81,23 @@ export class HybridMode extends BaseMode {
 
   async initialize(modelId: string): Promise<void> {
     this.currentModelId = modelId
-    console.log(`[混合模式] 后端模型: ${modelId}, 加载前端 Decoder...`)
+    const model = MODEL_REGISTRY[modelId]
+    this.isSAM2 = model?.family === ModelFamily.SAM2
+    // Decoder 权重需与后端 Encoder 一致: SAM2 各尺寸使用各自导出的 Decoder
+    const decoderPath = model?.onnxPaths?.hybridDecoder ?? SAM1_DECODER
+    console.log(`[混合模式] 后端模型: ${modelId}, 加载前端 Decoder: ${decoderPath}`)
 
     // 显式设置 WASM 文件路径 — 使用 CDN 避免 Vite 的 import.meta.url 解析问题
     ort.env.wasm.wasmPaths = 'https://cdn.jsdelivr.net/npm/onnxruntime-web@1.24.1/dist/'
     // 禁用多线程（避免 SharedArrayBuffer 问题）
     ort.env.wasm.numThreads = 1
 
-    this.decoderSession = await ort.InferenceSession.create(
-      '/models/sam_decoder.onnx',
-      { executionProviders: ['wasm'] },
-    )
+    const source = await resolveModelSource(decoderPath)
+    const options: ort.InferenceSession.SessionOptions = { executionProviders: ['wasm'] }
+    this.decoderSession =
+      typeof source === 'string'
+        ? await ort.InferenceSession.create(source, options)
+        : await ort.InferenceSession.create(source, options)
 
     this._isReady = true
     console.log(`[混合模式] ✅ Decoder 加载完成`)
@@ -60,21 +117,23 @@ export class HybridMode extends BaseMode {
       shape: number[]
       original_size: number[]
       compressed_size: number
+      tensors: FeatureTensor[] | null
     }>('/api/embedding', {
       image_url: imageUrl,
       model: this.currentModelId,
+      // int8 特征包只用于 SAM2 (导出的 Decoder 已与 SAM2ImagePredictor 对齐);
+      // SAM1 Decoder 仍使用 float32 Embedding, 结果与后端一致
+      format: this.isSAM2 ? 'int8' : 'float32',
     })
 
-    // 解压 Embedding: base64 → gzip bytes → float32
-    const b64 = response.embedding
-    const compressed = Uint8Array.from(atob(b64), (c) => c.charCodeAt(0))
-    const decompressed = pako.inflate(compressed)
-    this.cachedEmbedding = new Float32Array(decompressed.buffer)
+    this.cachedFeatures = response.tensors
+      ? decodeFeatures(response.embedding, response.tensors)
+      : decodeEmbedding(response.embedding, response.shape)
     this.originalSize = [response.original_size[0]!, response.original_size[1]!]
 
     const timeMs = performance.now() - startTime
     console.log(
-      `[混合模式] ✅ Embedding 就绪: ${response.shape.join('x')}, ` +
+      `[混合模式] ✅ Embedding 就绪: ${Object.values(this.cachedFeatures).map((t) => t.dims.join('x')).join(' + ')}, ` +
       `${(response.compressed_size / 1024).toFixed(0)}KB, ${timeMs.toFixed(0)}ms`,
     )
 
@@ -82,15 +141,17 @@ export class HybridMode extends BaseMode {
   }
 
   async segment(points: Point[]): Promise<MaskResult> {
-    if (!this.decoderSession || !this.cachedEmbedding) {
+    if (!this.decoderSession || !this.cachedFeatures) {
       throw new Error('请先设置图片')
     }
 
     const startTime = performance.now()
 
-    // 1. 坐标变换: 原图坐标 → SAM 1024 空间
+    // 1. 坐标变换: 原图坐标 → 1024 输入空间
+    //    SAM1 长边缩放到 1024 (保持比例); SAM2 直接缩放到 1024x1024
     const [origH, origW] = this.originalSize
-    const scale = 1024 / Math.max(origH, origW)
+    const scaleX = this.isSAM2 ? 1024 / origW : 1024 / Math.max(origH, origW)
+    const scaleY = this.isSAM2 ? 1024 / origH : scaleX
 
     // 2. 构建点坐标 + 末尾必须加 padding point
     const numPoints = points.length + 1
@@ -98,8 +159,8 @@ export class HybridMode extends BaseMode {
     const labelsData = new Float32Array(numPoints)
 
     for (let i = 0; i < points.length; i++) {
-      coordsData[i * 2] = points[i]!.x * scale
-      coordsData[i * 2 + 1] = points[i]!.y * scale
+      coordsData[i * 2] = points[i]!.x * scaleX
+      coordsData[i * 2 + 1] = points[i]!.y * scaleY
       labelsData[i] = points[i]!.type // 1=前景, 0=背景
     }
     // padding point
@@ -109,24 +170,27 @@ export class HybridMode extends BaseMode {
 
     // 3. 构建 ONNX 输入
     const feeds: Record<string, ort.Tensor> = {
-      image_embeddings: new ort.Tensor('float32', this.cachedEmbedding, [1, 256, 64, 64]),
+      ...this.cachedFeatures,
       point_coords: new ort.Tensor('float32', coordsData, [1, numPoints, 2]),
       point_labels: new ort.Tensor('float32', labelsData, [1, numPoints]),
       mask_input: new ort.Tensor('float32', new Float32Array(1 * 1 * 256 * 256), [1, 1, 256, 256]),
       has_mask_input: new ort.Tensor('float32', new Float32Array([0]), [1]),
-      orig_im_size: new ort.Tensor('float32', new Float32Array([origH, origW]), [2]),
+    }
+    if (!this.isSAM2) {
+      feeds['orig_im_size'] = new ort.Tensor('float32', new Float32Array([origH, origW]), [2])
     }
 
     // 4. ONNX 推理
     const result = await this.decoderSession.run(feeds)
 
-    const masks = result['masks']!.data as Float32Array    // [1, 4, H, W]
-    const iouScores = result['iou_predictions']!.data as Float32Array // [1, 4]
+    // SAM1: [1, 4, H, W] 原图尺寸; SAM2: [1, 3, 256, 256] 低分辨率 logits
+    const masks = result['masks']!.data as Float32Array
+    const iouScores = result['iou_predictions']!.data as Float32Array
 
     // 5. 选最佳 mask
     let bestIdx = 0
     let bestScore = iouScores[0]!
-    for (let i = 1; i < 4; i++) {
+    for (let i = 1; i < iouScores.length; i++) {
       if (iouScores[i]! > bestScore) {
         bestScore = iouScores[i]!
         bestIdx = i
@@ -134,18 +198,9 @@ export class HybridMode extends BaseMode {
     }
 
     // 6. 提取最佳 mask 并转为 RGBA ImageData
-    const maskPixels = origH * origW
-    const offset = bestIdx * maskPixels
-    const rgba = new Uint8ClampedArray(maskPixels * 4)
-
-    for (let i = 0; i < maskPixels; i++) {
-      if (masks[offset + i]! > 0) {
-        rgba[i * 4] = 30      // R
-        rgba[i * 4 + 1] = 144 // G
-        rgba[i * 4 + 2] = 255 // B
-        rgba[i * 4 + 3] = 128 // A
-      }
-    }
+    const rgba = this.isSAM2
+      ? this.upsampleMask(masks, bestIdx * SAM2_MASK_SIZE * SAM2_MASK_SIZE, origH, origW)
+      : this.maskToRgba(masks, bestIdx * origH * origW, origH * origW)
 
     const timeMs = performance.now() - startTime
     console.log(
@@ -160,12 +215,66 @@ export class HybridMode extends BaseMode {
     }
   }
 
+  private maskToRgba(masks: Float32Array, offset: number, maskPixels: number): Uint8ClampedArray<ArrayBuffer> {
+    const rgba = new Uint8ClampedArray(maskPixels * 4)
+    for (let i = 0; i < maskPixels; i++) {
+      if (masks[offset + i]! > 0) {
+        rgba[i * 4] = 30      // R
+        rgba[i * 4 + 1] = 144 // G
+        rgba[i * 4 + 2] = 255 // B
+        rgba[i * 4 + 3] = 128 // A
+      }
+    }
+    return rgba
+  }
+
+  /**
+   * SAM2 低分辨率 logits 双线性放大到原图尺寸后二值化
+   * (与 F.interpolate(mode='bilinear', align_corners=False) 一致)
+   */
+  private upsampleMask(
+    logits: Float32Array,
+    offset: number,
+    outH: number,
+    outW: number,
+  ): Uint8ClampedArray<ArrayBuffer> {
+    const size = SAM2_MASK_SIZE
+    const rgba = new Uint8ClampedArray(outH * outW * 4)
+
+    for (let y = 0; y < outH; y++) {
+      const sy = Math.min(Math.max(((y + 0.5) * size) / outH - 0.5, 0), size - 1)
+      const y0 = Math.floor(sy)
+      const y1 = Math.min(y0 + 1, size - 1)
+      const wy = sy - y0
+      const row0 = offset + y0 * size
+      const row1 = offset + y1 * size
+
+      for (let x = 0; x < outW; x++) {
+        const sx = Math.min(Math.max(((x + 0.5) * size) / outW - 0.5, 0), size - 1)
+        const x0 = Math.floor(sx)
+        const x1 = Math.min(x0 + 1, size - 1)
+        const wx = sx - x0
+        const top = logits[row0 + x0]! * (1 - wx) + logits[row0 + x1]! * wx
+        const bottom = logits[row1 + x0]! * (1 - wx) + logits[row1 + x1]! * wx
+
+        if (top * (1 - wy) + bottom * wy > 0) {
+          const i = (y * outW + x) * 4
+          rgba[i] = 30      // R
+          rgba[i + 1] = 144 // G
+          rgba[i + 2] = 255 // B
+          rgba[i + 3] = 128 // A
+        }
+      }
+    }
+    return rgba
+  }
+
   async cleanup(): Promise<void> {
     if (this.decoderSession) {
       await this.decoderSession.release()
     }
     this.decoderSession = null
-    this.cachedEmbedding = null
+    this.cachedFeatures = null
     this._isReady = false
   }
 
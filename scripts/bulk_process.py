@@ -0,0 +1,380 @@
+"""
+离线批处理工具 (数据集预处理)
+
+直接复用 ModelRegistry 与模型管理器, 不经过 HTTP:
+  - 遍历目录或清单文件, 多进程预取解码图片
+  - 批量生成 Embedding (float16 分片 .npy / 内存映射) 或运行自动分割 (RLE)
+  - index.jsonl 同时作为检查点, 重新运行会跳过已完成的图片
+  - 实时报告吞吐 (images/sec)
+
+使用:
+  cd backend && source venv/bin/activate
+  python ../scripts/bulk_process.py /data/images -o /data/out --model sam1_vit_b
+  python ../scripts/bulk_process.py manifest.txt -o /data/out --task auto_mask --model sam2_tiny
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+BACKEND_DIR = os.path.join(PROJECT_DIR, "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff")
+INDEX_FILE = "index.jsonl"
+
+
+# ---------- 输入 ----------
+
+def collect_items(source: str) -> list[tuple[str, str]]:
+    """
+    返回 [(key, path)], key 为相对路径, 用于索引和断点续跑
+    source 可以是目录, 或清单文件 (每行一个路径, 或 jsonl 的 {"path": ...})
+    """
+    if os.path.isdir(source):
+        items = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith(IMAGE_EXTS):
+                    path = os.path.join(root, name)
+                    items.append((os.path.relpath(path, source), path))
+        return sorted(items)
+
+    base = os.path.dirname(os.path.abspath(source))
+    items = []
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            path = json.loads(line)["path"] if line.startswith("{") else line
+            full = path if os.path.isabs(path) else os.path.join(base, path)
+            items.append((path, full))
+    return items
+
+
+def decode_image(path: str):
+    """在子进程中解码, 返回 RGB 数组; 失败时返回错误信息而不是抛异常"""
+    from PIL import Image
+
+    try:
+        return np.array(Image.open(path).convert("RGB")), None
+    except Exception as e:
+        return None, str(e)
+
+
+def prefetch(pool: ProcessPoolExecutor, items: list[tuple[str, str]], depth: int):
+    """保持 depth 个解码任务在途, 按输入顺序产出 (key, image, error)"""
+    pending = deque()
+    it = iter(items)
+
+    for key, path in it:
+        pending.append((key, pool.submit(decode_image, path)))
+        if len(pending) >= depth:
+            break
+
+    while pending:
+        key, future = pending.popleft()
+        image, error = future.result()
+        yield key, image, error
+        nxt = next(it, None)
+        if nxt is not None:
+            pending.append((nxt[0], pool.submit(decode_image, nxt[1])))
+
+
+# ---------- 输出 ----------
+
+def load_done_keys(output_dir: str) -> tuple[set[str], int]:
+    """读取索引 (检查点), 返回已完成的 key 和下一个分片编号"""
+    done, last_shard = set(), -1
+    index_path = os.path.join(output_dir, INDEX_FILE)
+    if os.path.exists(index_path):
+        with open(index_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 上次崩溃时写了一半的行
+                done.add(record["key"])
+                last_shard = max(last_shard, int(record["shard"][6:11]))
+    return done, last_shard + 1
+
+
+class ShardWriter:
+    """分片写入器基类: 分片落盘后才写索引, 保证索引中的条目都可读"""
+
+    def __init__(self, output_dir: str, shard_size: int, next_shard: int):
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        self.shard_id = next_shard
+        self.index = open(os.path.join(output_dir, INDEX_FILE), "a", encoding="utf-8")
+
+    def shard_name(self, ext: str) -> str:
+        return f"shard_{self.shard_id:05d}{ext}"
+
+    def commit(self, records: list[dict]) -> None:
+        for record in records:
+            self.index.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.index.flush()
+        os.fsync(self.index.fileno())
+
+    def close(self) -> None:
+        self.index.close()
+
+
+class NpyShardWriter(ShardWriter):
+    """float16 .npy 分片: 攒满一个分片再原子写入"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.rows: list[np.ndarray] = []
+        self.records: list[dict] = []
+
+    def add(self, key: str, embedding: np.ndarray, original_size: list[int]) -> None:
+        self.records.append({
+            "key": key,
+            "shard": self.shard_name(".npy"),
+            "row": len(self.rows),
+            "original_size": original_size,
+        })
+        self.rows.append(embedding.astype(np.float16))
+        if len(self.rows) >= self.shard_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.rows:
+            return
+        path = os.path.join(self.output_dir, self.shard_name(".npy"))
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, np.stack(self.rows))
+        os.replace(path + ".tmp", path)
+        self.commit(self.records)
+        self.rows, self.records = [], []
+        self.shard_id += 1
+
+    def close(self) -> None:
+        self.flush()
+        super().close()
+
+
+class MemmapShardWriter(ShardWriter):
+    """内存映射分片: 预分配 [shard_size, ...] float16, 每批写完即 flush 并记录检查点"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.array = None
+        self.row = 0
+        self.records: list[dict] = []
+
+    def add(self, key: str, embedding: np.ndarray, original_size: list[int]) -> None:
+        if self.array is None:
+            path = os.path.join(self.output_dir, self.shard_name(".npy"))
+            self.array = np.lib.format.open_memmap(
+                path, mode="w+", dtype=np.float16, shape=(self.shard_size, *embedding.shape)
+            )
+            self.row = 0
+
+        self.array[self.row] = embedding
+        self.records.append({
+            "key": key,
+            "shard": self.shard_name(".npy"),
+            "row": self.row,
+            "original_size": original_size,
+        })
+        self.row += 1
+        if self.row >= self.shard_size:
+            self.flush()
+            self.array = None
+            self.shard_id += 1
+
+    def flush(self) -> None:
+        if self.array is not None:
+            self.array.flush()
+        self.commit(self.records)
+        self.records = []
+
+    def close(self) -> None:
+        self.flush()
+        if self.array is not None:
+            # 未写满的分片: 尾部行未使用, 以索引中的 row 为准
+            self.shard_id += 1
+            self.array = None
+        super().close()
+
+
+class MaskShardWriter(ShardWriter):
+    """自动分割结果: 每个分片一个 jsonl, 每行一张图片的全部 RLE mask"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.lines: list[str] = []
+        self.records: list[dict] = []
+
+    def add(self, key: str, masks: list[dict], original_size: list[int]) -> None:
+        from app.utils.rle import encode_mask_rle
+
+        self.records.append({
+            "key": key,
+            "shard": self.shard_name(".jsonl"),
+            "row": len(self.lines),
+            "original_size": original_size,
+            "count": len(masks),
+        })
+        self.lines.append(json.dumps({
+            "key": key,
+            "masks": [
+                {
+                    "rle": encode_mask_rle(m["segmentation"]),
+                    "area": int(m["area"]),
+                    "bbox": [float(v) for v in m["bbox"]],
+                    "predicted_iou": float(m["predicted_iou"]),
+                    "stability_score": float(m["stability_score"]),
+                }
+                for m in masks
+            ],
+        }, ensure_ascii=False))
+        if len(self.lines) >= self.shard_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.lines:
+            return
+        path = os.path.join(self.output_dir, self.shard_name(".jsonl"))
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write("\n".join(self.lines) + "\n")
+        os.replace(path + ".tmp", path)
+        self.commit(self.records)
+        self.lines, self.records = [], []
+        self.shard_id += 1
+
+    def close(self) -> None:
+        self.flush()
+        super().close()
+
+
+# ---------- 主流程 ----------
+
+class Progress:
+    """吞吐统计"""
+
+    def __init__(self, total: int, every: int = 50):
+        self.total = total
+        self.every = every
+        self.done = 0
+        self.failed = 0
+        self.start = time.time()
+
+    def step(self, n: int = 1) -> None:
+        before = self.done
+        self.done += n
+        if self.done // self.every != before // self.every or self.done == self.total:
+            self.report()
+
+    @property
+    def rate(self) -> float:
+        return self.done / max(time.time() - self.start, 1e-6)
+
+    def report(self) -> None:
+        eta = (self.total - self.done) / self.rate if self.rate > 0 else 0
+        print(f"  [{self.done}/{self.total}] {self.rate:.2f} images/sec, ETA {eta:.0f}s")
+
+
+def run(args) -> None:
+    from app.config import settings
+    from app.models.registry import model_registry
+
+    if args.device:
+        settings.device = args.device
+
+    os.makedirs(args.output, exist_ok=True)
+    items = collect_items(args.input)
+    done, next_shard = load_done_keys(args.output)
+    todo = [item for item in items if item[0] not in done]
+
+    print(f"🔧 批处理: {args.task} / {args.model}")
+    print(f"   输入: {args.input} ({len(items)} 张, 已完成 {len(items) - len(todo)} 张)")
+    print(f"   输出: {args.output}\n")
+    if not todo:
+        print("✅ 没有需要处理的图片")
+        return
+
+    manager = model_registry.get_or_load(args.model)
+
+    if args.task == "auto_mask":
+        writer = MaskShardWriter(args.output, args.shard_size, next_shard)
+    elif args.format == "memmap":
+        writer = MemmapShardWriter(args.output, args.shard_size, next_shard)
+    else:
+        writer = NpyShardWriter(args.output, args.shard_size, next_shard)
+
+    progress = Progress(len(todo))
+    errors = open(os.path.join(args.output, "errors.jsonl"), "a", encoding="utf-8")
+    batch: list[tuple[str, np.ndarray]] = []
+
+    def process_batch():
+        images = [image for _, image in batch]
+        embeddings = manager.generate_embeddings(images)
+        for (key, image), embedding in zip(batch, embeddings):
+            writer.add(key, embedding, [image.shape[0], image.shape[1]])
+        if isinstance(writer, MemmapShardWriter):
+            writer.flush()
+        progress.step(len(batch))
+        batch.clear()
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for key, image, error in prefetch(pool, todo, args.prefetch):
+                if error is not None:
+                    progress.failed += 1
+                    errors.write(json.dumps({"key": key, "error": error}, ensure_ascii=False) + "\n")
+                    progress.step()
+                    continue
+
+                if args.task == "auto_mask":
+                    writer.add(key, manager.generate_masks(image), [image.shape[0], image.shape[1]])
+                    progress.step()
+                    continue
+
+                batch.append((key, image))
+                if len(batch) >= args.batch_size:
+                    process_batch()
+
+            if batch:
+                process_batch()
+    finally:
+        writer.close()
+        errors.close()
+        model_registry.unload_all()
+
+    elapsed = time.time() - progress.start
+    print(f"\n🎉 完成! {progress.done} 张 ({progress.failed} 张失败), "
+          f"{elapsed:.1f}s, {progress.rate:.2f} images/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SegmentX 离线批处理")
+    parser.add_argument("input", help="图片目录, 或清单文件 (txt / jsonl)")
+    parser.add_argument("-o", "--output", required=True, help="输出目录 (分片 + index.jsonl)")
+    parser.add_argument("--model", default="sam1_vit_b", help="模型 ID (见 config.available_models)")
+    parser.add_argument("--task", choices=["embedding", "auto_mask"], default="embedding")
+    parser.add_argument("--format", choices=["npy", "memmap"], default="npy",
+                        help="embedding 输出格式: 整片写入的 .npy 或预分配的内存映射 .npy")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--shard-size", type=int, default=256, help="每个分片的图片数")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="解码进程数")
+    parser.add_argument("--prefetch", type=int, default=16, help="预取的解码任务数")
+    parser.add_argument("--device", default=None, help="覆盖 settings.device")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
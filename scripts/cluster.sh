@@ -0,0 +1,43 @@
+#!/bin/bash
+
+# 本地多实例 + 路由网关 (测试缓存亲和路由)
+# 用法: bash scripts/cluster.sh [实例数, 默认 3]
+
+N=${1:-3}
+BASE_PORT=8001
+
+PROJECT_DIR="$(dirname "$0")/.."
+cd "$PROJECT_DIR/backend"
+if [ -d "venv" ]; then
+  source venv/bin/activate
+fi
+
+echo "=== SegmentX 集群 ($N 个实例) ==="
+
+PIDS=()
+BACKENDS=""
+for i in $(seq 0 $((N - 1))); do
+  PORT=$((BASE_PORT + i))
+  echo "🚀 启动实例 http://127.0.0.1:$PORT"
+  # 每个实例独立的任务目录, 共享 uploads 目录
+  JOBS_DIR="jobs/node_$PORT" uvicorn app.main:app --host 127.0.0.1 --port $PORT &
+  PIDS+=($!)
+  BACKENDS="$BACKENDS\"http://127.0.0.1:$PORT\","
+done
+
+sleep 2
+
+echo "🚦 启动网关 http://localhost:8000"
+GATEWAY_BACKENDS="[${BACKENDS%,}]" uvicorn app.gateway.main:app --host 0.0.0.0 --port 8000 &
+PIDS+=($!)
+
+echo ""
+echo "============================================"
+echo "  网关: http://localhost:8000"
+echo "  实例状态: http://localhost:8000/gateway/nodes"
+echo "============================================"
+echo ""
+echo "按 Ctrl+C 停止所有服务"
+
+trap "kill ${PIDS[*]} 2>/dev/null; exit" INT TERM
+wait
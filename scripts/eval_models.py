@@ -0,0 +1,528 @@
+"""
+模型评估: 质量 / 延迟 / 内存
+
+在当前机器上评估所有已配置的模型 (settings.available_models) 及其变体, 用于选择线上模型:
+  - int8: 动态量化编码器 (已配置的 *_int8; 其余 SAM1/SAM2/SAM-HQ 模型临时生成同名配置)
+  - onnx: scripts/export_onnx.py 导出的 SAM1 Encoder + Decoder (需安装 onnxruntime)
+在标注图片集上模拟交互点击: 每次点击落在当前误差最大区域的中心 (漏分为正点, 误分为负点)
+  - mIoU@k: 第 k 次点击后所有目标的平均 IoU
+  - NoC@85 / NoC@90: 达到目标 IoU 所需的平均点击数 (达不到计为最大点击数)
+同时记录编码 / 解码耗时分位数、加载耗时与峰值内存。每个变体默认在独立子进程中评估,
+峰值内存互不影响。结果打印为一张表, 指定 --output 时写入 JSON, 便于跨版本对比
+
+数据集目录:
+  <dataset>/images/<name>.jpg             图片
+  <dataset>/masks/<name>.png              单个目标 (非零像素), 或实例标签图 (每个非零值一个目标)
+  <dataset>/masks/<name>_<k>.png          同一图片的多个目标
+未指定数据集时生成带随机形状的合成图片 (只适合验证流程)
+
+使用:
+  cd backend && source venv/bin/activate
+  DEVICE=cpu python ../scripts/eval_models.py --dataset /data/eval --output eval.json
+  DEVICE=cpu python ../scripts/eval_models.py --dataset /data/eval --models sam1_vit_b sam2_tiny --max-clicks 10
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+BACKEND_DIR = os.path.join(PROJECT_DIR, "backend")
+ONNX_DIR = os.path.join(PROJECT_DIR, "frontend", "public", "models")
+sys.path.insert(0, BACKEND_DIR)
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+IOU_TARGETS = (0.85, 0.90)
+
+# 支持 int8 动态量化编码器的模型族
+INT8_FAMILIES = ("sam1", "sam2", "sam_hq")
+# 已导出 ONNX 的模型: (Encoder, Decoder), 位于 frontend/public/models
+ONNX_MODELS = {"sam1_vit_b": ("sam1_encoder_vit_b.onnx", "sam1_decoder.onnx")}
+ONNX_SUFFIX = ":onnx"
+
+
+# ---------- 数据集 ----------
+
+def read_masks(path: str, shape: tuple[int, int]) -> list[np.ndarray]:
+    """读取标注: 二值 mask 为一个目标, 多个非零值的标签图每个值一个目标"""
+    import cv2
+
+    label = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if label is None:
+        return []
+    if label.ndim == 3:
+        label = label.max(axis=2)
+    if label.shape != shape:
+        print(f"  ⚠️ 标注尺寸与图片不一致, 跳过: {path}")
+        return []
+    values = [v for v in np.unique(label) if v != 0]
+    if len(values) <= 1:
+        return [label > 0] if values else []
+    return [label == v for v in values]
+
+
+def load_dataset(args) -> list[tuple[str, np.ndarray, list[np.ndarray]]]:
+    """返回 [(名称, RGB 图片, 目标 mask 列表)], 面积小于 --min-area 的目标忽略"""
+    import cv2
+
+    if not args.dataset:
+        dataset = synthetic_dataset(args.num_images, args.seed)
+    else:
+        image_dir = os.path.join(args.dataset, "images")
+        mask_dir = os.path.join(args.dataset, "masks")
+        mask_names = sorted(os.listdir(mask_dir)) if os.path.isdir(mask_dir) else []
+        names = sorted(n for n in os.listdir(image_dir) if n.lower().endswith(IMAGE_EXTS))
+
+        dataset = []
+        for name in names[:args.num_images]:
+            image = cv2.imread(os.path.join(image_dir, name))
+            if image is None:
+                continue
+            stem = os.path.splitext(name)[0]
+            masks = []
+            for mask_name in mask_names:
+                mask_stem = os.path.splitext(mask_name)[0]
+                suffix = mask_stem[len(stem) + 1:]
+                if mask_stem == stem or (mask_stem.startswith(stem + "_") and suffix.isdigit()):
+                    masks.extend(read_masks(os.path.join(mask_dir, mask_name), image.shape[:2]))
+            dataset.append((name, cv2.cvtColor(image, cv2.COLOR_BGR2RGB), masks))
+
+    return [
+        (name, image, [m for m in masks if m.sum() >= args.min_area])
+        for name, image, masks in dataset
+    ]
+
+
+def synthetic_dataset(num_images: int, seed: int) -> list[tuple[str, np.ndarray, list[np.ndarray]]]:
+    """平滑纹理背景上的随机椭圆 / 矩形, 标注为各形状未被遮挡的部分"""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    h, w = 480, 640
+    dataset = []
+    for i in range(num_images):
+        coarse = rng.integers(0, 256, (h // 32 + 1, w // 32 + 1, 3), dtype=np.uint8)
+        image = cv2.resize(coarse, (w, h), interpolation=cv2.INTER_CUBIC)
+        masks = []
+        for _ in range(3):
+            shape = np.zeros((h, w), dtype=np.uint8)
+            cx, cy = int(rng.uniform(0.2, 0.8) * w), int(rng.uniform(0.2, 0.8) * h)
+            rx, ry = int(rng.uniform(0.05, 0.2) * w), int(rng.uniform(0.05, 0.2) * h)
+            if rng.random() < 0.5:
+                cv2.ellipse(shape, (cx, cy), (rx, ry), float(rng.uniform(0, 180)), 0, 360, 1, -1)
+            else:
+                cv2.rectangle(shape, (cx - rx, cy - ry), (cx + rx, cy + ry), 1, -1)
+            region = shape.astype(bool)
+            color = rng.integers(0, 256, 3)
+            noise = rng.normal(0, 8, (int(region.sum()), 3))
+            image[region] = np.clip(color + noise, 0, 255).astype(np.uint8)
+            # 后画的形状遮挡先画的
+            masks = [m & ~region for m in masks] + [region]
+        dataset.append((f"synthetic_{i}", image, masks))
+    return dataset
+
+
+# ---------- 模拟点击 ----------
+
+def mask_iou(a: np.ndarray, b: np.ndarray) -> float:
+    union = np.logical_or(a, b).sum()
+    if union == 0:
+        return 1.0
+    return float(np.logical_and(a, b).sum() / union)
+
+
+def _interior_distance(region: np.ndarray) -> np.ndarray:
+    """区域内各点到区域边界 (含图片边缘) 的距离"""
+    import cv2
+
+    padded = np.pad(region, 1).astype(np.uint8)
+    return cv2.distanceTransform(padded, cv2.DIST_L2, 5)[1:-1, 1:-1]
+
+
+def next_click(gt: np.ndarray, pred: np.ndarray) -> tuple[np.ndarray, int]:
+    """在漏分 / 误分中较大的误差区域内, 取离其边界最远的点; 漏分为正点 (1), 误分为负点 (0)"""
+    fn = _interior_distance(gt & ~pred)
+    fp = _interior_distance(pred & ~gt)
+    positive = fn.max() >= fp.max()
+    dist = fn if positive else fp
+    y, x = np.unravel_index(int(np.argmax(dist)), dist.shape)
+    return np.array([x, y], dtype=np.float32), int(positive)
+
+
+def best_mask(masks: np.ndarray, scores: np.ndarray, shape: tuple[int, int]) -> np.ndarray:
+    """取得分最高的 mask (没有 mask 时为空)"""
+    if len(masks) == 0:
+        return np.zeros(shape, dtype=bool)
+    return np.squeeze(np.asarray(masks[int(np.argmax(scores))])).reshape(shape) > 0
+
+
+def evaluate_object(runner, gt: np.ndarray, max_clicks: int, decode_ms: list[float]) -> list[float]:
+    """对一个目标逐次点击 (每次带上之前全部点击), 返回每次点击后的 IoU"""
+    pred = np.zeros_like(gt)
+    points, labels, ious = [], [], []
+    for _ in range(max_clicks):
+        if ious and ious[-1] >= 1.0:
+            ious.append(1.0)
+            continue
+        point, label = next_click(gt, pred)
+        points.append(point)
+        labels.append(label)
+
+        start = time.perf_counter()
+        masks, scores = runner.predict(np.array(points), np.array(labels))
+        decode_ms.append((time.perf_counter() - start) * 1000)
+
+        pred = best_mask(masks, scores, gt.shape)
+        ious.append(mask_iou(pred, gt))
+    return ious
+
+
+def clicks_to_target(ious: list[float], target: float) -> int:
+    for k, iou in enumerate(ious, 1):
+        if iou >= target:
+            return k
+    return len(ious)
+
+
+def percentiles(samples: list[float]) -> dict:
+    if not samples:
+        return {"mean": None, "p50": None, "p95": None}
+    return {
+        "mean": round(float(np.mean(samples)), 1),
+        "p50": round(float(np.percentile(samples, 50)), 1),
+        "p95": round(float(np.percentile(samples, 95)), 1),
+    }
+
+
+# ---------- 变体 ----------
+
+class OnnxRunner:
+    """scripts/export_onnx.py 导出的 SAM1 Encoder + Decoder (onnxruntime, CPU)"""
+
+    PIXEL_MEAN = np.array([123.675, 116.28, 103.53], dtype=np.float32)
+    PIXEL_STD = np.array([58.395, 57.12, 57.375], dtype=np.float32)
+    IMAGE_SIZE = 1024
+
+    def __init__(self, encoder_path: str, decoder_path: str):
+        import onnxruntime as ort
+
+        providers = ["CPUExecutionProvider"]
+        self.encoder = ort.InferenceSession(encoder_path, providers=providers)
+        self.decoder = ort.InferenceSession(decoder_path, providers=providers)
+        self._outputs = [o.name for o in self.decoder.get_outputs()]
+        self._embedding = None
+        self._size = (0, 0)
+        self._scale = np.ones(2, dtype=np.float32)
+
+    def set_image(self, image: np.ndarray) -> None:
+        """与 SamPredictor 一致: 长边缩放到 1024, 归一化后右下补零"""
+        import cv2
+
+        h, w = image.shape[:2]
+        scale = self.IMAGE_SIZE / max(h, w)
+        nh, nw = int(h * scale + 0.5), int(w * scale + 0.5)
+        resized = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR).astype(np.float32)
+
+        padded = np.zeros((self.IMAGE_SIZE, self.IMAGE_SIZE, 3), dtype=np.float32)
+        padded[:nh, :nw] = (resized - self.PIXEL_MEAN) / self.PIXEL_STD
+        tensor = np.ascontiguousarray(padded.transpose(2, 0, 1)[None])
+
+        self._embedding = self.encoder.run(None, {"input_image": tensor})[0]
+        self._size = (h, w)
+        self._scale = np.array([nw / w, nh / h], dtype=np.float32)
+
+    def predict(self, points: np.ndarray, labels: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # 与前端一致: 追加 padding point (label -1)
+        coords = np.concatenate([points * self._scale, [[0, 0]]]).astype(np.float32)[None]
+        point_labels = np.concatenate([labels, [-1]]).astype(np.float32)[None]
+        feeds = {
+            "image_embeddings": self._embedding,
+            "point_coords": coords,
+            "point_labels": point_labels,
+            "mask_input": np.zeros((1, 1, 256, 256), dtype=np.float32),
+            "has_mask_input": np.zeros(1, dtype=np.float32),
+            "orig_im_size": np.array(self._size, dtype=np.float32),
+        }
+        outputs = dict(zip(self._outputs, self.decoder.run(None, feeds)))
+        return outputs["masks"][0] > 0, outputs["iou_predictions"][0]
+
+
+def plan_variants(models: list[str], with_int8: bool) -> list[str]:
+    """每个模型及其 int8 / ONNX 变体 (去重, 保持顺序)"""
+    from app.config import settings
+
+    variants = []
+    for model_id in models:
+        config = settings.available_models[model_id]
+        variants.append(model_id)
+        if with_int8 and config["family"] in INT8_FAMILIES and not config.get("quantized"):
+            variants.append(f"{model_id}_int8")
+        if model_id in ONNX_MODELS:
+            variants.append(model_id + ONNX_SUFFIX)
+    return list(dict.fromkeys(variants))
+
+
+def unavailable(variant: str) -> str:
+    """变体无法评估的原因 (可评估时为空)"""
+    from app.config import settings
+
+    if variant.endswith(ONNX_SUFFIX):
+        if importlib.util.find_spec("onnxruntime") is None:
+            return "onnxruntime 未安装"
+        for name in ONNX_MODELS[variant[:-len(ONNX_SUFFIX)]]:
+            if not os.path.exists(os.path.join(ONNX_DIR, name)):
+                return f"ONNX 文件不存在: {name} (运行 scripts/export_onnx.py)"
+        return ""
+
+    config = settings.available_models.get(variant) or settings.available_models[variant.removesuffix("_int8")]
+    if not os.path.exists(os.path.join(settings.models_dir, config["checkpoint"])):
+        return f"checkpoint 不存在: {config['checkpoint']}"
+    return ""
+
+
+def load_variant(variant: str):
+    """返回 (可调用 set_image / predict 的对象, 加载统计)"""
+    from app.config import settings
+    from app.models.registry import model_registry
+    from app.utils.memory import PeakRSSMonitor
+
+    if variant.endswith(ONNX_SUFFIX):
+        encoder, decoder = ONNX_MODELS[variant[:-len(ONNX_SUFFIX)]]
+        with PeakRSSMonitor() as monitor:
+            runner = OnnxRunner(os.path.join(ONNX_DIR, encoder), os.path.join(ONNX_DIR, decoder))
+        return runner, {
+            "load_time_ms": round(monitor.elapsed_ms, 1),
+            "load_peak_delta_mb": round(monitor.peak_delta_mb, 1),
+            "load_method": "onnxruntime",
+            "quantized": None,
+        }
+
+    if variant not in settings.available_models:
+        base = variant.removesuffix("_int8")
+        settings.available_models[variant] = {**settings.available_models[base], "quantized": True}
+    # 评估单实例延迟, 不创建多副本
+    settings.model_replicas.pop(variant, None)
+
+    manager = model_registry.load(variant)
+    stats = manager.load_stats
+    return manager, {
+        "load_time_ms": stats["load_time_ms"],
+        "load_peak_delta_mb": stats["load_peak_delta_mb"],
+        "load_method": stats["load_method"],
+        "quantized": stats["quantized"],
+    }
+
+
+# ---------- 评估 ----------
+
+def evaluate_variant(variant: str, dataset, args) -> dict:
+    from app.models.registry import model_registry
+    from app.utils.memory import PeakRSSMonitor
+
+    result = {"variant": variant, "status": "ok"}
+    encode_ms, decode_ms, object_ious = [], [], []
+
+    with PeakRSSMonitor() as monitor:
+        runner, load_stats = load_variant(variant)
+        result.update(load_stats)
+
+        # 预热 (首次前向包含线程池与内存分配开销, 不计入)
+        _, image, _ = dataset[0]
+        for _ in range(args.warmup):
+            runner.set_image(image)
+            runner.predict(np.array([[image.shape[1] / 2, image.shape[0] / 2]]), np.array([1]))
+
+        for name, image, masks in dataset:
+            if not masks:
+                continue
+            start = time.perf_counter()
+            runner.set_image(image)
+            encode_ms.append((time.perf_counter() - start) * 1000)
+
+            image_ious = [evaluate_object(runner, gt, args.max_clicks, decode_ms) for gt in masks]
+            object_ious.extend(image_ious)
+            final = np.mean([ious[-1] for ious in image_ious])
+            print(f"  {variant} {name}: {len(masks)} 个目标, 编码 {encode_ms[-1]:.0f}ms, "
+                  f"{args.max_clicks} 次点击后 IoU {final:.3f}")
+
+    if not variant.endswith(ONNX_SUFFIX):
+        model_registry.unload(variant)
+
+    curve = np.mean(object_ious, axis=0) if object_ious else np.zeros(args.max_clicks)
+    result.update({
+        "images": len(encode_ms),
+        "objects": len(object_ious),
+        "peak_rss_mb": round(monitor.peak_mb, 1),
+        "peak_delta_mb": round(monitor.peak_delta_mb, 1),
+        "encode_ms": percentiles(encode_ms),
+        "decode_ms": percentiles(decode_ms),
+        "miou": [round(float(v), 4) for v in curve],
+        "noc": {
+            f"{int(t * 100)}": round(float(np.mean([clicks_to_target(i, t) for i in object_ious])), 2)
+            if object_ious else None
+            for t in IOU_TARGETS
+        },
+        # 最大点击数内仍未达到目标 IoU 的目标比例
+        "failed": {
+            f"{int(t * 100)}": round(float(np.mean([max(i) < t for i in object_ious])), 4)
+            if object_ious else None
+            for t in IOU_TARGETS
+        },
+    })
+    return result
+
+
+def run_isolated(variant: str) -> dict:
+    """在子进程中评估一个变体 (相同参数), 峰值内存不受之前变体影响"""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        output = f.name
+    try:
+        cmd = [sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--worker", variant, "--worker-output", output]
+        proc = subprocess.run(cmd, cwd=os.getcwd())
+        if proc.returncode != 0:
+            return {"variant": variant, "status": "error", "error": f"子进程退出码 {proc.returncode}"}
+        with open(output, encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.remove(output)
+
+
+def run_variant(variant: str, dataset, args) -> dict:
+    try:
+        return evaluate_variant(variant, dataset, args)
+    except Exception as e:
+        print(f"  ❌ {variant} 评估失败: {e}")
+        return {"variant": variant, "status": "error", "error": str(e)}
+
+
+def environment() -> dict:
+    import torch
+    from app.config import settings
+    from app.models.replicas import available_cores
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cores": len(available_cores()),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "device": settings.device,
+    }
+
+
+def _fmt(value, spec: str = ".0f") -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def print_table(results: list[dict], max_clicks: int) -> None:
+    clicks = [k for k in (1, 3, 5) if k <= max_clicks]
+    header = (
+        f"{'variant':<22} {'load ms':>8} {'peak MB':>8} {'enc p50':>8} {'enc p95':>8} "
+        f"{'dec p50':>8} {'dec p95':>8} " + " ".join(f"{f'IoU@{k}':>7}" for k in clicks)
+        + f" {'NoC@85':>7} {'NoC@90':>7}"
+    )
+    print(f"\n📊 模型评估 (最多 {max_clicks} 次点击)")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if r["status"] != "ok":
+            print(f"{r['variant']:<22} {'⚠️ ' + r['status']}: {r.get('error', '')}")
+            continue
+        print(
+            f"{r['variant']:<22} {_fmt(r['load_time_ms']):>8} {_fmt(r['peak_rss_mb']):>8} "
+            f"{_fmt(r['encode_ms']['p50']):>8} {_fmt(r['encode_ms']['p95']):>8} "
+            f"{_fmt(r['decode_ms']['p50'], '.1f'):>8} {_fmt(r['decode_ms']['p95'], '.1f'):>8} "
+            + " ".join(f"{_fmt(r['miou'][k - 1], '.3f'):>7}" for k in clicks)
+            + f" {_fmt(r['noc']['85'], '.2f'):>7} {_fmt(r['noc']['90'], '.2f'):>7}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模型评估: 质量 / 延迟 / 内存")
+    parser.add_argument("--models", nargs="+", help="模型 ID (默认全部已配置模型)")
+    parser.add_argument("--dataset", help="标注数据集目录 (images/ 与 masks/, 默认使用合成图片)")
+    parser.add_argument("--num-images", type=int, default=50)
+    parser.add_argument("--min-area", type=int, default=100, help="忽略面积 (像素) 更小的目标")
+    parser.add_argument("--max-clicks", type=int, default=10, help="每个目标的最大点击数")
+    parser.add_argument("--warmup", type=int, default=1, help="计时前的预热次数")
+    parser.add_argument("--no-int8", action="store_true", help="不评估临时生成的 int8 变体")
+    parser.add_argument("--in-process", action="store_true", help="在当前进程中依次评估 (峰值内存会相互影响)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    from app.config import settings
+
+    dataset = load_dataset(args)
+    if not any(masks for _, _, masks in dataset):
+        sys.exit("没有可用的标注目标")
+
+    if args.worker:
+        with open(args.worker_output, "w", encoding="utf-8") as f:
+            json.dump(run_variant(args.worker, dataset, args), f)
+        return
+
+    models = args.models or list(settings.available_models)
+    unknown = [m for m in models if m not in settings.available_models]
+    if unknown:
+        parser.error(f"未知模型: {', '.join(unknown)}")
+
+    variants = plan_variants(models, not args.no_int8)
+    print(f"🔍 评估 {len(variants)} 个变体, {len(dataset)} 张图片, "
+          f"{sum(len(m) for _, _, m in dataset)} 个目标")
+
+    results = []
+    for variant in variants:
+        reason = unavailable(variant)
+        if reason:
+            print(f"  ⏭️  跳过 {variant}: {reason}")
+            results.append({"variant": variant, "status": "skipped", "error": reason})
+            continue
+        print(f"\n▶️  {variant}")
+        results.append(run_variant(variant, dataset, args) if args.in_process else run_isolated(variant))
+
+    print_table(results, args.max_clicks)
+
+    if args.output:
+        report = {
+            "environment": environment(),
+            "config": {
+                "dataset": args.dataset or "synthetic",
+                "images": len(dataset),
+                "objects": sum(len(m) for _, _, m in dataset),
+                "max_clicks": args.max_clicks,
+                "iou_targets": list(IOU_TARGETS),
+                "warmup": args.warmup,
+                "isolated": not args.in_process,
+            },
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n✅ 结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
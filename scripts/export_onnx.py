@@ -3,14 +3,25 @@
 
 导出内容:
   sam1_encoder_vit_b.onnx — Image Encoder (量化后 ~95MB)
+  sam2_decoder_<size>.onnx — SAM2 Mask Decoder (混合模式, 指定 --sam2 时导出)
+      输入: /api/embedding (format=int8) 返回的 image_embed / high_res_feats_0 / high_res_feats_1
+      + 点击提示; 输出 256x256 低分辨率 mask logits 与 IoU
+      各尺寸的 Decoder 权重不同, 需与后端 Encoder 使用同一个 checkpoint
+      导出后与 SAM2ImagePredictor.predict 对比 (需要 onnxruntime), 不一致时不发布
 
-注: Decoder 已有 (sam_decoder.onnx / sam1_decoder.onnx, 16MB)
+注: SAM1 Decoder 已有 (sam_decoder.onnx / sam1_decoder.onnx, 16MB)
+
+导出后把所有 ONNX 文件发布到 backend/artifacts (内容哈希 URL + br/gzip 预压缩 + 分块),
+由 /api/artifacts/manifest 提供给前端
 
 使用:
   cd backend && source venv/bin/activate
   python ../scripts/export_onnx.py
+  python ../scripts/export_onnx.py --publish-only   # 只重新发布已有的 ONNX 文件
+  python ../scripts/export_onnx.py --sam2 sam2_tiny sam2_small   # 只导出 SAM2 Decoder
 """
 
+import argparse
 import os
 import sys
 import time
@@ -123,14 +134,223 @@ def setup_decoder():
         print("   python -c \"from segment_anything.utils.onnx import SamOnnxModel; ...\"")
 
 
+def export_sam2_decoder(model_id: str) -> str:
+    """导出 SAM2 Mask Decoder (含 Prompt Encoder), 供混合模式在浏览器中解码"""
+    import torch
+    from sam2.build_sam import build_sam2
+
+    sys.path.insert(0, BACKEND_DIR)
+    from app.config import settings
+
+    model_config = settings.available_models.get(model_id)
+    if not model_config or model_config["family"] != "sam2":
+        print(f"❌ 不是 SAM2 模型: {model_id}")
+        sys.exit(1)
+    checkpoint = os.path.join(MODELS_DIR, model_config["checkpoint"])
+    if not os.path.exists(checkpoint):
+        print(f"❌ 找不到模型: {checkpoint}")
+        sys.exit(1)
+
+    print("=" * 50)
+    print(f"导出 SAM2 Decoder: {model_id}")
+    print("=" * 50)
+
+    sam2 = build_sam2(model_config["config"], checkpoint, device="cpu")
+    sam2.eval()
+
+    class SAM2DecoderOnnx(torch.nn.Module):
+        """点击提示编码 + Mask Decoder; 点编码改写为乘法形式以便导出 (与 SAM1 的 SamOnnxModel 相同)"""
+
+        def __init__(self, model):
+            super().__init__()
+            self.prompt_encoder = model.sam_prompt_encoder
+            self.mask_decoder = model.sam_mask_decoder
+            self.image_size = model.image_size
+
+        def embed_points(self, point_coords, point_labels):
+            point_coords = (point_coords + 0.5) / self.image_size
+            point_embedding = self.prompt_encoder.pe_layer._pe_encoding(point_coords)
+            point_labels = point_labels.unsqueeze(-1).expand_as(point_embedding)
+            point_embedding = point_embedding * (point_labels != -1)
+            point_embedding = point_embedding + self.prompt_encoder.not_a_point_embed.weight * (point_labels == -1)
+            for i in range(self.prompt_encoder.num_point_embeddings):
+                point_embedding = point_embedding + self.prompt_encoder.point_embeddings[i].weight * (point_labels == i)
+            return point_embedding
+
+        def forward(self, image_embed, high_res_feats_0, high_res_feats_1,
+                    point_coords, point_labels, mask_input, has_mask_input):
+            sparse = self.embed_points(point_coords, point_labels)
+            no_mask = self.prompt_encoder.no_mask_embed.weight.reshape(1, -1, 1, 1)
+            dense = (
+                has_mask_input * self.prompt_encoder.mask_downscaling(mask_input)
+                + (1 - has_mask_input) * no_mask
+            )
+            masks, iou_predictions, _, _ = self.mask_decoder(
+                image_embeddings=image_embed,
+                image_pe=self.prompt_encoder.get_dense_pe(),
+                sparse_prompt_embeddings=sparse,
+                dense_prompt_embeddings=dense,
+                multimask_output=True,
+                repeat_image=False,
+                high_res_features=[high_res_feats_0, high_res_feats_1],
+            )
+            return masks, iou_predictions
+
+    decoder = SAM2DecoderOnnx(sam2).eval()
+    embed_dim = sam2.sam_prompt_encoder.embed_dim
+    size = sam2.sam_prompt_encoder.image_embedding_size  # (64, 64)
+    dummy = (
+        torch.randn(1, embed_dim, *size),
+        torch.randn(1, embed_dim // 8, size[0] * 4, size[1] * 4),
+        torch.randn(1, embed_dim // 4, size[0] * 2, size[1] * 2),
+        torch.randint(0, 1024, (1, 2, 2)).float(),
+        torch.tensor([[1.0, -1.0]]),
+        torch.zeros(1, 1, size[0] * 4, size[1] * 4),
+        torch.zeros(1),
+    )
+
+    output_path = os.path.join(OUTPUT_DIR, f"sam2_decoder_{model_id.removeprefix('sam2_')}.onnx")
+    start = time.time()
+    with torch.no_grad():
+        torch.onnx.export(
+            decoder,
+            dummy,
+            output_path,
+            export_params=True,
+            opset_version=17,
+            do_constant_folding=True,
+            input_names=[
+                "image_embed", "high_res_feats_0", "high_res_feats_1",
+                "point_coords", "point_labels", "mask_input", "has_mask_input",
+            ],
+            output_names=["masks", "iou_predictions"],
+            dynamic_axes={
+                "point_coords": {1: "num_points"},
+                "point_labels": {1: "num_points"},
+            },
+            dynamo=False,
+        )
+
+    size_mb = os.path.getsize(output_path) / (1024 * 1024)
+    print(f"✅ SAM2 Decoder 导出完成: {os.path.basename(output_path)} ({size_mb:.1f} MB, {time.time() - start:.1f}s)")
+
+    if not check_sam2_decoder(sam2, output_path):
+        sys.exit(1)
+    return output_path
+
+
+def check_sam2_decoder(sam2, onnx_path: str) -> bool:
+    """
+    导出的 Decoder 与 SAM2ImagePredictor.predict 对比 (同一张图、同一组点击):
+    float32 特征应与 PyTorch 一致; int8 特征包 (混合模式实际传输的) 只报告 mask IoU
+    """
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        print("⚠️  onnxruntime 未安装, 跳过 Decoder 一致性检查")
+        return True
+
+    import numpy as np
+    from sam2.sam2_image_predictor import SAM2ImagePredictor
+    from app.utils.compression import compress_features, decompress_features
+
+    print(f"\n一致性检查: {os.path.basename(onnx_path)} vs SAM2ImagePredictor.predict")
+    # 合成图片: 渐变背景 + 两个色块, 点击落在色块与背景上
+    h, w = 480, 640
+    image = np.zeros((h, w, 3), dtype=np.uint8)
+    image[..., 0] = np.linspace(0, 255, w, dtype=np.uint8)[None, :]
+    image[..., 2] = np.linspace(255, 0, h, dtype=np.uint8)[:, None]
+    image[100:260, 120:300] = (230, 40, 40)
+    image[280:420, 380:580] = (40, 200, 60)
+    prompts = [
+        (np.array([[200.0, 180.0]]), np.array([1])),
+        (np.array([[480.0, 350.0], [200.0, 180.0]]), np.array([1, 0])),
+    ]
+
+    predictor = SAM2ImagePredictor(sam2)
+    predictor.set_image(image)
+    high_res = predictor._features["high_res_feats"]
+    features = {
+        "image_embed": predictor._features["image_embed"].cpu().numpy(),
+        "high_res_feats_0": high_res[0].cpu().numpy(),
+        "high_res_feats_1": high_res[1].cpu().numpy(),
+    }
+    bundle = compress_features(features)
+    int8_features = decompress_features(bundle.encoded, bundle.tensors)
+
+    def mask_iou(a, b) -> float:
+        union = np.logical_or(a, b).sum()
+        return float(np.logical_and(a, b).sum() / union) if union else 1.0
+
+    session = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+    ok = True
+    for points, labels in prompts:
+        _, ref_scores, ref_logits = predictor.predict(
+            point_coords=points, point_labels=labels, multimask_output=True,
+        )
+
+        # 与前端相同的输入: 坐标缩放到 1024x1024, 末尾补一个 label=-1 的 padding 点
+        coords = np.concatenate([points * [1024 / w, 1024 / h], [[0.0, 0.0]]])[None].astype(np.float32)
+        point_labels = np.append(labels, -1)[None].astype(np.float32)
+        prompt = {
+            "point_coords": coords,
+            "point_labels": point_labels,
+            "mask_input": np.zeros((1, 1, 256, 256), dtype=np.float32),
+            "has_mask_input": np.zeros(1, dtype=np.float32),
+        }
+
+        logits, scores = session.run(None, {**features, **prompt})
+        logits = np.clip(logits[0], -32.0, 32.0)  # predict 返回的低分辨率 logits 同样截断
+        iou = mask_iou(logits > 0, ref_logits > 0)
+        logit_diff = float(np.abs(logits - ref_logits).max())
+        score_diff = float(np.abs(scores[0] - ref_scores).max())
+
+        q_logits, _ = session.run(None, {**int8_features, **prompt})
+        q_iou = mask_iou(q_logits[0] > 0, ref_logits > 0)
+
+        passed = iou >= 0.99 and score_diff < 1e-3
+        ok = ok and passed
+        print(
+            f"  {'✅' if passed else '❌'} {len(points)} 个点: mask IoU {iou:.4f}, "
+            f"logits 最大误差 {logit_diff:.4f}, IoU 分数最大误差 {score_diff:.5f}, "
+            f"int8 特征 mask IoU {q_iou:.4f}"
+        )
+
+    if not ok:
+        print(f"❌ {os.path.basename(onnx_path)} 与 SAM2ImagePredictor 不一致, 不发布")
+    return ok
+
+
+def publish():
+    """发布为内容寻址的下载布局 (供后端 /api/artifacts 提供)"""
+    sys.path.insert(0, BACKEND_DIR)
+    from app.core.artifacts import publish_artifacts
+
+    sources = [
+        os.path.join(OUTPUT_DIR, f) for f in sorted(os.listdir(OUTPUT_DIR)) if f.endswith(".onnx")
+    ]
+    print(f"\nStep 4: 发布 {len(sources)} 个文件 (哈希 URL / 预压缩 / 分块)...")
+    publish_artifacts(sources)
+
+
 def main():
-    print("🔧 SAM1 ONNX 导出工具")
+    parser = argparse.ArgumentParser(description="SAM ONNX 导出与发布")
+    parser.add_argument("--publish-only", action="store_true", help="跳过导出, 只发布已有的 ONNX 文件")
+    parser.add_argument("--sam2", nargs="+", metavar="MODEL_ID", help="只导出指定 SAM2 模型的 Decoder (混合模式)")
+    args = parser.parse_args()
+
+    print("🔧 SAM ONNX 导出工具")
     print(f"   模型: {MODELS_DIR}")
     print(f"   输出: {OUTPUT_DIR}\n")
 
-    encoder_path = export_encoder()
-    quantize_model(encoder_path)
-    setup_decoder()
+    if args.sam2 and not args.publish_only:
+        for model_id in args.sam2:
+            export_sam2_decoder(model_id)
+    elif not args.publish_only:
+        encoder_path = export_encoder()
+        quantize_model(encoder_path)
+        setup_decoder()
+    publish()
 
     print("\n" + "=" * 50)
     print("🎉 完成! 文件列表:")
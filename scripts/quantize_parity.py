@@ -0,0 +1,143 @@
+"""
+int8 量化编码器一致性检查
+
+分别加载 float32 模型与 int8 动态量化模型, 在同一批图片和点击上对比:
+  - mask IoU (每次点击取得分最高的 mask)
+  - 编码耗时与加速比
+首次运行会生成 <checkpoint>.int8.pt, 之后服务端直接加载该量化编码器
+
+使用:
+  cd backend && source venv/bin/activate
+  python ../scripts/quantize_parity.py --model sam1_vit_b --images /data/images
+  python ../scripts/quantize_parity.py --model sam2_tiny --num-images 5 --clicks 10
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+BACKEND_DIR = os.path.join(PROJECT_DIR, "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def load_images(args) -> list[tuple[str, np.ndarray]]:
+    """读取目录下的图片; 未指定目录时生成随机图片 (只能验证数值一致性)"""
+    import cv2
+
+    if not args.images:
+        rng = np.random.default_rng(args.seed)
+        return [
+            (f"random_{i}", rng.integers(0, 256, (480, 640, 3), dtype=np.uint8))
+            for i in range(args.num_images)
+        ]
+
+    names = sorted(n for n in os.listdir(args.images) if n.lower().endswith(IMAGE_EXTS))
+    images = []
+    for name in names[:args.num_images]:
+        image = cv2.imread(os.path.join(args.images, name))
+        if image is not None:
+            images.append((name, cv2.cvtColor(image, cv2.COLOR_BGR2RGB)))
+    return images
+
+
+def mask_iou(a: np.ndarray, b: np.ndarray) -> float:
+    union = np.logical_or(a, b).sum()
+    if union == 0:
+        return 1.0
+    return float(np.logical_and(a, b).sum() / union)
+
+
+def run(manager, image: np.ndarray, clicks: list[np.ndarray]) -> tuple[float, list[np.ndarray]]:
+    """返回 (编码耗时 ms, 每次点击的最佳 mask)"""
+    start = time.perf_counter()
+    manager.set_image(image)
+    encode_ms = (time.perf_counter() - start) * 1000
+
+    masks = []
+    for point in clicks:
+        pred, scores = manager.predict(point[None, :], np.array([1]))
+        masks.append(pred[int(np.argmax(scores))])
+    return encode_ms, masks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="int8 量化编码器一致性检查")
+    parser.add_argument("--model", default="sam1_vit_b", help="float32 模型 ID")
+    parser.add_argument("--images", help="图片目录 (默认使用随机图片)")
+    parser.add_argument("--num-images", type=int, default=10)
+    parser.add_argument("--clicks", type=int, default=5, help="每张图片的随机点击数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    from app.config import settings
+    from app.models.registry import model_registry
+
+    model_config = settings.available_models.get(args.model)
+    if model_config is None:
+        parser.error(f"未知模型: {args.model}")
+    if model_config.get("quantized"):
+        parser.error(f"{args.model} 已是量化模型, 请指定 float32 模型")
+
+    int8_id = f"{args.model}_int8"
+    settings.available_models.setdefault(int8_id, {**model_config, "quantized": True})
+    settings.device = "cpu"
+
+    float_manager = model_registry.load(args.model)
+    int8_manager = model_registry.load(int8_id)
+    if not int8_manager.quantized:
+        sys.exit("量化失败, 请检查 torch 是否支持 int8 动态量化")
+
+    images = load_images(args)
+    if not images:
+        sys.exit("没有可用的图片")
+
+    rng = np.random.default_rng(args.seed)
+    ious, float_ms, int8_ms = [], [], []
+    for name, image in images:
+        h, w = image.shape[:2]
+        clicks = [np.array([rng.uniform(0, w), rng.uniform(0, h)]) for _ in range(args.clicks)]
+
+        f_ms, f_masks = run(float_manager, image, clicks)
+        q_ms, q_masks = run(int8_manager, image, clicks)
+        image_ious = [mask_iou(a, b) for a, b in zip(f_masks, q_masks)]
+
+        float_ms.append(f_ms)
+        int8_ms.append(q_ms)
+        ious.extend(image_ious)
+        print(f"  {name}: IoU {np.mean(image_ious):.4f}, 编码 {f_ms:.0f}ms → {q_ms:.0f}ms")
+
+    # 第一张图片包含预热开销, 耗时统计从第二张开始
+    timed = slice(1, None) if len(images) > 1 else slice(None)
+    report = {
+        "model": args.model,
+        "images": len(images),
+        "clicks": len(ious),
+        "mean_iou": float(np.mean(ious)),
+        "min_iou": float(np.min(ious)),
+        "p05_iou": float(np.percentile(ious, 5)),
+        "float_encode_ms": float(np.mean(float_ms[timed])),
+        "int8_encode_ms": float(np.mean(int8_ms[timed])),
+    }
+    report["speedup"] = report["float_encode_ms"] / report["int8_encode_ms"]
+
+    print(f"\n📊 {args.model} float32 vs int8")
+    print(f"  mask IoU: mean {report['mean_iou']:.4f}, p05 {report['p05_iou']:.4f}, min {report['min_iou']:.4f}")
+    print(f"  编码耗时: {report['float_encode_ms']:.0f}ms → {report['int8_encode_ms']:.0f}ms "
+          f"(x{report['speedup']:.2f})")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
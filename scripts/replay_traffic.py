@@ -0,0 +1,320 @@
+"""
+流量回放压测
+
+按录制的 trace (见 app/core/traffic.py) 向目标实例重放请求, 保持原始的到达节奏
+(或按 --speed 加速), 报告各端点的延迟分位数并与录制时对比:
+  - 开环回放: 按到达时间发送, 不等待前一个请求完成, 与真实流量的突发一致
+  - 图片: trace 保存了图片时使用原图; 否则按图片哈希与尺寸生成确定性的替代图片
+    (同一哈希得到同一替代图片, 编码缓存命中模式与线上一致)
+  - 上传请求按录制顺序重放 (含 precompute); 图片由 trace 中更早的上传提供的请求
+    等待该上传返回后使用其 URL, 与线上 "上传 → 首次点击" 的编码缓存命中模式一致
+  - 其余请求用到的图片回放前先上传到目标实例 (不计入延迟)
+相同的 trace 与参数每次回放发送完全相同的请求序列
+
+使用:
+  cd backend && source venv/bin/activate
+  python ../scripts/replay_traffic.py traffic/traffic-20250101-120000 --target http://localhost:8000
+  python ../scripts/replay_traffic.py traffic/traffic-20250101-120000 --speed 4 --output replay.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from io import BytesIO
+from typing import Optional
+
+import aiohttp
+import numpy as np
+from PIL import Image
+
+DEFAULT_IMAGE_SIZE = [768, 1024]  # [H, W], 录制时未能读取尺寸的上传
+
+
+# ---------- trace ----------
+
+def load_trace(path: str) -> tuple[str, dict, list[dict]]:
+    """返回 (trace 目录, header, 请求列表)"""
+    if os.path.isdir(path):
+        path = os.path.join(path, "trace.jsonl")
+    header, entries = {}, []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("type") == "header":
+                header = record
+            else:
+                entries.append(record)
+    entries.sort(key=lambda e: e["t"])
+    return os.path.dirname(path), header, entries
+
+
+def synthetic_image(seed_hex: str, size: list[int]) -> bytes:
+    """按哈希生成确定性的替代图片 (低频噪声放大, 体积与压缩率接近自然图片)"""
+    height, width = size
+    rng = np.random.default_rng(int(seed_hex[:16], 16))
+    small = rng.integers(0, 256, (max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+    image = Image.fromarray(small).resize((width, height), Image.BILINEAR)
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def upload_image_hash(entry: dict) -> str:
+    """上传图片解码后的哈希 (与之后的请求一致); 旧版本 trace 只有文件字节哈希"""
+    return entry.get("image_hash") or entry["hash"]
+
+
+def image_bytes(trace_dir: str, entry: dict) -> tuple[bytes, str]:
+    """返回 (图片内容, 扩展名): 优先使用录制的原图"""
+    if entry["endpoint"] == "/api/upload":
+        digest, ext = entry["hash"], entry.get("ext", "png")
+        path = os.path.join(trace_dir, "uploads", f"{digest}.{ext}")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read(), ext
+        # 与之后请求同一图片时生成的替代图片相同
+        return synthetic_image(upload_image_hash(entry), entry.get("image_size") or DEFAULT_IMAGE_SIZE), "png"
+
+    path = os.path.join(trace_dir, "images", f"{entry['image_hash']}.png")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read(), "png"
+    return synthetic_image(entry["image_hash"], entry["image_size"]), "png"
+
+
+# ---------- 请求 ----------
+
+async def upload(session: aiohttp.ClientSession, target: str, content: bytes, ext: str,
+                 precompute: Optional[list[str]] = None) -> aiohttp.ClientResponse:
+    form = aiohttp.FormData()
+    form.add_field("file", content, filename=f"replay.{ext}", content_type=f"image/{ext}")
+    for model in precompute or []:
+        form.add_field("precompute", model)
+    return await session.post(f"{target}/api/upload", data=form)
+
+
+class ReplayImages:
+    """回放用的图片: 预先上传的 URL, 上传请求的内容, 以及 trace 中上传返回的 URL"""
+
+    def __init__(self):
+        self.urls: dict[str, str] = {}  # 图片哈希 → 预先上传的 URL
+        self.uploads: dict[str, tuple[bytes, str]] = {}  # 上传文件哈希 → (内容, 扩展名)
+        self.uploaded: dict[str, asyncio.Future] = {}  # 图片哈希 → 首次上传返回的 URL (失败为 None)
+
+    async def url(self, image_hash: str) -> Optional[str]:
+        if image_hash in self.urls:
+            return self.urls[image_hash]
+        return await self.uploaded[image_hash]
+
+    def resolve(self, image_hash: str, url: Optional[str]) -> None:
+        future = self.uploaded.get(image_hash)
+        if future is not None and not future.done():
+            future.set_result(url)
+
+
+async def prepare_images(session: aiohttp.ClientSession, target: str, trace_dir: str,
+                         entries: list[dict]) -> ReplayImages:
+    """准备回放用的图片: 不是由更早的上传提供的图片先上传到目标实例"""
+    images = ReplayImages()
+    first_use: dict[str, dict] = {}
+    loop = asyncio.get_running_loop()
+    for entry in entries:
+        if entry["endpoint"] == "/api/upload":
+            images.uploads.setdefault(entry["hash"], image_bytes(trace_dir, entry))
+            images.uploaded.setdefault(upload_image_hash(entry), loop.create_future())
+        elif entry["image_hash"] not in images.uploaded:
+            first_use.setdefault(entry["image_hash"], entry)
+
+    semaphore = asyncio.Semaphore(8)
+
+    async def prepare(image_hash: str, entry: dict) -> None:
+        content, ext = image_bytes(trace_dir, entry)
+        async with semaphore:
+            resp = await upload(session, target, content, ext)
+            async with resp:
+                resp.raise_for_status()
+                images.urls[image_hash] = (await resp.json())["url"]
+
+    await asyncio.gather(*(prepare(h, e) for h, e in first_use.items()))
+    return images
+
+
+async def send_upload(session: aiohttp.ClientSession, target: str, entry: dict,
+                      images: ReplayImages) -> tuple[int, float]:
+    start = time.perf_counter()
+    url = None
+    try:
+        content, ext = images.uploads[entry["hash"]]
+        resp = await upload(session, target, content, ext, entry["request"].get("precompute"))
+        async with resp:
+            body = await resp.read()
+            status = resp.status
+        if 200 <= status < 300:
+            url = json.loads(body)["url"]
+    except aiohttp.ClientError:
+        status = 0
+    finally:
+        # 等待该上传的后续请求: 失败时为 None
+        images.resolve(upload_image_hash(entry), url)
+    return status, (time.perf_counter() - start) * 1000
+
+
+async def send(session: aiohttp.ClientSession, target: str, entry: dict,
+               images: ReplayImages) -> tuple[int, float]:
+    """发送一个请求, 返回 (状态码, 耗时 ms); 连接错误或所依赖的上传失败时状态码为 0"""
+    if entry["endpoint"] == "/api/upload":
+        return await send_upload(session, target, entry, images)
+
+    # 图片由更早的上传提供时, 与线上一样在上传返回后才发送 (等待不计入耗时)
+    image_url = await images.url(entry["image_hash"])
+    start = time.perf_counter()
+    if image_url is None:
+        return 0, 0.0
+    try:
+        body = {**entry["request"], "image_url": image_url}
+        resp = await session.post(f"{target}{entry['endpoint']}", json=body)
+        async with resp:
+            await resp.read()
+            status = resp.status
+    except aiohttp.ClientError:
+        status = 0
+    return status, (time.perf_counter() - start) * 1000
+
+
+async def replay(args) -> dict:
+    trace_dir, header, entries = load_trace(args.trace)
+    if args.endpoints:
+        entries = [e for e in entries if e["endpoint"] in args.endpoints]
+    # 录制时在标注之前失败的请求 (如图片无法加载) 没有请求参数, 无法重放
+    replayable = [e for e in entries if "request" in e]
+    if args.limit:
+        replayable = replayable[:args.limit]
+    skipped = len(entries) - len(replayable)
+
+    print(f"trace: {trace_dir} ({len(replayable)} 个请求, 跳过 {skipped} 个, "
+          f"原图: {'是' if header.get('record_images') else '否 (使用替代图片)'})")
+
+    connector = aiohttp.TCPConnector(limit=args.max_inflight)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        print("上传图片...")
+        images = await prepare_images(session, args.target, trace_dir, replayable)
+
+        print(f"开始回放 ({args.speed}x)...")
+        results: list[dict] = []
+        base = replayable[0]["t"] if replayable else 0.0
+        start = time.perf_counter()
+
+        async def run(entry: dict) -> None:
+            status, latency_ms = await send(session, args.target, entry, images)
+            results.append({
+                "endpoint": entry["endpoint"],
+                "status": status,
+                "latency_ms": latency_ms,
+                "recorded_latency_ms": entry.get("latency_ms"),
+            })
+
+        tasks = []
+        max_lag_ms = 0.0
+        for entry in replayable:
+            due = (entry["t"] - base) / args.speed
+            delay = due - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                max_lag_ms = max(max_lag_ms, -delay * 1000)
+            tasks.append(asyncio.ensure_future(run(entry)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "trace": trace_dir,
+        "target": args.target,
+        "speed": args.speed,
+        "requests": len(results),
+        "skipped": skipped,
+        "elapsed_s": round(elapsed, 2),
+        "max_schedule_lag_ms": round(max_lag_ms, 1),
+        "endpoints": summarize(results),
+    }
+
+
+# ---------- 报告 ----------
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {}
+    return {
+        "p50": round(float(np.percentile(values, 50)), 1),
+        "p90": round(float(np.percentile(values, 90)), 1),
+        "p99": round(float(np.percentile(values, 99)), 1),
+        "max": round(float(max(values)), 1),
+    }
+
+
+def summarize(results: list[dict]) -> dict:
+    summary = {}
+    for endpoint in sorted({r["endpoint"] for r in results}):
+        rows = [r for r in results if r["endpoint"] == endpoint]
+        ok = [r for r in rows if 200 <= r["status"] < 300]
+        recorded = [r["recorded_latency_ms"] for r in rows if r["recorded_latency_ms"] is not None]
+        status_counts: dict[str, int] = {}
+        for r in rows:
+            status_counts[str(r["status"])] = status_counts.get(str(r["status"]), 0) + 1
+        summary[endpoint] = {
+            "count": len(rows),
+            "errors": len(rows) - len(ok),
+            "status": status_counts,
+            "latency_ms": percentiles([r["latency_ms"] for r in ok]),
+            "recorded_latency_ms": percentiles(recorded),
+        }
+    return summary
+
+
+def print_report(report: dict) -> None:
+    print(f"\n========== 回放结果 ({report['speed']}x, {report['elapsed_s']}s) ==========")
+    if report["max_schedule_lag_ms"] > 100:
+        print(f"⚠️ 发送端最大滞后 {report['max_schedule_lag_ms']}ms, 回放节奏可能失真")
+    print(f"{'端点':<22}{'请求':>6}{'错误':>6}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}   录制 p50/p99")
+    for endpoint, stats in report["endpoints"].items():
+        latency = stats["latency_ms"] or {"p50": 0, "p90": 0, "p99": 0, "max": 0}
+        recorded = stats["recorded_latency_ms"]
+        recorded_text = f"{recorded['p50']}/{recorded['p99']}" if recorded else "-"
+        print(
+            f"{endpoint:<22}{stats['count']:>6}{stats['errors']:>6}"
+            f"{latency['p50']:>10}{latency['p90']:>10}{latency['p99']:>10}{latency['max']:>10}"
+            f"   {recorded_text}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流量回放压测")
+    parser.add_argument("trace", help="trace 目录或 trace.jsonl")
+    parser.add_argument("--target", default="http://localhost:8000", help="目标实例地址")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放速度倍数 (2 = 两倍速)")
+    parser.add_argument("--endpoints", nargs="+", help="只回放指定端点")
+    parser.add_argument("--limit", type=int, default=0, help="最多回放的请求数")
+    parser.add_argument("--max-inflight", type=int, default=256, help="最大并发连接数")
+    parser.add_argument("--timeout", type=float, default=300, help="单个请求超时 (秒)")
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    if args.speed <= 0:
+        parser.error("--speed 必须大于 0")
+    args.target = args.target.rstrip("/")
+
+    report = asyncio.run(replay(args))
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"结果已写入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
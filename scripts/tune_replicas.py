@@ -0,0 +1,168 @@
+"""
+多副本 (副本数 × 每副本线程数) 调参
+
+在当前机器上对同一模型比较不同的核心切分:
+  - 单请求延迟: 逐个发送请求 (只有一个副本在工作)
+  - 满载吞吐: 并发数 = 副本数的闭环压测, 记录吞吐与 p50/p95 延迟
+每个请求为一次完整的点击分割 (编码 + 解码)。模型只加载一次, 各切分共享权重
+得到的最佳切分写入 .env, 例如:
+  MODEL_REPLICAS='{"sam1_vit_b": 8}'
+  REPLICA_THREADS=8
+
+使用:
+  cd backend && source venv/bin/activate
+  DEVICE=cpu python ../scripts/tune_replicas.py --model sam1_vit_b
+  DEVICE=cpu python ../scripts/tune_replicas.py --model sam1_vit_b --splits 1x64,4x16,8x8,16x4 --requests 64
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+BACKEND_DIR = os.path.join(PROJECT_DIR, "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+
+def default_splits(cores: int) -> list[tuple[int, int]]:
+    """每副本线程数取 2 的幂, 副本数用满全部核心"""
+    splits = []
+    threads = 1
+    while threads <= cores:
+        splits.append((cores // threads, threads))
+        threads *= 2
+    return sorted(splits)
+
+
+def parse_splits(value: str) -> list[tuple[int, int]]:
+    splits = []
+    for item in value.split(","):
+        replicas, threads = item.lower().split("x")
+        splits.append((int(replicas), int(threads)))
+    return splits
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def measure(replica_set, image: np.ndarray, requests: int, concurrency: int) -> dict:
+    """并发 concurrency 个客户端, 共发送 requests 个分割请求"""
+    h, w = image.shape[:2]
+    rng = np.random.default_rng(0)
+    clicks = [rng.integers([0, 0], [w, h]).reshape(1, 2) for _ in range(requests)]
+    labels = np.array([1])
+
+    def request(points: np.ndarray) -> float:
+        start = time.perf_counter()
+        replica_set.execute(lambda: replica_set.segment(image, points, labels))
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        latencies = list(clients.map(request, clicks))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "throughput_rps": round(requests / elapsed, 2),
+        "latency_ms_p50": round(percentile(latencies, 50), 1),
+        "latency_ms_p95": round(percentile(latencies, 95), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多副本核心切分调参")
+    parser.add_argument("--model", default="sam1_vit_b", help="模型 ID")
+    parser.add_argument("--splits", help="副本数x线程数, 逗号分隔 (默认按 2 的幂自动生成)")
+    parser.add_argument("--requests", type=int, default=0, help="满载测试的请求数 (默认每副本 4 个)")
+    parser.add_argument("--latency-requests", type=int, default=5, help="单请求延迟测试的请求数")
+    parser.add_argument("--image", help="测试图片 (默认使用 1024x1024 随机图片)")
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    from app.config import settings
+    from app.models.registry import model_registry
+    from app.models.replicas import available_cores, plan_core_sets, replicate
+
+    if settings.device != "cpu":
+        print(f"⚠️ 多副本仅用于 CPU, 当前 DEVICE={settings.device}, 请设置 DEVICE=cpu")
+        sys.exit(1)
+
+    if args.image:
+        import cv2
+        image = cv2.cvtColor(cv2.imread(args.image), cv2.COLOR_BGR2RGB)
+    else:
+        image = np.random.default_rng(0).integers(0, 256, (1024, 1024, 3), dtype=np.uint8)
+
+    cores = available_cores()
+    splits = parse_splits(args.splits) if args.splits else default_splits(len(cores))
+    print(f"可用核心: {len(cores)}, 待测切分: {', '.join(f'{r}x{t}' for r, t in splits)}")
+
+    # 单实例加载一次, 各切分共享权重
+    settings.model_replicas = {}
+    manager = model_registry.get_or_load(args.model)
+
+    results = []
+    for replicas, threads in splits:
+        try:
+            core_sets = plan_core_sets(replicas, threads)
+        except ValueError as e:
+            print(f"跳过 {replicas}x{threads}: {e}")
+            continue
+
+        replica_set = replicate(manager, replicas, core_sets=core_sets)
+        try:
+            # 预热: 每个副本一次 (首次运行会创建该副本的 OpenMP 线程)
+            measure(replica_set, image, replicas, replicas)
+            single = measure(replica_set, image, args.latency_requests, 1)
+            loaded = measure(replica_set, image, args.requests or replicas * 4, replicas)
+        finally:
+            replica_set.shutdown()
+
+        result = {
+            "replicas": replicas,
+            "threads_per_replica": threads,
+            "single_latency_ms": single["latency_ms_p50"],
+            **loaded,
+        }
+        results.append(result)
+        print(
+            f"{replicas:>3} 副本 × {threads:<3} 线程: 单请求 {result['single_latency_ms']:>8.1f}ms | "
+            f"满载 {result['throughput_rps']:>6.2f} req/s, "
+            f"p50 {result['latency_ms_p50']:.1f}ms, p95 {result['latency_ms_p95']:.1f}ms"
+        )
+
+    if not results:
+        print("没有可测试的切分")
+        sys.exit(1)
+
+    best_throughput = max(results, key=lambda r: r["throughput_rps"])
+    best_latency = min(results, key=lambda r: r["single_latency_ms"])
+    print("\n========== 结论 ==========")
+    print(f"吞吐最高: {best_throughput['replicas']}x{best_throughput['threads_per_replica']} "
+          f"({best_throughput['throughput_rps']} req/s)")
+    print(f"延迟最低: {best_latency['replicas']}x{best_latency['threads_per_replica']} "
+          f"({best_latency['single_latency_ms']} ms)")
+    print(f"MODEL_REPLICAS='{json.dumps({args.model: best_throughput['replicas']})}'")
+    print(f"REPLICA_THREADS={best_throughput['threads_per_replica']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "model": args.model,
+                "cores": len(cores),
+                "results": results,
+                "best_throughput": best_throughput,
+                "best_latency": best_latency,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"结果已写入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()